@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+个人资料归一化微基准
+对比旧实现（逐字段逐别名归一化、每行现编译正则、归一化后再解析一遍求明确值）
+与 profile_normalizer 的预编译 + 反向索引实现，并校验两者输出一致
+
+用法: python bench_profile_normalization.py [资料行数] [重复次数]
+"""
+
+import random
+import re
+import sys
+import time
+
+from profile_normalizer import (
+    PROFILE_FIELD_ALIASES,
+    PROFILE_KEY_NOISE_TOKENS,
+    normalize_profile,
+)
+
+
+def legacy_normalize_profile_key(key):
+    cleaned = re.sub(r"[\s_\-（）()【】\[\]·.]+", "", key or "")
+    cleaned = cleaned.lower()
+    for token in PROFILE_KEY_NOISE_TOKENS:
+        cleaned = cleaned.replace(token, "")
+    return cleaned.strip()
+
+
+def legacy_extract_profile_pairs(user_info_text):
+    parsed_fields = {}
+    for raw_line in (user_info_text or "").splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+        line = re.sub(r"^[-*•·]+\s*", "", line)
+        line = re.sub(r"^\d+[.)、]\s*", "", line)
+        if not re.search(r"[：:=]", line):
+            continue
+        parts = re.split(r"[：:=]", line, maxsplit=1)
+        if len(parts) != 2:
+            continue
+        key = parts[0].strip()
+        value = parts[1].strip().strip('"\'')
+        if not key or not value:
+            continue
+        normalized_key = legacy_normalize_profile_key(key)
+        if normalized_key and normalized_key not in parsed_fields:
+            parsed_fields[normalized_key] = value
+    return parsed_fields
+
+
+def legacy_normalize_profile(user_info_text):
+    normalized_text = user_info_text
+    parsed_fields = legacy_extract_profile_pairs(user_info_text)
+    if parsed_fields and "## 标准化资料映射（系统自动生成，用于跨模板复用）" not in user_info_text:
+        canonical_pairs = []
+        for canonical, aliases in PROFILE_FIELD_ALIASES.items():
+            matched_value = None
+            for candidate in [canonical] + aliases:
+                candidate_key = legacy_normalize_profile_key(candidate)
+                if candidate_key in parsed_fields:
+                    matched_value = parsed_fields[candidate_key]
+                    break
+            if matched_value:
+                canonical_pairs.append((canonical, matched_value))
+        if canonical_pairs:
+            augmented_lines = ["", "## 标准化资料映射（系统自动生成，用于跨模板复用）"]
+            augmented_lines.extend([f"{k}：{v}" for k, v in canonical_pairs])
+            normalized_text = user_info_text.rstrip() + "\n" + "\n".join(augmented_lines)
+
+    explicit_values = set()
+    for value in legacy_extract_profile_pairs(normalized_text).values():
+        normalized_value = re.sub(r"\s+", "", str(value or ""))
+        if normalized_value:
+            explicit_values.add(normalized_value)
+    return normalized_text, explicit_values
+
+
+def build_long_profile(line_count, seed=7):
+    """生成包含别名、噪声词、项目符号和自由文本的长资料"""
+    rng = random.Random(seed)
+    keys = [k for canonical, aliases in PROFILE_FIELD_ALIASES.items() for k in [canonical] + aliases]
+    keys += ["工作经历", "项目经历", "获奖情况", "兴趣爱好", "自我评价"]
+    lines = []
+    for idx in range(line_count):
+        key = rng.choice(keys)
+        decorated = rng.choice([key, f"{key}（必填）", f"- {key}", f"{idx % 9 + 1}. {key}", f"{key} required"])
+        if idx % 7 == 0:
+            lines.append(f"负责第{idx}个项目的需求分析与交付，协调多方资源")
+        else:
+            lines.append(f"{decorated}：值{idx} 示例")
+    return "\n".join(lines)
+
+
+def bench(func, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(text)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    line_count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    for lines in sorted({50, 500, line_count}):
+        text = build_long_profile(lines)
+        if legacy_normalize_profile(text) != normalize_profile(text):
+            print(f"❌ 输出不一致（{lines} 行）")
+            sys.exit(1)
+
+        legacy_ms = bench(legacy_normalize_profile, text, repeat)
+        new_ms = bench(normalize_profile, text, repeat)
+        print(f"{lines:>6} 行: 旧实现 {legacy_ms:8.3f} ms, 新实现 {new_ms:8.3f} ms, 加速 {legacy_ms / new_ms:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板编译内存基准
+对比 compile_template（python-docx 对象树）与 compile_template_stream（iterparse 流式）
+在不同表格数量下的峰值 RSS 和耗时，并校验两者编译结果一致。
+每次测量在独立子进程中进行，峰值 RSS 互不影响。
+
+用法: python bench_streaming_compile.py [最大表格数]
+"""
+
+import hashlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from docx import Document
+
+
+def build_large_document(path, table_count, rows=20, cols=6):
+    """生成包含大量“标签 | 空格”表格和填空段落的长文档"""
+    doc = Document()
+    labels = ["姓名", "性别", "出生日期", "学历", "毕业院校", "联系电话", "户口地址", "备注"]
+    for t_idx in range(table_count):
+        doc.add_paragraph(f"第 {t_idx + 1} 部分 是否同意 □是 □否")
+        table = doc.add_table(rows=rows, cols=cols)
+        for r_idx, row in enumerate(table.rows):
+            for c_idx, cell in enumerate(row.cells):
+                if c_idx % 2 == 0:
+                    cell.text = labels[(r_idx + c_idx + t_idx) % len(labels)]
+    doc.save(path)
+
+
+def peak_rss_mb():
+    """当前进程的峰值 RSS；ru_maxrss 在 Linux 上会继承父进程的值，优先读取 VmHWM"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_child(mode, path):
+    import core
+
+    start = time.perf_counter()
+    if mode == "document":
+        with open(path, "rb") as f:
+            docx_bytes = f.read()
+        compiled = core.compile_template(Document(path), docx_bytes)
+    else:
+        compiled = core.compile_template_stream(path)
+    elapsed = (time.perf_counter() - start) * 1000
+    peak_mb = peak_rss_mb()
+
+    digest = hashlib.md5(json.dumps(compiled, ensure_ascii=False, sort_keys=True, default=str).encode()).hexdigest()
+    print(json.dumps({"ms": elapsed, "peak_mb": peak_mb, "digest": digest, "slots": len(compiled["placeholder_info"])}))
+
+
+def measure(mode, path):
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), "--child", mode, path])
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_child(sys.argv[2], sys.argv[3])
+        return
+
+    max_tables = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for table_count in sorted({10, max_tables // 4, max_tables}):
+            path = os.path.join(tmp_dir, f"form_{table_count}.docx")
+            build_large_document(path, table_count)
+            size_kb = os.path.getsize(path) / 1024
+
+            document = measure("document", path)
+            stream = measure("stream", path)
+            if document["digest"] != stream["digest"]:
+                print(f"❌ 编译结果不一致（{table_count} 个表格）")
+                sys.exit(1)
+
+            print(
+                f"{table_count:>5} 表格 ({size_kb:7.0f} KB, {stream['slots']} 占位符): "
+                f"python-docx {document['peak_mb']:7.1f} MB / {document['ms']:8.1f} ms, "
+                f"流式 {stream['peak_mb']:7.1f} MB / {stream['ms']:8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+复选框（□）与填空线（___）的规则求解
+解析选项/填空两侧的文字，与资料中的字段匹配后直接生成填好的文本；
+无法唯一确定时返回 None，交给模型处理。
+"""
+
+import re
+
+from profile_normalizer import PROFILE_ALIAS_INDEX, normalize_profile_key
+
+CHECKED_MARK = "[√]"
+
+_OPTION_RE = re.compile(r"□\s*([^□\s，,；;、/|：:()（）]+)")
+_BLANK_RE = re.compile(r"_{3,}")
+_SEGMENT_SPLIT_RE = re.compile(r"[，,。；;：:\s]+")
+_LABEL_STRIP_RE = re.compile(r"[\s：:，,。；;（）()]+")
+
+_YES_WORDS = {"是", "有", "服从", "愿意", "同意", "接受", "yes", "y", "true", "√"}
+_NO_WORDS = {"否", "无", "没有", "不", "不服从", "不愿意", "不同意", "不接受", "no", "n", "false", "×"}
+_GENDER_OPTIONS = {"男", "女"}
+
+
+def _polarity(text):
+    if text in _YES_WORDS:
+        return True
+    if text in _NO_WORDS:
+        return False
+    return None
+
+
+def lookup_profile_value(labels, canonical_fields, profile_fields):
+    """按字段名依次查找资料中的值：先查资料原始字段，再经别名映射查标准字段"""
+    for label in labels:
+        key = normalize_profile_key(_LABEL_STRIP_RE.sub("", label or ""))
+        if not key:
+            continue
+        if profile_fields.get(key):
+            return profile_fields[key]
+        canonicals = {canonical for canonical, _ in PROFILE_ALIAS_INDEX.get(key, ())}
+        if len(canonicals) == 1:
+            value = canonical_fields.get(canonicals.pop())
+            if value:
+                return value
+    return None
+
+
+def _match_option(value, options):
+    """资料值 -> 唯一匹配的选项；匹配不到或有多个候选时返回 None"""
+    normalized_value = re.sub(r"\s+", "", value).lower()
+
+    exact = [option for option in options if option.lower() == normalized_value]
+    if len(exact) == 1:
+        return exact[0]
+
+    value_polarity = _polarity(normalized_value)
+    if value_polarity is not None:
+        same_polarity = [option for option in options if _polarity(option.lower()) == value_polarity]
+        if len(same_polarity) == 1:
+            return same_polarity[0]
+
+    contained = [option for option in options if option.lower() in normalized_value]
+    if len(contained) == 1:
+        return contained[0]
+    return None
+
+
+def resolve_checkbox(text, header, canonical_fields, profile_fields):
+    """
+    “性别 □男 □女”、“是否服从调剂 □是 □否”一类的单选复选框
+
+    Returns:
+        勾选后的文本（选中项的 □ 替换为 [√]），无法确定时返回 None
+    """
+    matches = list(_OPTION_RE.finditer(text))
+    if len(matches) < 2:
+        return None
+
+    options = [match.group(1) for match in matches]
+    if len(set(options)) != len(options):
+        return None
+
+    question = text[:matches[0].start()]
+    labels = [question, header]
+    if set(options) <= _GENDER_OPTIONS:
+        labels.append("性别")
+
+    value = lookup_profile_value(labels, canonical_fields, profile_fields)
+    if not value:
+        return None
+
+    chosen = _match_option(value, options)
+    if chosen is None:
+        return None
+
+    start = matches[options.index(chosen)].start()
+    return text[:start] + CHECKED_MARK + text[start + 1:]
+
+
+def resolve_fill_blank(text, header, canonical_fields, profile_fields):
+    """
+    “持有___驾驶证”一类的单个填空线
+
+    Returns:
+        填好的文本，无法确定时返回 None
+    """
+    blanks = list(_BLANK_RE.finditer(text))
+    if len(blanks) != 1:
+        return None
+
+    prefix = text[:blanks[0].start()]
+    suffix = text[blanks[0].end():]
+    prefix_segments = [segment for segment in _SEGMENT_SPLIT_RE.split(prefix) if segment]
+    suffix_segments = [segment for segment in _SEGMENT_SPLIT_RE.split(suffix) if segment]
+    prefix_segment = prefix_segments[-1] if prefix_segments else ""
+    suffix_segment = suffix_segments[0] if suffix_segments else ""
+
+    labels = [prefix_segment, suffix_segment, prefix_segment + suffix_segment, header]
+    value = lookup_profile_value(labels, canonical_fields, profile_fields)
+    if not value or _polarity(value.strip().lower()) is False:
+        return None
+
+    value = value.strip()
+    # 资料中的值已带单位（“175cm”填入“___cm”），去掉单位避免重复；只剩单位时交给模型
+    if suffix_segment and value.lower().endswith(suffix_segment.lower()):
+        value = value[:-len(suffix_segment)].rstrip()
+        if not value:
+            return None
+
+    before = "" if not prefix or prefix.rstrip().endswith(("：", ":")) else " "
+    after = " " if suffix.strip() else ""
+    return f"{prefix.rstrip()}{before}{value}{after}{suffix.lstrip()}"
+
+
+def resolve_choice_text(placeholder_type, text, header, canonical_fields, profile_fields):
+    if placeholder_type == "checkbox":
+        return resolve_checkbox(text, header, canonical_fields, profile_fields)
+    if placeholder_type == "fillblank":
+        return resolve_fill_blank(text, header, canonical_fields, profile_fields)
+    return None
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型回复的磁盘缓存（SQLite）
+以 接口 + 模型 + 参数哈希 + 提示词哈希 为键保存模型回复文本，进程重启、重新部署后仍然有效
+（Render 上需要把 MODEL_CACHE_PATH 放在持久磁盘上）。
+填表、审核的提示词和回复含有个人信息，条目有效期不超过资料的保留期 FILE_RETENTION_HOURS，
+过期条目由文件保留清理（server_with_auth.cleanup_expired_files）一并删除。
+
+配置（环境变量）:
+    MODEL_CACHE_ENABLED      是否启用（默认 1）
+    MODEL_CACHE_PATH         数据库文件路径（默认 ./model_cache.db）
+    MODEL_CACHE_TTL_SECONDS  条目有效期（默认与 FILE_RETENTION_HOURS 相同，最长也不超过它）
+    MODEL_CACHE_MAX_MB       缓存总大小上限，超出后按最近访问时间淘汰到上限的 90%（默认 200）
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    params_hash TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    content TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    accessed_at REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_completions_accessed_at ON completions (accessed_at);
+"""
+
+_EVICT_BATCH = 200
+
+
+def _sha256(value):
+    return hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    def __init__(self, path, ttl_seconds, max_bytes):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=5, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(_SCHEMA)
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(provider_id, payload):
+        """
+        Returns:
+            tuple: (键, 模型, 参数哈希, 提示词哈希)；参数为请求体中 messages 以外的部分
+        """
+        model = payload.get("model") or ""
+        params_hash = _sha256({k: v for k, v in payload.items() if k not in ("model", "messages")})
+        prompt_hash = _sha256(payload.get("messages") or [])
+        key = hashlib.sha256("\x1f".join([provider_id, model, params_hash, prompt_hash]).encode("utf-8")).hexdigest()
+        return key, model, params_hash, prompt_hash
+
+    def get(self, provider_id, payload):
+        """返回缓存的回复文本，未命中、已过期或读取失败时返回 None"""
+        try:
+            return self._get(self.make_key(provider_id, payload)[0], time.time())
+        except sqlite3.Error as e:
+            print(f"⚠️ 读取模型缓存失败: {e}")
+            return None
+
+    def _get(self, key, now):
+        with self._lock:
+            row = self._conn.execute("SELECT content, created_at FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            content, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE completions SET accessed_at = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return content
+
+    def put(self, provider_id, payload, content):
+        """写入回复文本（写入失败只打印警告，不影响请求）"""
+        key, model, params_hash, prompt_hash = self.make_key(provider_id, payload)
+        now = time.time()
+        size = len(content.encode("utf-8"))
+        with self._lock:
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO completions "
+                    "(key, provider, model, params_hash, prompt_hash, content, size, created_at, accessed_at, hits) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                    (key, provider_id, model, params_hash, prompt_hash, content, size, now, now),
+                )
+                self._evict(now)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                print(f"⚠️ 写入模型缓存失败: {e}")
+
+    def _evict(self, now):
+        """删除过期条目；总大小超过上限时按最近访问时间淘汰到上限的 90%"""
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl_seconds,))
+        if not self.max_bytes:
+            return
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        evicted = 0
+        while total > target:
+            rows = self._conn.execute(
+                "SELECT key, size FROM completions ORDER BY accessed_at LIMIT ?", (_EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            batch = []
+            for key, size in rows:
+                batch.append((key,))
+                total -= size
+                if total <= target:
+                    break
+            self._conn.executemany("DELETE FROM completions WHERE key = ?", batch)
+            evicted += len(batch)
+        print(f"🧹 模型缓存超出上限，淘汰 {evicted} 条")
+
+    def purge_expired(self):
+        """删除过期条目，返回删除数量"""
+        if not self.ttl_seconds:
+            return 0
+        with self._lock:
+            try:
+                deleted = self._conn.execute(
+                    "DELETE FROM completions WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+                ).rowcount
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                print(f"⚠️ 清理模型缓存失败: {e}")
+                return 0
+        return deleted
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM completions")
+            self._conn.commit()
+
+
+_CACHE = None
+_FAILED_PATH = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_completion_cache():
+    """按环境变量返回缓存实例；未启用或无法打开数据库时返回 None"""
+    global _CACHE, _FAILED_PATH
+    if os.environ.get("MODEL_CACHE_ENABLED", "1").strip().lower() not in ("1", "true", "yes"):
+        return None
+    path = os.environ.get("MODEL_CACHE_PATH") or "./model_cache.db"
+    with _CACHE_LOCK:
+        if path == _FAILED_PATH:
+            return None
+        if _CACHE is None or _CACHE.path != path:
+            retention_seconds = int(os.environ.get("FILE_RETENTION_HOURS", "24")) * 3600
+            ttl_seconds = int(os.environ.get("MODEL_CACHE_TTL_SECONDS", str(retention_seconds)))
+            try:
+                _CACHE = CompletionCache(
+                    path,
+                    ttl_seconds=min(ttl_seconds, retention_seconds) if ttl_seconds > 0 else retention_seconds,
+                    max_bytes=int(float(os.environ.get("MODEL_CACHE_MAX_MB", "200")) * 1024 * 1024),
+                )
+            except (sqlite3.Error, OSError) as e:
+                print(f"⚠️ 模型缓存不可用（{path}）: {e}")
+                _FAILED_PATH = path
+                return None
+        return _CACHE
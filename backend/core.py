@@ -1,148 +1,75 @@
 import io
 import json
-import requests
 import ast
 import os
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Cm
+from docx.text.run import Run
+
+from checkbox_resolver import resolve_choice_text
+from layout_analyzer import CELL_FILLABLE, CELL_PHOTO, PHOTO_TOKEN, analyze_table_headers, classify_cell
+from profile_entities import extract_profile_entities
+from profile_normalizer import (
+    PROFILE_ALIAS_INDEX,
+    PROFILE_FIELD_ALIASES,
+    ExplicitValueIndex,
+    build_profile_reuse_context,
+    normalize_profile_key,
+    parse_profile,
+)
+from story_scanner import (
+    TAG_P,
+    TAG_R,
+    TAG_TBL,
+    StoryNodeLocator,
+    iter_body_tables,
+    iter_story_blocks,
+    open_docx_archive,
+    paragraph_text,
+    read_table_rows,
+    scan_story_parts,
+    table_cell_texts,
+    table_default_font,
+)
+from template_diff import carry_over_inferred_headers, diff_templates
+from deadline import DeadlineExceeded, bind_current_deadline, check_deadline, current_deadline, request_timeout
+from model_hedging import hedged_call
+from model_stats import record_cache_hit, record_model_call
+from completion_cache import get_completion_cache
+from model_provider import DEFAULT_MODEL_API_URL, DEFAULT_MODEL_ENDPOINT, ModelProvider, get_model_provider
+
+
+def prepare_profile_context(user_info_text):
+    """
+    归一化个人信息（标准化字段映射 + 明确值集合 + 明确值索引），同一份资料填多个模板时只需计算一次
 
-PROFILE_FIELD_ALIASES = {
-    "姓名": ["名字", "姓名（中文）", "姓名(中文)", "name"],
-    "性别": ["gender"],
-    "出生日期": ["生日", "出生年月", "出生时间", "birth", "dateofbirth"],
-    "身份证号": ["身份证", "身份证号码", "证件号码", "id", "idcard"],
-    "手机号码": ["手机号", "手机", "电话", "联系电话", "联系方式", "mobile", "phone"],
-    "电子邮箱": ["邮箱", "邮件", "email", "e-mail"],
-    "毕业院校": ["毕业学校", "学校", "院校", "高校", "university", "college"],
-    "学历": ["教育程度", "education", "degree"],
-    "专业": ["所学专业", "major"],
-    "毕业时间": ["毕业日期", "graduation", "graduationdate"],
-    "应聘岗位": ["应聘职位", "求职岗位", "职位", "岗位", "position", "jobtitle"],
-    "期望城市": ["意向城市", "目标城市", "求职城市", "expectedcity"],
-    "现居住地": ["现居", "居住地", "居住地址", "地址", "address", "location"],
-    "政治面貌": ["政治身份"],
-    "紧急联系人": ["联系人", "紧急联络人", "emergencycontact"],
-    "紧急联系人电话": ["紧急联系人手机号", "紧急联系电话", "emergencyphone"],
-}
-
-PROFILE_KEY_NOISE_TOKENS = [
-    "必填",
-    "选填",
-    "必选",
-    "可选",
-    "required",
-    "optional",
-    "请填写",
-    "请输入",
-]
-
-
-def _normalize_profile_key(key):
-    cleaned = re.sub(r"[\s_\-（）()【】\[\]·.]+", "", key or "")
-    cleaned = cleaned.lower()
-    for token in PROFILE_KEY_NOISE_TOKENS:
-        cleaned = cleaned.replace(token, "")
-    return cleaned.strip()
-
-
-def _extract_profile_pairs(user_info_text):
-    parsed_fields = {}
-    for raw_line in (user_info_text or "").splitlines():
-        line = raw_line.strip()
-        if not line:
-            continue
-
-        line = re.sub(r"^[-*•·]+\s*", "", line)
-        line = re.sub(r"^\d+[.)、]\s*", "", line)
-
-        if not re.search(r"[：:=]", line):
-            continue
-
-        parts = re.split(r"[：:=]", line, maxsplit=1)
-        if len(parts) != 2:
-            continue
-
-        key = parts[0].strip()
-        value = parts[1].strip().strip('"\'')
-        if not key or not value:
-            continue
-
-        normalized_key = _normalize_profile_key(key)
-        if normalized_key and normalized_key not in parsed_fields:
-            parsed_fields[normalized_key] = value
-
-    return parsed_fields
-
-
-def _collect_explicit_profile_values(user_info_text):
-    explicit_values = set()
-    for value in _extract_profile_pairs(user_info_text).values():
-        normalized_value = re.sub(r"\s+", "", str(value or ""))
-        if normalized_value:
-            explicit_values.add(normalized_value)
-    return explicit_values
-
-
-def _is_explicit_value(value, explicit_values, raw_text=""):
-    normalized_value = re.sub(r"\s+", "", str(value or "")).strip()
-    if not normalized_value:
-        return False
-
-    if normalized_value in explicit_values:
-        return True
-
-    # 允许短语包含关系（例如 "上海" vs "上海市浦东新区"）
-    if len(normalized_value) <= 1:
-        return False
-
-    for explicit in explicit_values:
-        if len(explicit) <= 1:
-            continue
-        if normalized_value in explicit or explicit in normalized_value:
-            return True
-
-    # 回退检查：在原始用户文本中直接搜索（去除空格后匹配）
-    # 解决 PDF 提取的流式文本无法被解析为 key:value 对的问题
-    if raw_text:
-        normalized_raw = re.sub(r"\s+", "", raw_text)
-        if len(normalized_value) >= 2 and normalized_value in normalized_raw:
-            return True
-
-    return False
-
-
-def build_profile_reuse_context(user_info_text):
-    if not user_info_text:
-        return user_info_text
-
-    if "## 标准化资料映射（系统自动生成，用于跨模板复用）" in user_info_text:
-        return user_info_text
-
-    parsed_fields = _extract_profile_pairs(user_info_text)
-    if not parsed_fields:
-        return user_info_text
-
-    canonical_pairs = []
-    for canonical, aliases in PROFILE_FIELD_ALIASES.items():
-        candidates = [canonical] + aliases
-        matched_value = None
-        for candidate in candidates:
-            candidate_key = _normalize_profile_key(candidate)
-            if candidate_key in parsed_fields:
-                matched_value = parsed_fields[candidate_key]
-                break
-
-        if matched_value:
-            canonical_pairs.append((canonical, matched_value))
+    自由文本中抽取到的实体（身份证号、手机号等）补充到标准字段和明确值中，
+    键值对中已有的字段优先
 
-    if not canonical_pairs:
-        return user_info_text
+    Returns:
+        dict: {"normalized_text": 归一化后的资料文本, "explicit_values": 明确值集合,
+               "canonical_fields": {标准字段: 值}, "profile_fields": {归一化字段名: 值},
+               "explicit_index": ExplicitValueIndex}
+    """
+    profile = parse_profile(user_info_text)
+    entities = extract_profile_entities(user_info_text)
+    canonical_fields = {**entities, **profile["canonical_fields"]}
+    explicit_values = profile["explicit_values"] | {re.sub(r"\s+", "", value) for value in entities.values()}
+
+    return {
+        "normalized_text": profile["normalized_text"],
+        "explicit_values": explicit_values,
+        "canonical_fields": canonical_fields,
+        "profile_fields": profile["profile_fields"],
+        "explicit_index": ExplicitValueIndex(explicit_values, profile["normalized_text"]),
+    }
 
-    augmented_lines = ["", "## 标准化资料映射（系统自动生成，用于跨模板复用）"]
-    augmented_lines.extend([f"{k}：{v}" for k, v in canonical_pairs])
-    return user_info_text.rstrip() + "\n" + "\n".join(augmented_lines)
 
 def analyze_missing_fields(docx_bytes, user_info_text):
     """
@@ -155,24 +82,19 @@ def analyze_missing_fields(docx_bytes, user_info_text):
     Returns:
         list: 缺失的字段名称列表
     """
-    from docx import Document
-
-    doc = Document(io.BytesIO(docx_bytes))
     normalized_user_info_text = build_profile_reuse_context(user_info_text)
 
-    # 1. 收集表格的表头和占位符信息
+    # 1. 收集表格的表头和占位符信息（流式读取正文表格，不构建 python-docx 对象树）
     placeholder_info = {}  # {占位符: 表格位置描述}
     all_headers = []  # 所有表头文本
 
-    for t_idx, table in enumerate(doc.tables):
-        if not table.rows:
+    for t_idx, tbl in enumerate(iter_body_tables(docx_bytes)):
+        row_texts = table_cell_texts(read_table_rows(tbl))
+        if not row_texts:
             continue
 
         # 获取表头行
-        header_row = table.rows[0]
-        headers = []
-        for c_idx, cell in enumerate(header_row.cells):
-            headers.append(cell.text.strip())
+        headers = [text.strip() for text in row_texts[0]]
 
         # 收集表头信息
         for h_idx, header in enumerate(headers):
@@ -180,16 +102,15 @@ def analyze_missing_fields(docx_bytes, user_info_text):
                 all_headers.append(header)
 
         # 标记空单元格并记录位置
-        max_cols = max(len(row.cells) for row in table.rows)
+        max_cols = max(len(texts) for texts in row_texts)
         counter = 1
 
-        for r_idx, row in enumerate(table.rows):
+        for r_idx, texts in enumerate(row_texts):
             for c_idx in range(max_cols):
-                if c_idx >= len(row.cells):
+                if c_idx >= len(texts):
                     continue
 
-                cell = row.cells[c_idx]
-                text = cell.text.strip()
+                text = texts[c_idx].strip()
 
                 if not text:
                     # 为空单元格创建占位符
@@ -212,11 +133,8 @@ def analyze_missing_fields(docx_bytes, user_info_text):
     headers_text = "\n".join([f"- {h}" for h in all_headers if h])
     placeholders_text = "\n".join([f"- {k}: 表头={v['header'] if v['header'] else '无'}" for k, v in placeholder_info.items()])
 
-    url = os.environ.get("API_BASE_URL") or "https://api-inference.modelscope.cn/v1/chat/completions"
-    if url and not url.endswith("/chat/completions"):
-        url = url.rstrip("/") + "/chat/completions"
-    api_key = os.environ.get("MODELSCOPE_API_KEY", "")
-    model_endpoint = os.environ.get("MODEL_ENDPOINT") or "deepseek-ai/DeepSeek-V3.2"
+    profile = model_profile("analyze_missing")
+    provider = profile["provider"]
 
     prompt = f"""你是一个表单字段分析助手。请仔细分析表格中的空单元格和个人信息，找出哪些字段在个人信息中没有明确提供。
 
@@ -242,19 +160,12 @@ def analyze_missing_fields(docx_bytes, user_info_text):
 
 只返回字段名称数组，不要其他解释。"""
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    data = {
-        "model": model_endpoint,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,  # 较低温度使结果更稳定
-        "top_p": 0.7,
-        "max_tokens": 500
-    }
+    data = _model_request_data(profile, [{"role": "user", "content": prompt}])
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = _chat_completion(provider, data, "analyze_missing")
         if response.status_code != 200:
-            key_prefix = api_key[:5] + "..." if api_key else "NOT_SET"
+            key_prefix = provider.key_prefix()
             print(f"❌ AI API (推断字段) 返回错误状态码: {response.status_code}, Key: {key_prefix}, 详细信息: {response.text}")
             return []
 
@@ -284,6 +195,8 @@ def analyze_missing_fields(docx_bytes, user_info_text):
                 return matches
             print(f"⚠️ 正则提取失败，原始内容: {content[:200]}")
             return []
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ 分析缺失字段失败: {e}")
         return []
@@ -305,39 +218,33 @@ def audit_template(docx_bytes, user_info_text):
             "missing_count": int
         }
     """
-    from docx import Document
-
-    doc = Document(io.BytesIO(docx_bytes))
     normalized_user_info_text = build_profile_reuse_context(user_info_text)
 
-    # 1. 收集占位符和表头信息，构建 Markdown 表格
+    # 1. 收集占位符和表头信息，构建 Markdown 表格（流式读取正文表格，不构建 python-docx 对象树）
     placeholder_info = {}  # {占位符: {"header": str, "table_index": int, "row_index": int, "col_index": int}}
     markdown_lines = []
 
-    for t_idx, table in enumerate(doc.tables):
-        if not table.rows:
+    for t_idx, tbl in enumerate(iter_body_tables(docx_bytes)):
+        row_texts = table_cell_texts(read_table_rows(tbl))
+        if not row_texts:
             continue
 
         markdown_lines.append(f"\n### 表格 {t_idx + 1}\n")
 
         # 获取表头行
-        header_row = table.rows[0]
-        headers = []
-        for c_idx, cell in enumerate(header_row.cells):
-            headers.append(cell.text.strip())
+        headers = [text.strip() for text in row_texts[0]]
 
         # 预计算最大列数
-        max_cols = max(len(row.cells) for row in table.rows)
+        max_cols = max(len(texts) for texts in row_texts)
 
-        for r_idx, row in enumerate(table.rows):
+        for r_idx, texts in enumerate(row_texts):
             row_cells_content = []
             for c_idx in range(max_cols):
-                if c_idx >= len(row.cells):
+                if c_idx >= len(texts):
                     row_cells_content.append("")
                     continue
 
-                cell = row.cells[c_idx]
-                text = cell.text.strip()
+                text = texts[c_idx].strip()
 
                 if not text:
                     # 空单元格作为占位符
@@ -363,11 +270,8 @@ def audit_template(docx_bytes, user_info_text):
         return {"success": True, "items": [], "matched_count": 0, "missing_count": 0}
 
     # 2. 调用 AI 分析匹配情况
-    url = os.environ.get("API_BASE_URL") or "https://api-inference.modelscope.cn/v1/chat/completions"
-    if url and not url.endswith("/chat/completions"):
-        url = url.rstrip("/") + "/chat/completions"
-    api_key = os.environ.get("MODELSCOPE_API_KEY", "")
-    model_endpoint = os.environ.get("MODEL_ENDPOINT") or "deepseek-ai/DeepSeek-V3.2"
+    profile = model_profile("audit")
+    provider = profile["provider"]
 
     # 构建占位符信息文本
     placeholders_text = "\n".join([
@@ -402,19 +306,12 @@ def audit_template(docx_bytes, user_info_text):
 
 只返回 JSON，不要其他解释。"""
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    data = {
-        "model": model_endpoint,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,
-        "top_p": 0.7,
-        "max_tokens": 2000
-    }
+    data = _model_request_data(profile, [{"role": "user", "content": prompt}])
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = _chat_completion(provider, data, "audit", cache=True)
         if response.status_code != 200:
-            key_prefix = api_key[:5] + "..." if api_key else "NOT_SET"
+            key_prefix = provider.key_prefix()
             print(f"❌ AI API (分析缺失字段) 返回错误: {response.status_code}, Key: {key_prefix}, 详细信息: {response.text}")
             return {"success": False, "error": f"API error: {response.status_code}", "items": []}
 
@@ -452,23 +349,188 @@ def audit_template(docx_bytes, user_info_text):
     except json.JSONDecodeError as e:
         print(f"❌ JSON 解析失败: {e}, 内容: {content[:200]}")
         return {"success": False, "error": f"JSON parse error: {str(e)}", "items": []}
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ 审核模板失败: {e}")
         return {"success": False, "error": str(e), "items": []}
 
 
-def get_modelscope_response(user_info, markdown_context):
+DEFAULT_LIGHT_MODEL_ENDPOINT = "Qwen/Qwen3-8B"
+
+# 各任务的模型与参数：填表用强模型并开启思考；字段名推断、缺失字段检查用小模型，关闭思考
+MODEL_TASK_PROFILES = {
+    "fill": {"light": False, "thinking": True, "params": {"temperature": 0.2, "top_p": 0.3}},
+    "audit": {"light": False, "thinking": None, "params": {"temperature": 0.3, "top_p": 0.7, "max_tokens": 2000}},
+    "analyze_missing": {"light": True, "thinking": False, "params": {"temperature": 0.3, "top_p": 0.7, "max_tokens": 500}},
+    "infer_fields": {"light": True, "thinking": False, "params": {"temperature": 0.3, "top_p": 0.7, "max_tokens": 500}},
+}
+
+
+def model_profile(task):
+    """
+    任务使用的模型配置
+
+    模型依次取 MODEL_ENDPOINT_<TASK>（如 MODEL_ENDPOINT_INFER_FIELDS）、
+    小模型任务的 MODEL_LIGHT_ENDPOINT、MODEL_ENDPOINT；小模型任务在默认接口（ModelScope）上
+    未配置时使用 DEFAULT_LIGHT_MODEL_ENDPOINT。MODEL_THINKING_<TASK>=0/1 可覆盖是否开启思考
+
+    Returns:
+        dict: {"task", "provider", "url", "api_key", "model", "thinking", "params"}，provider 见 model_provider
+    """
+    spec = MODEL_TASK_PROFILES[task]
+    suffix = task.upper()
+    provider = get_model_provider()
+    url = provider.url
+
+    model = os.environ.get(f"MODEL_ENDPOINT_{suffix}")
+    if not model and spec["light"]:
+        model = os.environ.get("MODEL_LIGHT_ENDPOINT")
+        if not model and url == DEFAULT_MODEL_API_URL:
+            model = DEFAULT_LIGHT_MODEL_ENDPOINT
+    model = model or os.environ.get("MODEL_ENDPOINT") or DEFAULT_MODEL_ENDPOINT
+
+    thinking = spec["thinking"]
+    thinking_override = os.environ.get(f"MODEL_THINKING_{suffix}", "").strip().lower()
+    if thinking_override:
+        thinking = thinking_override in ("1", "true", "yes")
+
+    return {
+        "task": task,
+        "provider": provider,
+        "url": url,
+        "api_key": provider.api_key,
+        "model": model,
+        "thinking": thinking,
+        "params": dict(spec["params"]),
+    }
+
+
+def _model_request_data(profile, messages):
+    """按任务配置构造 chat/completions 请求体"""
+    return profile["provider"].payload(profile["model"], messages, profile["params"], profile["thinking"])
+
+
+class _CachedCompletion:
+    """磁盘缓存命中时代替 requests 的 Response 返回给调用方"""
+
+    status_code = 200
+
+    def __init__(self, content):
+        self.text = content
+
+    def json(self):
+        return {"choices": [{"message": {"role": "assistant", "content": self.text}}]}
+
+
+def _is_json_reply(content):
+    """回复是否为（可能包在代码块中的）JSON，只缓存这样的回复，避免把异常回复保存下来反复使用"""
+    try:
+        json.loads((content or "").replace("```json", "").replace("```", "").strip())
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def _chat_completion(provider, data, lane, cache=False):
+    """
+    发送一次 chat/completions 请求
+
+    请求前检查当前请求的截止时间，超时不超过 MODEL_TIMEOUT_SECONDS（默认 120 秒）和剩余时间。
+    按 lane（任务名）统计延迟、token 用量（见 model_stats），启用 MODEL_HEDGE_ENABLED 后慢请求会被对冲（见 model_hedging），
+    配置了 MODEL_HEDGE_URL 时对冲请求发往备用接口（MODEL_HEDGE_API_KEY / MODEL_HEDGE_MODEL 可选）。
+    cache=True 时先查磁盘缓存（见 completion_cache），主接口成功且为 JSON 的回复写回缓存
+    """
+    check_deadline()
+    completion_cache = get_completion_cache() if cache else None
+    if completion_cache is not None:
+        content = completion_cache.get(provider.url, data)
+        if content is not None:
+            print(f"💾 {lane} 命中模型缓存")
+            record_cache_hit(lane, data.get("model"))
+            return _CachedCompletion(content)
+
+    timeout_cap = int(os.environ.get("MODEL_TIMEOUT_SECONDS", "120"))
+
+    def send(session, target=provider, target_data=data):
+        return target.post(target_data, timeout=request_timeout(timeout_cap), session=session)
+
+    hedge_send = None
+    hedge_url = os.environ.get("MODEL_HEDGE_URL")
+    if hedge_url:
+        hedge_provider = ModelProvider(hedge_url, os.environ.get("MODEL_HEDGE_API_KEY") or provider.api_key, name="hedge")
+        hedge_data = data
+        hedge_model = os.environ.get("MODEL_HEDGE_MODEL")
+        if hedge_model:
+            hedge_data = {**data, "model": hedge_model}
+
+        def hedge_send(session):
+            response = send(session, hedge_provider, hedge_data)
+            response.from_hedge_endpoint = True
+            return response
+
+    start = time.monotonic()
+    try:
+        response = hedged_call(lane, send, hedge_send)
+    except DeadlineExceeded:
+        raise
+    except Exception:
+        record_model_call(lane, data.get("model"), time.monotonic() - start)
+        raise
+
+    usage = None
+    if response.status_code == 200:
+        try:
+            usage = response.json().get("usage")
+        except ValueError:
+            pass
+    record_model_call(lane, data.get("model"), time.monotonic() - start, response.status_code, usage)
+
+    # 缓存键是主接口的地址和请求体，备用接口/模型给出的回复不写入，避免以主模型的名义复用
+    if completion_cache is not None and response.status_code == 200 and not getattr(response, "from_hedge_endpoint", False):
+        try:
+            content = provider.message_content(response.json())
+        except ValueError:
+            content = None
+        if content and _is_json_reply(content):
+            completion_cache.put(provider.url, data, content)
+    return response
+
+
+def get_modelscope_response(user_info, markdown_context, placeholder_types=None, expected_keys=None):
     """
     参考 smart.py 的提示词思路，使用 Markdown 表格作为上下文
+
+    请求按 JSON Schema 约束输出（MODEL_RESPONSE_FORMAT，服务不支持时自动退回普通提示），
+    返回结果按期望的占位符校验；缺失或无法解析的占位符在同一对话中追问，
+    追问只要求这些占位符，次数上限为 MODEL_REASK_LIMIT（默认 1）。
+
+    Args:
+        placeholder_types: 可选，需要模型处理的占位符类型集合（empty/checkbox/fillblank），
+                           复选框/填空线的处理规则只在对应类型存在时写入提示词；
+                           为 None 时根据上下文中是否出现 □/___ 判断
+        expected_keys: 可选，需要模型返回的占位符列表；为 None 时取上下文中出现的全部占位符
     """
     if isinstance(user_info, bytes):
         user_info = user_info.decode('utf-8')
 
-    url = os.environ.get("API_BASE_URL") or "https://api-inference.modelscope.cn/v1/chat/completions"
-    if url and not url.endswith("/chat/completions"):
-        url = url.rstrip("/") + "/chat/completions"
-    api_key = os.environ.get("MODELSCOPE_API_KEY", "")
-    model_endpoint = os.environ.get("MODEL_ENDPOINT") or "deepseek-ai/DeepSeek-V3.2"
+    if placeholder_types is None:
+        placeholder_types = {"empty"}
+        if '□' in markdown_context:
+            placeholder_types.add("checkbox")
+        if '___' in markdown_context:
+            placeholder_types.add("fillblank")
+
+    choice_rules = ""
+    if "checkbox" in placeholder_types:
+        choice_rules += """
+   - 包含复选框（□）：仔细阅读原内容，原样返回并只将对应的“□”替换为“[√]”或“■”。例如原内容"□精通 □不会"，若用户精通，应返回"[√]精通 □不会"。若无法确定，必须返回原内容不变。"""
+    if "fillblank" in placeholder_types:
+        choice_rules += """
+   - 包含填空线（___）：仔细阅读原内容，在下划线的位置填入获取的信息并一同返回。例如原内容"持有___证"，若有C1证，应返回"持有 C1 证"。若无法确定，必须返回原内容不变。"""
+
+    profile = model_profile("fill")
+    provider = profile["provider"]
 
     # 参考 smart.py 的提示词构建方式
     prompt = f"""你是一个专业的占位符替换助手。请分析以下 Markdown 格式的表单上下文和个人信息，输出每个占位符应填的内容。
@@ -477,9 +539,7 @@ def get_modelscope_response(user_info, markdown_context):
 1. 仅基于【个人信息】中明确出现的内容进行填写，不得编造。
 2. 仔细分析表格/段落中的占位符格式（如 {{1}}、{{2}} 等），以及其所在位置及原内容。
 3. 占位符处理规则：
-   - 空单元格：提取信息后直接填入。如果无法确定，必须返回空字符串 ""
-   - 包含复选框（□）：仔细阅读原内容，原样返回并只将对应的“□”替换为“[√]”或“■”。例如原内容"□精通 □不会"，若用户精通，应返回"[√]精通 □不会"。若无法确定，必须返回原内容不变。
-   - 包含填空线（___）：仔细阅读原内容，在下划线的位置填入获取的信息并一同返回。例如原内容"持有___证"，若有C1证，应返回"持有 C1 证"。若无法确定，必须返回原内容不变。
+   - 空单元格：提取信息后直接填入。如果无法确定，必须返回空字符串 ""{choice_rules}
 4. 返回格式必须是纯 JSON，不需要解释，格式类似：{{"{{1}}": "内容", "{{2}}": "内容"}}。
 
 **个人信息：**
@@ -489,330 +549,747 @@ def get_modelscope_response(user_info, markdown_context):
 {markdown_context}
 
 **注意：**
-- 只返回需要替换的占位符映射。
+- 返回全部占位符的映射，无法确定的占位符按上面的规则处理。
 - 确保 JSON 格式正确，不要包含额外的解释性文字。"""
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    data = {
-        "model": model_endpoint, 
-        "messages": [{"role": "user", "content": prompt}], 
-        "temperature": 0.2,
-        "top_p": 0.3,
-        "extra_body": {"enable_thinking": True}
+    if expected_keys is None:
+        expected_keys = list(dict.fromkeys(_PLACEHOLDER_RE.findall(markdown_context)))
+    reask_limit = max(0, int(os.environ.get("MODEL_REASK_LIMIT", "1")))
+
+    messages = [{"role": "user", "content": prompt}]
+    normalized_fill_data = {}
+    pending = list(expected_keys)
+
+    for attempt in range(reask_limit + 1):
+        try:
+            content = _post_fill_completion(profile, messages, pending)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"❌ Error during AI inference: {e}")
+            break
+        if content is None:
+            break
+
+        for key, value in _normalize_fill_values(_parse_fill_content(content)).items():
+            # 追问时只接受被追问的占位符，已得到的结果不被覆盖
+            if attempt == 0 or key in pending:
+                normalized_fill_data[key] = value
+
+        pending = [key for key in expected_keys if key not in normalized_fill_data]
+        if not pending or attempt == reask_limit:
+            break
+
+        print(f"🔁 AI 返回缺少 {len(pending)}/{len(expected_keys)} 个占位符，追问: {pending}")
+        messages = messages + [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": (
+                f"上一次回复中以下占位符缺失或无法解析：{'、'.join(pending)}。\n"
+                "请只返回这些占位符的纯 JSON 映射，值为字符串；无法确定时返回空字符串 \"\"，不要包含其他内容。"
+            )},
+        ]
+
+    if pending and normalized_fill_data:
+        print(f"⚠️ 追问后仍缺少 {len(pending)} 个占位符: {pending}")
+
+    # 打印 fill_data 供 server_with_auth.py 记录
+    print(f"📋 AI 生成的填充数据: {normalized_fill_data}")
+    return normalized_fill_data
+
+
+_PLACEHOLDER_RE = re.compile(r"\{\d+\}")
+_PLACEHOLDER_KEY_RE = re.compile(r"^\{\d+\}$")
+_UNCERTAIN_VALUE_TOKENS = ["无法确定", "未提供", "未知", "根据提供信息", "推断"]
+# 不支持 response_format 的 (接口地址, 模型, 格式)，之后不再携带，避免每次请求都先失败一次
+_UNSUPPORTED_RESPONSE_FORMATS = set()
+
+
+def _fill_response_format(keys):
+    """按 MODEL_RESPONSE_FORMAT（json_schema/json_object/none）生成 response_format"""
+    mode = os.environ.get("MODEL_RESPONSE_FORMAT", "json_schema").strip().lower()
+    if mode == "json_object":
+        return {"type": "json_object"}
+    if mode != "json_schema" or not keys:
+        return None
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": "fill_data",
+            "strict": True,
+            "schema": {
+                "type": "object",
+                "properties": {key: {"type": "string"} for key in keys},
+                "required": list(keys),
+                "additionalProperties": False,
+            },
+        },
     }
 
-    try:
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code != 200:
-            key_prefix = api_key[:5] + "..." if api_key else "NOT_SET"
-            print(f"❌ AI API (内容填充) 返回错误: {response.status_code}, Key: {key_prefix}, 详细信息: {response.text}")
-            return {}
 
-        res_json = response.json()
-        content = res_json['choices'][0]['message']['content']
+def _post_fill_completion(profile, messages, keys):
+    """
+    发送一次填充请求，返回模型回复的文本；接口报错时返回 None
 
-        # 清理 Markdown 代码块标记 (参考 smart.py 的解析逻辑)
-        content = content.replace("```json", "").replace("```", "").strip()
+    服务端拒绝 response_format（400/422）时去掉该参数重发一次，并记住不再携带
+    """
+    provider, url, model_endpoint = profile["provider"], profile["url"], profile["model"]
+    data = _model_request_data(profile, messages)
+    response_format = _fill_response_format(keys)
+    if response_format and (url, model_endpoint, response_format["type"]) not in _UNSUPPORTED_RESPONSE_FORMATS:
+        data["response_format"] = response_format
+    else:
+        response_format = None
+
+    response = _chat_completion(provider, data, "fill", cache=True)
+    if response.status_code in (400, 422) and response_format:
+        print(f"⚠️ 模型服务不支持 response_format={response_format['type']}，改为仅通过提示词约束 JSON")
+        _UNSUPPORTED_RESPONSE_FORMATS.add((url, model_endpoint, response_format["type"]))
+        data.pop("response_format")
+        response = _chat_completion(provider, data, "fill", cache=True)
+
+    if response.status_code != 200:
+        print(f"❌ AI API (内容填充) 返回错误: {response.status_code}, Key: {provider.key_prefix()}, 详细信息: {response.text}")
+        return None
 
-        # 更鲁棒的 JSON 提取逻辑
+    res_json = response.json()
+    return res_json['choices'][0]['message']['content']
+
+
+def _parse_fill_content(content):
+    """解析模型回复中的 JSON 对象（兼容代码块、前后解释文字、Python 字面量），失败时返回 {}"""
+    # 清理 Markdown 代码块标记 (参考 smart.py 的解析逻辑)
+    content = (content or "").replace("```json", "").replace("```", "").strip()
+
+    # 更鲁棒的 JSON 提取逻辑
+    try:
+        fill_data = json.loads(content)
+    except json.JSONDecodeError:
         try:
-            fill_data = json.loads(content)
-        except json.JSONDecodeError:
+            # 尝试匹配第一个 { 和最后一个 }
+            match = re.search(r'\{.*\}', content, re.DOTALL)
+            if match:
+                extracted_json = match.group(0)
+                print(f"📝 提取到 JSON: {extracted_json[:100]}...")
+                fill_data = json.loads(extracted_json)
+            else:
+                print("⚠️ 未找到 JSON 格式内容")
+                fill_data = {}
+        except (json.JSONDecodeError, AttributeError) as e:
+            print(f"❌ JSON 解析失败: {e}")
             try:
-                # 尝试匹配第一个 { 和最后一个 }
-                match = re.search(r'\{.*\}', content, re.DOTALL)
-                if match:
-                    extracted_json = match.group(0)
-                    print(f"📝 提取到 JSON: {extracted_json[:100]}...")
-                    fill_data = json.loads(extracted_json)
-                else:
-                    print("⚠️ 未找到 JSON 格式内容")
-                    fill_data = {}
-            except (json.JSONDecodeError, AttributeError) as e:
-                print(f"❌ JSON 解析失败: {e}")
-                try:
-                    fill_data = ast.literal_eval(content)
-                except:
-                    print("❌ 所有 JSON 解析方法都失败")
-                    fill_data = {}
-
-        # 结果归一化：仅保留占位符键，并清理疑似解释性文本
-        normalized_fill_data = {}
-        for key, value in (fill_data or {}).items():
-            if not isinstance(key, str):
-                continue
+                fill_data = ast.literal_eval(content)
+            except:
+                print("❌ 所有 JSON 解析方法都失败")
+                fill_data = {}
 
-            normalized_key = key if key.startswith("{") else f"{{{key}}}"
-            if not re.match(r"^\{\d+\}$", normalized_key):
-                continue
+    return fill_data if isinstance(fill_data, dict) else {}
 
-            normalized_value = "" if value is None else str(value).strip()
-            if any(token in normalized_value for token in ["无法确定", "未提供", "未知", "根据提供信息", "推断"]):
-                normalized_value = ""
 
-            normalized_fill_data[normalized_key] = normalized_value
+def _normalize_fill_values(fill_data):
+    """结果归一化：仅保留占位符键，并清理疑似解释性文本；值为对象/数组的视为无法解析，不保留"""
+    normalized_fill_data = {}
+    for key, value in fill_data.items():
+        if not isinstance(key, str):
+            continue
 
-        # 打印 fill_data 供 server_with_auth.py 记录
-        print(f"📋 AI 生成的填充数据: {normalized_fill_data}")
-        return normalized_fill_data
-    except Exception as e:
-        print(f"❌ Error during AI inference: {e}")
-        return {}
+        normalized_key = key if key.startswith("{") else f"{{{key}}}"
+        if not _PLACEHOLDER_KEY_RE.match(normalized_key):
+            continue
+        if isinstance(value, (dict, list, tuple, set)):
+            continue
+
+        normalized_value = "" if value is None else str(value).strip()
+        if any(token in normalized_value for token in _UNCERTAIN_VALUE_TOKENS):
+            normalized_value = ""
 
-def _get_table_default_font(table):
-    """获取表格的默认字体格式（从第一个有格式的非空单元格提取）"""
-    default_font_name = None
-    default_font_size = None
-    for row in table.rows:
-        for cell in row.cells:
-            for paragraph in cell.paragraphs:
-                if paragraph.runs:
-                    run = paragraph.runs[0]
-                    if run.font.name:
-                        default_font_name = run.font.name
-                    if run.font.size:
-                        default_font_size = run.font.size
-                    if default_font_name or default_font_size:
-                        return default_font_name, default_font_size
-    return default_font_name, default_font_size
+        normalized_fill_data[normalized_key] = normalized_value
+    return normalized_fill_data
 
 
 def _replace_paragraph_text_preserve_format(paragraph, new_text, default_font_name=None, default_font_size=None):
-    first_run_format = None
-    if paragraph.runs:
-        first_run = paragraph.runs[0]
-        first_run_format = {
-            'name': first_run.font.name,
-            'size': first_run.font.size,
-            'bold': first_run.font.bold,
-            'italic': first_run.font.italic,
-            'underline': first_run.font.underline,
-        }
+    """
+    替换段落文本，保持原有格式。
 
-    for run in list(paragraph.runs):
-        r = run._element
-        r.getparent().remove(r)
+    直接复用第一个 run（连同其 rPr）写入新文本并删除其余 run，不逐项复制字体属性；
+    段落没有 run 时才新建 run，并使用表格默认字体。
+    """
+    p = paragraph._p
+    runs = p.r_lst
+    if runs:
+        for r in runs[1:]:
+            p.remove(r)
+        Run(runs[0], paragraph).text = new_text
+        return
 
     new_run = paragraph.add_run(new_text)
-    if first_run_format:
-        if first_run_format['name']:
-            new_run.font.name = first_run_format['name']
-        if first_run_format['size']:
-            new_run.font.size = first_run_format['size']
-        if first_run_format['bold'] is not None:
-            new_run.font.bold = first_run_format['bold']
-        if first_run_format['italic'] is not None:
-            new_run.font.italic = first_run_format['italic']
-        if first_run_format['underline'] is not None:
-            new_run.font.underline = first_run_format['underline']
-    elif default_font_name or default_font_size:
-        if default_font_name:
-            new_run.font.name = default_font_name
-        if default_font_size:
-            new_run.font.size = default_font_size
+    if default_font_name:
+        new_run.font.name = default_font_name
+    if default_font_size:
+        new_run.font.size = default_font_size
+
 
 def _replace_cell_text_preserve_format(cell, new_text, default_font_name=None, default_font_size=None):
     """
-    替换单元格文本，保持原有格式。
+    替换单元格文本，保持原有格式（只处理第一个段落）。
     """
-    for paragraph in cell.paragraphs:
-        # 1. 保存第一个 run 的格式
-        first_run_format = None
-        if paragraph.runs:
-            first_run = paragraph.runs[0]
-            first_run_format = {
-                'name': first_run.font.name,
-                'size': first_run.font.size,
-                'bold': first_run.font.bold,
-                'italic': first_run.font.italic,
-                'underline': first_run.font.underline,
-            }
+    paragraphs = cell.paragraphs
+    if paragraphs:
+        _replace_paragraph_text_preserve_format(paragraphs[0], new_text, default_font_name, default_font_size)
+
+
+def _needs_table_default_font(cell):
+    """单元格第一个段落没有可复用的 run 时，写入需要回退到表格默认字体"""
+    p = cell._tc.find(TAG_P)
+    return p is not None and p.find(TAG_R) is None
 
-        # 2. 删除所有 run（保留段落本身的属性如对齐方式）
-        for run in list(paragraph.runs):
-            r = run._element
-            r.getparent().remove(r)
-
-        # 3. 添加新 run 并恢复格式
-        new_run = paragraph.add_run(new_text)
-
-        if first_run_format:
-            if first_run_format['name']:
-                new_run.font.name = first_run_format['name']
-            if first_run_format['size']:
-                new_run.font.size = first_run_format['size']
-            if first_run_format['bold'] is not None:
-                new_run.font.bold = first_run_format['bold']
-            if first_run_format['italic'] is not None:
-                new_run.font.italic = first_run_format['italic']
-            if first_run_format['underline'] is not None:
-                new_run.font.underline = first_run_format['underline']
-        elif default_font_name or default_font_size:
-            # 没有原格式时使用表格默认格式
-            if default_font_name:
-                new_run.font.name = default_font_name
-            if default_font_size:
-                new_run.font.size = default_font_size
-
-        # 只处理第一个段落
-        break
-
-
-def fill_form(docx_bytes, user_info_text, photo_bytes, return_fill_data=False, prefilled_data=None, return_metadata=False):
+
+def _placeholder_type(text):
+    return "checkbox" if '□' in text else "fillblank" if '___' in text else "empty"
+
+
+def compile_template(doc, docx_bytes=None):
     """
-    填充表单
+    编译模板：识别照片位置、占位符（空单元格/复选框/填空）、Markdown 上下文和预览网格
 
     Args:
-        docx_bytes: Word文档字节数据
-        user_info_text: 用户信息文本
-        photo_bytes: 照片字节数据
-        return_fill_data: 是否返回填充数据（用于减少重复推理）
-        prefilled_data: 可选，直接使用预览阶段返回的填充数据，避免重复 AI 推理
+        doc: python-docx Document 对象
+        docx_bytes: 可选，同一文档的字节数据；提供时额外流式扫描嵌套表格、文本框、页眉页脚、脚注尾注
 
     Returns:
-        如果 return_fill_data=True，返回 (output_bytes, fill_data, missing_fields)
-        其中 missing_fields 是缺失字段的表头/位置信息列表
-        否则返回 output_bytes
+        dict: 纯数据结构（不持有 docx 对象），可供填充、预览等流程复用
+            - placeholder_info: {占位符: {header, header_source, table_index, row_index, col_index, original_text, type}}
+              header_source 为字段名来源（见 layout_analyzer.analyze_table_headers）；
+              嵌套表格/文本框/页眉页脚中的占位符另有 location（显示位置）和 locator（见 story_scanner）
+            - context_blocks: 结构化上下文（表格行/段落），按需渲染全量或增量 Markdown（见 _render_markdown）
+            - photo_coords: 照片单元格坐标 [(t_idx, r_idx, c_idx)]
+            - grid: 预览网格 {"tables": [...], "paragraphs": [...]}
     """
-    doc = Document(io.BytesIO(docx_bytes))
-    normalized_user_info_text = build_profile_reuse_context(user_info_text)
-    explicit_profile_values = _collect_explicit_profile_values(normalized_user_info_text)
+    story_blocks = scan_story_parts(docx_bytes) if docx_bytes is not None else ()
+    return _compile_blocks(
+        (table._tbl for table in doc.tables),
+        ((p_idx, paragraph.text) for p_idx, paragraph in enumerate(doc.paragraphs)),
+        story_blocks,
+    )
 
-    # 1. 处理照片占位符
-    photo_coords = []
-    for t_idx, table in enumerate(doc.tables):
-        for r_idx, row in enumerate(table.rows):
-            for c_idx, cell in enumerate(row.cells):
-                text_lower = cell.text.lower()
-                if any(k in text_lower for k in ["照片", "相片", "证件照"]):
-                    photo_coords.append((t_idx, r_idx, c_idx))
 
-    if photo_coords and photo_bytes:
-        for (t_idx, r_idx, c_idx) in photo_coords:
-            cell = doc.tables[t_idx].rows[r_idx].cells[c_idx]
-            cell.text = ""
-            p = cell.paragraphs[0]
-            p.alignment = WD_ALIGN_PARAGRAPH.CENTER
-            run = p.add_run()
-            run.add_picture(io.BytesIO(photo_bytes), width=Cm(3.5))
+def compile_template_stream(docx_source):
+    """
+    流式编译模板：直接从 zip 中 iterparse 各文本部件，不构建 python-docx 对象树
 
-    # 2. 标记空单元格并构建 Markdown 上下文 (集成 smart.py 核心思路)
-    placeholder_map = {}
+    正文顶层表格逐个读入、编译后立即释放，内存峰值只与最大的表格有关，与文档长度基本无关；
+    编译结果与 compile_template(doc, docx_bytes) 相同。适合只需要预览/检查的场景和超大文档。
+
+    Args:
+        docx_source: docx 字节数据、文件路径或可 seek 的文件对象
+    """
+    paragraphs = []    # 只保留含复选框/填空线的正文段落 (p_idx, text)
+    story_blocks = []  # 嵌套表格、文本框、页眉页脚等
+
+    with open_docx_archive(docx_source) as archive:
+        def iter_body_tables():
+            # 表格在扫描过程中逐个交给编译流程；段落和其他部件的块先收集，表格编译完后再处理
+            p_idx = 0
+            for block in iter_story_blocks(archive, body_blocks=True):
+                if block["kind"] != "body":
+                    story_blocks.append(block)
+                elif block["element"].tag == TAG_TBL:
+                    yield block["element"]
+                else:
+                    text = paragraph_text(block["element"])
+                    if '___' in text or '□' in text:
+                        paragraphs.append((p_idx, text))
+                    p_idx += 1
+
+        return _compile_blocks(iter_body_tables(), paragraphs, story_blocks)
+
+
+def infer_template_headers(compiled, base_compiled=None):
+    """
+    模板库发布时为无表头的待填占位符预先推断字段名（原地修改并返回 compiled）
+
+    推断结果写入 placeholder_info[占位符]["inferred_header"]，填表时缺失字段直接使用，
+    不再按请求调用模型。返回值可 JSON 序列化后随模板保存，反序列化后直接传给
+    fill_form / preview_form 的 compiled 参数。
+
+    Args:
+        compiled: compile_template / compile_template_stream 的编译结果
+        base_compiled: 可选，结构相近的已发布模板的编译结果（如同一模板的旧版本）；
+            未变化的占位符沿用其推断结果，只为新增/变化的占位符调用模型
+    """
+    placeholder_info = compiled["placeholder_info"]
+
+    if base_compiled is not None:
+        diff = diff_templates(base_compiled, compiled)
+        carried = carry_over_inferred_headers(base_compiled, compiled, diff["slot_map"])
+        print(f"🧬 模板结构比对：{len(diff['slot_map'])} 个占位符未变化，"
+              f"{len(diff['changed_slots'])} 个新增/变化，沿用 {carried} 个推断字段名")
+
+    targets = {}
+    for tag, info in placeholder_info.items():
+        if (info.get("header") or "").strip() or info.get("inferred_header") or info["original_text"]:
+            continue
+        targets[tag] = {
+            "table_index": info.get("table_index", 0),
+            "row_index": info.get("row_index", 0),
+            "col_index": info.get("col_index", 0),
+        }
+        if info.get("location"):
+            targets[tag]["location"] = info["location"]
+
+    if targets:
+        inferred_fields = infer_field_names_with_ai(
+            targets,
+            "\n".join(_render_markdown(compiled)),
+            "（模板发布时推断，暂无用户信息，请仅根据表格结构判断）"
+        )
+        for tag, field in zip(targets, inferred_fields):
+            candidate = str(field).strip()
+            # 推断失败时模型调用会回退为占位符本身，此时不保存，留给填表时按需推断
+            if candidate and candidate != tag:
+                placeholder_info[tag]["inferred_header"] = candidate
+        print(f"🧠 模板预编译：{len(targets)} 个无表头占位符，推断出 "
+              f"{sum(1 for tag in targets if 'inferred_header' in placeholder_info[tag])} 个字段名")
+
+    return compiled
+
+
+def _compile_blocks(tables, paragraphs, story_blocks):
+    """
+    编译流程主体
+
+    Args:
+        tables: 正文顶层表格的 w:tbl 元素（可迭代，可以是边解析边产出的生成器）
+        paragraphs: 正文顶层段落 (p_idx, text)，在 tables 迭代完之后才读取
+        story_blocks: story_scanner 扫描到的块，在 paragraphs 之后读取
+    """
+    photo_coords = []
     placeholder_info = {}  # 存储占位符对应的表头信息
-    table_default_fonts = {}  # 存储每个表格的默认字体 {t_idx: (font_name, font_size)}
+    context_blocks = []
+    grid_tables = []
+    grid_paragraphs = []
     counter = 1
-    markdown_lines = []
+    table_count = 0
 
-    for t_idx, table in enumerate(doc.tables):
-        markdown_lines.append(f"\n### 表格 {t_idx + 1}\n")
+    for t_idx, tbl in enumerate(tables):
+        check_deadline()
+        table_count += 1
+        rows = read_table_rows(tbl)
 
-        # 提取表格默认字体（用于空单元格的格式回退）
-        table_default_fonts[t_idx] = _get_table_default_font(table)
+        row_texts = table_cell_texts(rows)
 
         # 预计算当前表格的最大列数
-        max_cols = max(len(row.cells) for row in table.rows) if table.rows else 0
+        max_cols = max(len(texts) for texts in row_texts) if row_texts else 0
+        cell_slots = {}  # {(r_idx, c_idx): 占位符}
+        photo_cells = set()  # {(r_idx, c_idx)}
+        context_rows = []
 
-        for r_idx, row in enumerate(table.rows):
+        # 1. 单次扫描：识别照片单元格、标记空单元格并构建 Markdown 上下文 (集成 smart.py 核心思路)
+        for r_idx, texts in enumerate(row_texts):
             row_cells_content = []
             for c_idx in range(max_cols):
                 # 越界处理
-                if c_idx >= len(row.cells):
+                if c_idx >= len(texts):
                     row_cells_content.append("")
                     continue
 
-                cell = row.cells[c_idx]
-
-                # 跳过已标记为照片的单元格
-                if (t_idx, r_idx, c_idx) in photo_coords:
-                    row_cells_content.append("[照片]")
+                cell_kind = classify_cell(texts[c_idx])
+                if cell_kind == CELL_PHOTO:
+                    photo_coords.append((t_idx, r_idx, c_idx))
+                    photo_cells.add((r_idx, c_idx))
+                    row_cells_content.append(PHOTO_TOKEN)
                     continue
 
-                text = cell.text.strip()
-                
-                skip_labels = [
-                    '姓名', '性别', '民族', '出生日期', '参加工作时间',
-                    '政治面貌', '婚姻状况', '身份证号', '学历', '毕业院校',
-                    '专业', '特长', '计算机', '能力', '是否', '残疾', '类别', '等级',
-                    '持有', '驾驶证', '情况', '联系电话', '户口地址', '常住地址',
-                    '照片', '相片', '贴', '年', '月', '日'
-                ]
-                
-                is_label = False
-                for label in skip_labels:
-                    if text == label or text == label + '：' or text == label + ':':
-                        is_label = True
-                        break
-
-                if not text or (not is_label and ('□' in text or '___' in text)):
+                text = texts[c_idx].strip()
+                # 含嵌套表格的单元格只是容器，嵌套表格由 story_scanner 单独处理
+                if cell_kind == CELL_FILLABLE and rows[r_idx]["cells"][c_idx].find(TAG_TBL) is None:
                     # 为空单元格创建占位符
                     tag = f"{{{counter}}}"
-                    # 暂时不替换 docx 中的文本或格式，我们把需要处理的结构存起来
-                    placeholder_map[tag] = {
-                        "cell": cell,
-                        "type": "checkbox" if '□' in text else "fillblank" if '___' in text else "empty",
-                        "original_text": text
-                    }
-                    # 获取表头信息
-                    header = ""
-                    if r_idx > 0 and c_idx < len(table.rows[0].cells):
-                        header_cell = table.rows[0].cells[c_idx]
-                        header = header_cell.text.strip()
-                    # 保存占位符信息，包括表头和位置
+                    # 保存占位符信息，表头在版式分析后补充
                     placeholder_info[tag] = {
-                        "header": header,
+                        "header": "",
+                        "header_source": "",
                         "table_index": t_idx + 1,
                         "row_index": r_idx + 1,
                         "col_index": c_idx + 1,
-                        "original_text": text
+                        "original_text": text,
+                        "type": _placeholder_type(text),
                     }
-                    if text:
-                        row_cells_content.append(f"{tag}(原内容:{text})")
-                    else:
-                        row_cells_content.append(tag)
+                    cell_slots[(r_idx, c_idx)] = tag
+                    row_cells_content.append({"slot": tag})
                     counter += 1
                 else:
                     row_cells_content.append(text)
-            
-            # 生成 Markdown 行
-            markdown_lines.append("| " + " | ".join(row_cells_content) + " |")
-            if r_idx == 0: # 添加分割线
-                markdown_lines.append("| " + " | ".join(["---"] * max_cols) + " |")
 
-    # 2.5 遍历段落补充（复选框、填空）
-    for p_idx, paragraph in enumerate(doc.paragraphs):
-        text = paragraph.text.strip()
+            context_rows.append(row_cells_content)
+
+        context_blocks.append({"kind": "table", "index": t_idx + 1, "columns": max_cols, "rows": context_rows})
+
+        # 2. 预览网格：按真实 <w:tc> 输出，合并单元格用 colspan/rowspan 表示
+        grid_rows = []
+        open_cells = {}  # {起始列: 纵向合并起始单元格}
+        for r_idx, row in enumerate(rows):
+            grid_row = []
+            col = row["grid_before"]
+            c_idx = 0
+            for tc, span, v_merge in row["tcs"]:
+                slots = [cell_slots[(r_idx, i)] for i in range(c_idx, c_idx + span) if (r_idx, i) in cell_slots]
+                if v_merge == "continue" and col in open_cells:
+                    merged = open_cells[col]
+                    merged["rowspan"] = merged.get("rowspan", 1) + 1
+                    merged.setdefault("slots", []).extend(slots)
+                else:
+                    entry = {"col": col, "text": row_texts[r_idx][c_idx].strip()}
+                    if span > 1:
+                        entry["colspan"] = span
+                    if slots:
+                        entry["slots"] = slots
+                    if (r_idx, c_idx) in photo_cells:
+                        entry["photo"] = True
+                    if v_merge == "restart":
+                        open_cells[col] = entry
+                    else:
+                        open_cells.pop(col, None)
+                    grid_row.append(entry)
+                col += span
+                c_idx += span
+            grid_rows.append(grid_row)
+        grid_tables.append({"index": t_idx + 1, "columns": max_cols, "rows": grid_rows})
+
+        # 3. 版式分析：按左侧/上方标签确定每个占位符的字段名
+        slot_groups = {
+            tag: tuple(entry["slots"])
+            for grid_row in grid_rows
+            for entry in grid_row
+            for tag in entry.get("slots", [])
+        }
+        for tag, (header, header_source) in analyze_table_headers(context_rows, slot_groups).items():
+            placeholder_info[tag]["header"] = header
+            placeholder_info[tag]["header_source"] = header_source
+
+    # 4. 遍历段落补充（复选框、填空）
+    for p_idx, raw_text in paragraphs:
+        text = raw_text.strip()
         if '___' in text or '□' in text:
             tag = f"{{{counter}}}"
-            placeholder_map[tag] = {
-                "paragraph": paragraph,
-                "type": "checkbox" if '□' in text else "fillblank",
-                "original_text": text
-            }
             placeholder_info[tag] = {
                 "header": "文本段落",
+                "header_source": "paragraph",
                 "table_index": 0,
                 "row_index": 0,
                 "col_index": 0,
-                "original_text": text
+                "original_text": text,
+                "type": _placeholder_type(text),
+                "paragraph_index": p_idx,
             }
-            markdown_lines.append(f"\n段落内容: {tag}(原内容:{text})\n")
+            grid_paragraphs.append({"text": text, "slots": [tag]})
+            context_blocks.append({"kind": "paragraph", "slot": tag})
             counter += 1
 
-    if not placeholder_map:
-        out = io.BytesIO()
-        doc.save(out)
-        output_bytes = out.getvalue()
-        if return_fill_data:
-            if return_metadata:
-                return output_bytes, {}, [], {"low_confidence_fields": []}
-            return output_bytes, {}, []
-        return output_bytes
+    # 5. python-docx 顶层遍历覆盖不到的位置：嵌套表格、文本框、页眉页脚、脚注尾注
+    story_table_count = 0
+    for block in story_blocks:
+        location = block["location"]
+        if block["kind"] == "paragraph":
+            tag = f"{{{counter}}}"
+            placeholder_info[tag] = {
+                "header": f"{location}段落",
+                "header_source": "paragraph",
+                "table_index": 0,
+                "row_index": 0,
+                "col_index": 0,
+                "original_text": block["text"],
+                "type": _placeholder_type(block["text"]),
+                "location": location,
+                "locator": {"part": block["part"], "node": "p", "ordinal": block["ordinal"]},
+            }
+            grid_paragraphs.append({"text": block["text"], "slots": [tag], "location": location})
+            context_blocks.append({"kind": "paragraph", "slot": tag, "location": location})
+            counter += 1
+            continue
+
+        title = f"{location}{'嵌套' if block['nested'] else ''}表格 {story_table_count + 1}"
+        context_block, grid_table, counter = _compile_story_table(
+            block, table_count + story_table_count + 1, title, counter, placeholder_info
+        )
+        if context_block is None:
+            continue
+        story_table_count += 1
+        context_blocks.append(context_block)
+        grid_tables.append(grid_table)
+
+    return {
+        "placeholder_info": placeholder_info,
+        "context_blocks": context_blocks,
+        "photo_coords": photo_coords,
+        "grid": {"tables": grid_tables, "paragraphs": grid_paragraphs},
+    }
 
-    # 3. 获取填充数据（优先使用预览阶段传回的数据，避免重复 AI 推理）
-    if prefilled_data is not None:
-        fill_data = prefilled_data
-    else:
-        fill_data = get_modelscope_response(normalized_user_info_text, "\n".join(markdown_lines))
+
+def _compile_story_table(block, index, title, counter, placeholder_info):
+    """
+    编译 story_scanner 扫描到的表格（嵌套表格/文本框/页眉页脚中的表格）
+
+    没有字段名的空单元格多为版式留白，不作为占位符；整张表没有占位符时不输出。
+
+    Returns:
+        tuple: (上下文块, 预览表格, 下一个占位符序号)，没有占位符时前两项为 None
+    """
+    # 先以单元格序号作为临时占位符做版式分析，确定字段名后再分配正式占位符
+    analysis_rows = []
+    for cells in block["rows"]:
+        tokens = []
+        for cell in cells:
+            token = {"slot": cell["ordinal"]} if cell["fillable"] else cell["text"].strip()
+            tokens.extend([token] * cell["span"])
+        analysis_rows.append(tokens)
+    headers = analyze_table_headers(analysis_rows, {})
+
+    context_rows = []
+    grid_rows = []
+    has_slots = False
+    for r_idx, cells in enumerate(block["rows"]):
+        context_row = []
+        grid_row = []
+        col = 0
+        for cell in cells:
+            text = cell["text"].strip()
+            token = text
+            entry = {"col": col, "text": text}
+            if cell["span"] > 1:
+                entry["colspan"] = cell["span"]
+            if cell["fillable"]:
+                header, header_source = headers.get(cell["ordinal"], ("", ""))
+                placeholder_type = _placeholder_type(text)
+                if header or placeholder_type != "empty":
+                    tag = f"{{{counter}}}"
+                    placeholder_info[tag] = {
+                        "header": header,
+                        "header_source": header_source,
+                        "table_index": 0,
+                        "row_index": r_idx + 1,
+                        "col_index": col + 1,
+                        "original_text": text,
+                        "type": placeholder_type,
+                        "location": title,
+                        "locator": {"part": block["part"], "node": "tc", "ordinal": cell["ordinal"]},
+                    }
+                    token = {"slot": tag}
+                    entry["slots"] = [tag]
+                    has_slots = True
+                    counter += 1
+            context_row.extend([token] * cell["span"])
+            grid_row.append(entry)
+            col += cell["span"]
+        context_rows.append(context_row)
+        grid_rows.append(grid_row)
+
+    if not has_slots:
+        return None, None, counter
+
+    columns = max(len(row) for row in context_rows)
+    context_rows = [row + [""] * (columns - len(row)) for row in context_rows]
+    context_block = {"kind": "table", "index": index, "title": title, "columns": columns, "rows": context_rows}
+    grid_table = {"index": index, "title": title, "columns": columns, "rows": grid_rows}
+    return context_block, grid_table, counter
+
+
+def _render_markdown(compiled, targets=None, fill_data=None, prefilled=None):
+    """
+    将结构化上下文渲染为 Markdown 行
+
+    Args:
+        compiled: compile_template 的编译结果
+        targets: 可选，仅渲染包含这些占位符的表格行/段落（增量模式，表头行始终保留）
+        fill_data: 增量模式下非目标占位符直接显示已填充的值
+        prefilled: 可选，已确定性预填的占位符 -> 值，直接显示值而不是占位符
+    """
+    placeholder_info = compiled["placeholder_info"]
+    fill_data = fill_data or {}
+    prefilled = prefilled or {}
+    lines = []
+
+    def render_token(token):
+        if isinstance(token, str):
+            return token
+        tag = token["slot"]
+        original_text = placeholder_info[tag]["original_text"]
+        if tag in prefilled or (targets is not None and tag not in targets):
+            value = str(prefilled.get(tag) or fill_data.get(tag) or original_text)
+            return value.replace("\n", " ").replace("|", "/")
+        if original_text:
+            return f"{tag}(原内容:{original_text})"
+        return tag
+
+    for block in compiled["context_blocks"]:
+        if block["kind"] == "paragraph":
+            if targets is None or block["slot"] in targets:
+                label = f"{block['location']}段落内容" if block.get("location") else "段落内容"
+                lines.append(f"\n{label}: {render_token(block)}\n")
+            continue
+
+        rows = block["rows"]
+        if targets is None:
+            selected_rows = list(range(len(rows)))
+        else:
+            selected_rows = [
+                r_idx for r_idx, row in enumerate(rows)
+                if any(isinstance(token, dict) and token["slot"] in targets for token in row)
+            ]
+            if not selected_rows:
+                continue
+            if selected_rows[0] != 0:
+                selected_rows.insert(0, 0)
+
+        lines.append(f"\n### {block.get('title') or '表格 ' + str(block['index'])}\n")
+        for r_idx in selected_rows:
+            # 生成 Markdown 行
+            lines.append("| " + " | ".join(render_token(token) for token in rows[r_idx]) + " |")
+            if r_idx == 0: # 添加分割线
+                lines.append("| " + " | ".join(["---"] * block["columns"]) + " |")
+
+    return lines
+
+
+def _bind_placeholders(doc, compiled, story_nodes=None):
+    """将编译结果中的占位符坐标绑定到 docx 中的单元格/段落对象"""
+    placeholder_map = {}
+    tables = doc.tables
+    paragraphs = None
+    row_cells_cache = {}
+
+    for tag, info in compiled["placeholder_info"].items():
+        item = {"type": info["type"], "original_text": info["original_text"]}
+        if "locator" in info:
+            if story_nodes is None:
+                story_nodes = StoryNodeLocator(doc)
+            node = story_nodes.locate(info["locator"])
+            item["cell" if info["locator"]["node"] == "tc" else "paragraph"] = node
+        elif info["table_index"]:
+            row_key = (info["table_index"] - 1, info["row_index"] - 1)
+            if row_key not in row_cells_cache:
+                row_cells_cache[row_key] = tables[row_key[0]].rows[row_key[1]].cells
+            item["cell"] = row_cells_cache[row_key][info["col_index"] - 1]
+        else:
+            if paragraphs is None:
+                paragraphs = doc.paragraphs
+            item["paragraph"] = paragraphs[info["paragraph_index"]]
+        placeholder_map[tag] = item
+
+    return placeholder_map
+
+
+def _insert_photos(doc, photo_coords, photo_bytes):
+    for (t_idx, r_idx, c_idx) in photo_coords:
+        cell = doc.tables[t_idx].rows[r_idx].cells[c_idx]
+        cell.text = ""
+        p = cell.paragraphs[0]
+        p.alignment = WD_ALIGN_PARAGRAPH.CENTER
+        run = p.add_run()
+        run.add_picture(io.BytesIO(photo_bytes), width=Cm(3.5))
+
+
+def _inference_position(pos_info):
+    """字段名推断需要的占位符位置信息"""
+    position = {
+        "table_index": pos_info.get("table_index", 0),
+        "row_index": pos_info.get("row_index", 0),
+        "col_index": pos_info.get("col_index", 0),
+    }
+    if pos_info.get("location"):
+        position["location"] = pos_info["location"]
+    return position
+
+
+_SPECULATION_EXECUTOR = None
+_SPECULATION_SLOTS = None
+_SPECULATION_LOCK = threading.Lock()
+
+
+def _start_header_inference(compiled, profile_context, requested_keys):
+    """
+    填充请求发出前，为本次请求的无表头空占位符提前启动字段名推断（与填充请求并行）
+
+    无表头的占位符在编译后就已确定，不必等填充结果回来再串行调用模型；
+    结果在 _resolve_fill_data 需要时再取，用不到时取消（已开始的请求无法中止，结果丢弃）。
+    提前推断在模型没有留空这些占位符时是多余的一次调用，因此默认关闭，
+    MODEL_SPECULATIVE_HEADERS=1 时开启；同时在途的提前推断不超过 MODEL_SPECULATION_WORKERS（默认 4），
+    达到上限时不再提前推断，由 _resolve_fill_data 按需同步推断
+
+    Args:
+        requested_keys: 本次填充请求交给模型的占位符（不含确定性预填的，增量模式下只含重填目标）
+
+    Returns:
+        Future（结果为 {占位符: 字段名}），没有需要推断的占位符、未开启或已达上限时返回 None
+    """
+    global _SPECULATION_EXECUTOR, _SPECULATION_SLOTS
+    if os.environ.get("MODEL_SPECULATIVE_HEADERS", "0").strip().lower() not in ("1", "true", "yes"):
+        return None
+
+    placeholder_info = compiled["placeholder_info"]
+    positions = {
+        tag: _inference_position(placeholder_info[tag])
+        for tag in requested_keys
+        if not placeholder_info[tag]["original_text"]
+        and not (placeholder_info[tag].get("header") or "").strip()
+        and not (placeholder_info[tag].get("inferred_header") or "").strip()
+    }
+    if not positions:
+        return None
+
+    markdown_context = "\n".join(_render_markdown(compiled))
+    user_info_text = profile_context["normalized_text"]
+
+    def infer():
+        inferred_fields = infer_field_names_with_ai(positions, markdown_context, user_info_text)
+        return {tag: inferred_fields[idx] for idx, tag in enumerate(positions) if idx < len(inferred_fields)}
+
+    with _SPECULATION_LOCK:
+        if _SPECULATION_EXECUTOR is None:
+            workers = max(1, int(os.environ.get("MODEL_SPECULATION_WORKERS", "4")))
+            _SPECULATION_EXECUTOR = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="header-inference")
+            _SPECULATION_SLOTS = threading.BoundedSemaphore(workers)
+
+    # 不排队：线程都在忙时排队的推断只会比按需同步推断更晚返回
+    if not _SPECULATION_SLOTS.acquire(blocking=False):
+        return None
+    future = _SPECULATION_EXECUTOR.submit(bind_current_deadline(infer))
+    future.add_done_callback(lambda _: _SPECULATION_SLOTS.release())
+    return future
+
+
+def _join_header_inference(header_inference):
+    """取提前启动的字段名推断结果，推断失败时返回 {}（由调用方同步补推断）"""
+    if header_inference is None:
+        return {}
+    try:
+        return header_inference.result()
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"⚠️ 提前推断字段名失败: {e}")
+        return {}
+
+
+def _resolve_fill_data(compiled, fill_data, profile_context, header_inference=None):
+    """
+    校验并归一化 AI 返回的填充数据，统计缺失/低置信度字段（不修改 docx）
+
+    Args:
+        profile_context: prepare_profile_context 的结果，低置信度判断使用其中的明确值索引
+        header_inference: 可选，_start_header_inference 返回的 Future，无表头缺失字段优先使用其结果
+
+    Returns:
+        dict: {
+            "fill_data": 归一化后的填充数据,
+            "missing_fields": 缺失字段列表,
+            "low_confidence_fields": 低置信度字段列表,
+            "slot_status": {占位符: filled/unchanged/missing/low_confidence},
+            "write_order": 写回 docx 的占位符顺序
+        }
+    """
+    placeholder_info = compiled["placeholder_info"]
+    explicit_index = profile_context["explicit_index"]
+    normalized_user_info_text = profile_context["normalized_text"]
 
     if not isinstance(fill_data, dict):
         fill_data = {}
@@ -823,6 +1300,9 @@ def fill_form(docx_bytes, user_info_text, photo_bytes, return_fill_data=False, p
     placeholder_needs_ai_inference = {}
     resolved_placeholders = set()
     low_confidence_keys = set()
+    slot_status = {}
+    write_order = []
+    inferred_fields_map = {}
 
     def get_display_field_name(target_key, inferred_fields_map=None):
         header_info = placeholder_info.get(target_key, {})
@@ -838,97 +1318,97 @@ def fill_form(docx_bytes, user_info_text, photo_bytes, return_fill_data=False, p
     def register_missing(target_key):
         header_info = placeholder_info.get(target_key, {})
         header = (header_info.get("header") or "").strip()
+        inferred_header = (header_info.get("inferred_header") or "").strip()
         if header:
             if header not in missing_fields_seen:
                 missing_fields.append(header)
                 missing_fields_seen.add(header)
+        elif inferred_header:
+            # 模板库中的模板在发布时已推断过字段名，无需再调用模型
+            inferred_fields_map[target_key] = inferred_header
+            if inferred_header not in missing_fields_seen:
+                missing_fields.append(inferred_header)
+                missing_fields_seen.add(inferred_header)
         else:
             pos_info = placeholder_info.get(target_key)
             if pos_info and target_key not in placeholder_needs_ai_inference:
-                placeholder_needs_ai_inference[target_key] = {
-                    "table_index": pos_info.get("table_index", 0),
-                    "row_index": pos_info.get("row_index", 0),
-                    "col_index": pos_info.get("col_index", 0),
-                }
+                placeholder_needs_ai_inference[target_key] = _inference_position(pos_info)
         print(f"⚠️ 识别到缺失字段: {header if header else target_key} (占位符: {target_key})")
 
-    # 4. 填充数据（使用格式保持的替换方式）
+    # 4. 校验填充数据
     for key, value in list(fill_data.items()):
         # 兼容 AI 返回 "1" 而不是 "{1}" 的情况
         target_key = key if key.startswith("{") else f"{{{key}}}"
-        if target_key in placeholder_map:
+        if target_key in placeholder_info:
             resolved_placeholders.add(target_key)
-            item = placeholder_map[target_key]
-            is_cell = "cell" in item
-            container = item.get("cell") or item.get("paragraph")
-            original_text = item["original_text"]
+            original_text = placeholder_info[target_key]["original_text"]
 
             normalized_value = "" if value is None else str(value).strip()
-            
-            if normalized_value and not original_text and not _is_explicit_value(normalized_value, explicit_profile_values, normalized_user_info_text):
+            status = "filled"
+
+            if normalized_value and not original_text and not explicit_index.accepts(normalized_value):
                 print(f"⚠️ 低置信度值已清空: {target_key} -> {normalized_value}")
                 low_confidence_keys.add(target_key)
+                status = "low_confidence"
                 normalized_value = ""
 
             # 处理缺失
             if not normalized_value or normalized_value == original_text:
-                if not original_text: 
+                if not original_text:
                     register_missing(target_key)
                 if not original_text:
                     normalized_value = ""
+                    if status != "low_confidence":
+                        status = "missing"
                 else:
                     normalized_value = original_text
+                    status = "unchanged"
 
             fill_data[target_key] = normalized_value
-            
-            if is_cell:
-                cell_table_idx = placeholder_info.get(target_key, {}).get("table_index", 1) - 1
-                def_font = table_default_fonts.get(cell_table_idx, (None, None))
-                _replace_cell_text_preserve_format(container, normalized_value, def_font[0], def_font[1])
-            else:
-                _replace_paragraph_text_preserve_format(container, normalized_value)
+            slot_status[target_key] = status
+            write_order.append(target_key)
 
     # AI 未返回或未命中的占位符统一视为缺失
-    for target_key, item in placeholder_map.items():
+    for target_key, info in placeholder_info.items():
         if target_key in resolved_placeholders:
             continue
-        
-        is_cell = "cell" in item
-        container = item.get("cell") or item.get("paragraph")
-        original_text = item["original_text"]
-        
+
+        original_text = info["original_text"]
         fill_data[target_key] = original_text
-        
-        if is_cell:
-            cell_table_idx = placeholder_info.get(target_key, {}).get("table_index", 1) - 1
-            def_font = table_default_fonts.get(cell_table_idx, (None, None))
-            _replace_cell_text_preserve_format(container, original_text, def_font[0], def_font[1])
-        else:
-            _replace_paragraph_text_preserve_format(container, original_text)
+        slot_status[target_key] = "unchanged" if original_text else "missing"
+        write_order.append(target_key)
 
         if not original_text:
             register_missing(target_key)
 
-    inferred_fields_map = {}
-
-    # 5. 如果有无表头的缺失字段，用 AI 推断字段名称
+    # 5. 如果有无表头的缺失字段，用 AI 推断字段名称（优先使用与填充并行提前推断的结果）
     if placeholder_needs_ai_inference:
         placeholder_keys = list(placeholder_needs_ai_inference.keys())
-        inferred_fields = infer_field_names_with_ai(
-            placeholder_needs_ai_inference,
-            "\n".join(markdown_lines),
-            normalized_user_info_text
-        )
-        inferred_fields_map = {
-            key: inferred_fields[idx]
-            for idx, key in enumerate(placeholder_keys)
-            if idx < len(inferred_fields)
-        }
-        for field in inferred_fields:
-            candidate = str(field).strip()
+        speculative = _join_header_inference(header_inference)
+        inferred_by_slot = {key: speculative[key] for key in placeholder_keys if key in speculative}
+        pending = {key: pos for key, pos in placeholder_needs_ai_inference.items() if key not in inferred_by_slot}
+        if pending:
+            inferred_fields = infer_field_names_with_ai(
+                pending,
+                "\n".join(_render_markdown(compiled)),
+                normalized_user_info_text
+            )
+            inferred_by_slot.update({
+                key: inferred_fields[idx]
+                for idx, key in enumerate(pending)
+                if idx < len(inferred_fields)
+            })
+        inferred_fields_map.update(inferred_by_slot)
+        for key in placeholder_keys:
+            if key not in inferred_by_slot:
+                continue
+            candidate = str(inferred_by_slot[key]).strip()
             if candidate and candidate not in missing_fields_seen:
                 missing_fields.append(candidate)
                 missing_fields_seen.add(candidate)
+    elif header_inference is not None:
+        # 没有无表头的缺失字段，提前推断的结果用不到
+        header_inference.cancel()
 
     low_confidence_fields = []
     low_confidence_seen = set()
@@ -942,19 +1422,486 @@ def fill_form(docx_bytes, user_info_text, photo_bytes, return_fill_data=False, p
     if low_confidence_fields:
         print(f"📉 低置信度字段列表: {low_confidence_fields}")
 
+    return {
+        "fill_data": fill_data,
+        "missing_fields": missing_fields,
+        "low_confidence_fields": low_confidence_fields,
+        "slot_status": slot_status,
+        "write_order": write_order,
+    }
+
+
+def _write_fill_data(doc, compiled, resolved):
+    """按校验后的填充数据写回 docx（使用格式保持的替换方式）"""
+    story_nodes = StoryNodeLocator(doc)
+    placeholder_map = _bind_placeholders(doc, compiled, story_nodes)
+    fill_data = resolved["fill_data"]
+
+    # 表格默认字体只在单元格没有可复用的 run 时才用到：只为这些单元格所在的表格计算，
+    # 且在写入前计算，结果与模板原样一致
+    default_fonts = {}  # {w:tbl 元素: (font_name, font_size)}
+    cell_tables = {}  # {占位符: w:tbl 元素}
+    for target_key, item in placeholder_map.items():
+        if "cell" in item and _needs_table_default_font(item["cell"]):
+            tbl = item["cell"]._tc.getparent().getparent()
+            cell_tables[target_key] = tbl
+            if tbl not in default_fonts:
+                default_fonts[tbl] = table_default_font(tbl)
+
+    for target_key in resolved["write_order"]:
+        item = placeholder_map[target_key]
+        value = fill_data.get(target_key, item["original_text"])
+        if "cell" in item:
+            def_font = default_fonts.get(cell_tables.get(target_key), (None, None))
+            _replace_cell_text_preserve_format(item["cell"], value, def_font[0], def_font[1])
+        else:
+            _replace_paragraph_text_preserve_format(item["paragraph"], value)
+    story_nodes.flush()
+
+
+def _collect_refill_targets(compiled, previous_fill_data):
+    """找出上一轮未填充（缺失/低置信度已清空/复选框原样返回）的占位符"""
+    targets = []
+    for tag, info in compiled["placeholder_info"].items():
+        previous_value = previous_fill_data.get(tag)
+        normalized_value = "" if previous_value is None else str(previous_value).strip()
+        if not normalized_value or normalized_value == info["original_text"]:
+            targets.append(tag)
+    return targets
+
+
+def _deterministic_prefill(compiled, canonical_fields):
+    """
+    确定性预填：槽位的字段名能唯一映射到资料中的标准字段时直接填值，不交给模型
+
+    字段名使用版式分析得到的表头（左侧/上方标签，或纵向表头表格的列表头），
+    回退到首行同列文字的不可靠表头不参与预填。
+    合并单元格产生的多个占位符视为同一个槽位；同一表格内同一字段名对应多个槽位
+    （如家庭成员表的“联系电话”列）时有歧义，不预填。
+    仅处理空单元格，复选框/填空线仍交给模型。
+    """
+    if not canonical_fields:
+        return {}
+
+    slot_groups = {}  # 占位符 -> 同一单元格的全部占位符
+    for table in compiled["grid"]["tables"]:
+        for row in table["rows"]:
+            for entry in row:
+                for tag in entry.get("slots", []):
+                    slot_groups[tag] = tuple(entry["slots"])
+
+    labeled_groups = {}  # (表格, 字段名) -> {槽位}
+    for tag, info in compiled["placeholder_info"].items():
+        table_key = info["table_index"] or info.get("location")
+        if not table_key or info["type"] != "empty":
+            continue
+        if info.get("header_source") not in ("left", "above", "column") or not info["header"]:
+            continue
+        group = slot_groups.get(tag, (tag,))
+        labeled_groups.setdefault((table_key, info["header"]), set()).add(group)
+
+    prefilled = {}
+    for (_, label), groups in labeled_groups.items():
+        if len(groups) != 1:
+            continue
+        canonicals = {canonical for canonical, _ in PROFILE_ALIAS_INDEX.get(normalize_profile_key(label.rstrip("：:")), ())}
+        if len(canonicals) != 1:
+            continue
+        value = canonical_fields.get(canonicals.pop())
+        if value:
+            for tag in next(iter(groups)):
+                prefilled[tag] = value
+    return prefilled
+
+
+def collect_alias_observations(compiled, fill_data, profile_context):
+    """
+    从一次填表结果中找出高置信度的 表头 -> 标准字段 对应关系，供别名学习使用
+
+    只统计与确定性预填条件相同的空单元格（表头来自左侧/上方标签或列表头），
+    且表头不在别名索引中、填入的值与资料中唯一一个标准字段的值完全一致（去除空白后）。
+
+    Returns:
+        list: [(归一化表头, 表头原文, 标准字段)]
+    """
+    canonical_fields = profile_context.get("canonical_fields") or {}
+    if not canonical_fields or not isinstance(fill_data, dict):
+        return []
+
+    canonicals_by_value = {}
+    for canonical, value in canonical_fields.items():
+        normalized_value = re.sub(r"\s+", "", str(value or ""))
+        # 单字值（性别等）容易巧合相等，不作为学习依据
+        if len(normalized_value) >= 2:
+            canonicals_by_value.setdefault(normalized_value, set()).add(canonical)
+
+    observations = []
+    seen = set()
+    for tag, info in compiled["placeholder_info"].items():
+        if info["type"] != "empty" or info.get("header_source") not in ("left", "above", "column"):
+            continue
+        header = (info.get("header") or "").strip().rstrip("：:")
+        header_key = normalize_profile_key(header)
+        # 过长的“表头”多为说明文字而非字段名
+        if not header_key or len(header_key) > 30 or header_key in PROFILE_ALIAS_INDEX:
+            continue
+
+        canonicals = canonicals_by_value.get(re.sub(r"\s+", "", str(fill_data.get(tag) or "")), ())
+        if len(canonicals) != 1:
+            continue
+        observation = (header_key, header, next(iter(canonicals)))
+        if observation not in seen:
+            seen.add(observation)
+            observations.append(observation)
+    return observations
+
+
+def _resolve_choice_slots(compiled, profile_context):
+    """复选框/填空线按规则求解（见 checkbox_resolver），只返回能唯一确定的占位符"""
+    canonical_fields = profile_context.get("canonical_fields") or {}
+    profile_fields = profile_context.get("profile_fields") or {}
+    if not canonical_fields and not profile_fields:
+        return {}
+
+    resolved = {}
+    for tag, info in compiled["placeholder_info"].items():
+        if info["type"] == "empty" or not info["original_text"]:
+            continue
+        value = resolve_choice_text(info["type"], info["original_text"], info["header"], canonical_fields, profile_fields)
+        if value is not None:
+            resolved[tag] = value
+    return resolved
+
+
+def _request_fill_data(compiled, profile_context, prefilled_data=None, refill_missing=False):
+    """
+    获取填充数据（确定性预填 + 模型推理）
+
+    Returns:
+        tuple: (填充数据, 提前启动的字段名推断 Future 或 None，见 _start_header_inference)
+    """
+    # 优先使用预览阶段传回的数据，避免重复 AI 推理
+    if prefilled_data is not None and not refill_missing:
+        return prefilled_data, None
+
+    placeholder_info = compiled["placeholder_info"]
+    normalized_user_info_text = profile_context["normalized_text"]
+    deterministic = _deterministic_prefill(compiled, profile_context.get("canonical_fields"))
+    deterministic.update(_resolve_choice_slots(compiled, profile_context))
+    total = len(placeholder_info)
+    if deterministic:
+        print(f"🧩 确定性预填 {len(deterministic)}/{total} 个占位符: {deterministic}")
+
+    if prefilled_data is None:
+        if not deterministic:
+            header_inference = _start_header_inference(compiled, profile_context, list(placeholder_info))
+            return get_modelscope_response(
+                normalized_user_info_text, "\n".join(_render_markdown(compiled)), expected_keys=list(placeholder_info)
+            ), header_inference
+        if len(deterministic) == total:
+            return dict(deterministic), None
+
+        # 预填的占位符直接以值的形式出现在上下文中，模型只需处理剩余占位符
+        context = _render_markdown(compiled, prefilled=deterministic)
+        remaining = [tag for tag in placeholder_info if tag not in deterministic]
+        remaining_types = {placeholder_info[tag]["type"] for tag in remaining}
+        header_inference = _start_header_inference(compiled, profile_context, remaining)
+        model_fill_data = get_modelscope_response(normalized_user_info_text, "\n".join(context), remaining_types, remaining)
+        merged_fill_data = {
+            key: value for key, value in (model_fill_data or {}).items()
+            if key not in deterministic
+        }
+        merged_fill_data.update(deterministic)
+        return merged_fill_data, header_inference
+
+    # 增量模式：只对上一轮缺失/低置信度的占位符重新推理，其余沿用上一轮结果
+    merged_fill_data = dict(prefilled_data)
+    targets = []
+    for tag in _collect_refill_targets(compiled, prefilled_data):
+        if tag in deterministic:
+            merged_fill_data[tag] = deterministic[tag]
+        else:
+            targets.append(tag)
+    if not targets:
+        print("📝 增量填充：没有需要重新推理的占位符")
+        return merged_fill_data, None
+
+    target_set = set(targets)
+    delta_context = _render_markdown(compiled, targets=target_set, fill_data=merged_fill_data)
+    print(f"🔁 增量填充：重新推理 {len(targets)}/{total} 个占位符")
+    target_types = {placeholder_info[tag]["type"] for tag in targets}
+    header_inference = _start_header_inference(compiled, profile_context, targets)
+    delta_fill_data = get_modelscope_response(normalized_user_info_text, "\n".join(delta_context), target_types, targets)
+
+    for key, value in (delta_fill_data or {}).items():
+        if key in target_set:
+            merged_fill_data[key] = value
+    return merged_fill_data, header_inference
+
+
+def build_preview_grid(compiled, fill_data, slot_status):
+    """
+    基于编译结果生成轻量预览网格（JSON），无需生成 docx
+
+    每个含占位符的单元格/段落附带 slot（占位符）、value（填充值）、status（填充状态）。
+    合并单元格可能对应多个占位符，优先展示第一个有值的占位符。
+    """
+    def render(entry):
+        item = {k: v for k, v in entry.items() if k != "slots"}
+        slots = entry.get("slots")
+        if slots:
+            slot = next((tag for tag in slots if fill_data.get(tag)), slots[0])
+            item["slot"] = slot
+            item["value"] = fill_data.get(slot, "")
+            item["status"] = slot_status.get(slot, "missing")
+        return item
+
+    grid = compiled["grid"]
+    return {
+        "tables": [
+            {
+                **({"title": table["title"]} if "title" in table else {}),
+                "index": table["index"],
+                "columns": table["columns"],
+                "rows": [[render(entry) for entry in row] for row in table["rows"]],
+            }
+            for table in grid["tables"]
+        ],
+        "paragraphs": [render(entry) for entry in grid["paragraphs"]],
+    }
+
+
+def preview_form(docx_bytes, user_info_text, prefilled_data=None, refill_missing=False, profile_context=None, compiled=None):
+    """
+    生成轻量结构化预览（不生成 docx，不调用 doc.save）
+
+    Args:
+        docx_bytes: Word文档字节数据（传入 compiled 时不会读取，可为 None）
+        user_info_text: 用户信息文本
+        prefilled_data: 可选，复用预览阶段返回的填充数据
+        refill_missing: 为 True 时仅对 prefilled_data 中缺失/低置信度的占位符重新推理
+        profile_context: 可选，prepare_profile_context 的结果
+        compiled: 可选，模板的编译结果（如模板库中的预编译结果）
+
+    Returns:
+        dict: {"grid", "fill_data", "missing_fields", "low_confidence_fields"}
+    """
+    if compiled is None:
+        compiled = compile_template_stream(docx_bytes)
+    if profile_context is None:
+        profile_context = prepare_profile_context(user_info_text)
+
+    if not compiled["placeholder_info"]:
+        return {
+            "grid": build_preview_grid(compiled, {}, {}),
+            "fill_data": {},
+            "missing_fields": [],
+            "low_confidence_fields": [],
+        }
+
+    fill_data, header_inference = _request_fill_data(compiled, profile_context, prefilled_data, refill_missing)
+    resolved = _resolve_fill_data(compiled, fill_data, profile_context, header_inference)
+
+    return {
+        "grid": build_preview_grid(compiled, resolved["fill_data"], resolved["slot_status"]),
+        "fill_data": resolved["fill_data"],
+        "missing_fields": resolved["missing_fields"],
+        "low_confidence_fields": resolved["low_confidence_fields"],
+    }
+
+
+def fill_form(docx_bytes, user_info_text, photo_bytes, return_fill_data=False, prefilled_data=None, return_metadata=False, refill_missing=False, compiled=None, profile_context=None):
+    """
+    填充表单
+
+    Args:
+        docx_bytes: Word文档字节数据
+        user_info_text: 用户信息文本
+        photo_bytes: 照片字节数据
+        return_fill_data: 是否返回填充数据（用于减少重复推理）
+        prefilled_data: 可选，直接使用预览阶段返回的填充数据，避免重复 AI 推理
+        refill_missing: 增量模式，为 True 时仅对 prefilled_data 中缺失/低置信度的占位符重新推理并合并
+        compiled: 可选，复用同一模板的编译结果（批量填充时模板只编译一次）
+        profile_context: 可选，复用 prepare_profile_context 的结果（同一资料填多个模板时只归一化一次）
+
+    Returns:
+        如果 return_fill_data=True，返回 (output_bytes, fill_data, missing_fields)
+        其中 missing_fields 是缺失字段的表头/位置信息列表
+        否则返回 output_bytes
+    """
+    doc = Document(io.BytesIO(docx_bytes))
+    if compiled is None:
+        compiled = compile_template(doc, docx_bytes)
+    if profile_context is None:
+        profile_context = prepare_profile_context(user_info_text)
+
+    if not compiled["placeholder_info"]:
+        # 1. 处理照片占位符
+        if compiled["photo_coords"] and photo_bytes:
+            _insert_photos(doc, compiled["photo_coords"], photo_bytes)
+        out = io.BytesIO()
+        doc.save(out)
+        output_bytes = out.getvalue()
+        if return_fill_data:
+            if return_metadata:
+                return output_bytes, {}, [], {"low_confidence_fields": []}
+            return output_bytes, {}, []
+        return output_bytes
+
+    # 3. 获取填充数据（开启 MODEL_SPECULATIVE_HEADERS 时，无表头字段的字段名推断与填充请求同时开始）
+    fill_data, header_inference = _request_fill_data(compiled, profile_context, prefilled_data, refill_missing)
+
+    # 4. 校验并写回填充数据
+    resolved = _resolve_fill_data(compiled, fill_data, profile_context, header_inference)
+    check_deadline()
+    _write_fill_data(doc, compiled, resolved)
+
+    # 5. 处理照片占位符（在写回之后插入，照片单元格重建段落不影响占位符的节点定位）
+    if compiled["photo_coords"] and photo_bytes:
+        _insert_photos(doc, compiled["photo_coords"], photo_bytes)
+
+    check_deadline()
     out = io.BytesIO()
     doc.save(out)
     output_bytes = out.getvalue()
 
     if return_fill_data:
         if return_metadata:
-            return output_bytes, fill_data, missing_fields, {
-                "low_confidence_fields": low_confidence_fields
+            return output_bytes, resolved["fill_data"], resolved["missing_fields"], {
+                "low_confidence_fields": resolved["low_confidence_fields"]
             }
-        return output_bytes, fill_data, missing_fields
+        return output_bytes, resolved["fill_data"], resolved["missing_fields"]
     return output_bytes
 
 
+def iter_batch_fill(docx_bytes, user_info_texts, max_workers=4, deadline=None, profile_contexts=None):
+    """
+    批量填充：同一模板 + 多份个人信息
+
+    模板只编译一次，按有限并发调用 AI 推理，按完成顺序逐个产出结果；
+    单份失败不会中断整个批次，超过截止时间或被取消时停止并抛出 DeadlineExceeded。
+
+    Args:
+        docx_bytes: Word文档字节数据
+        user_info_texts: 用户信息文本列表
+        max_workers: 最大并发数
+        deadline: 整个批次的 Deadline，默认使用迭代时的当前截止时间
+        profile_contexts: 可选，与 user_info_texts 对应的已解析资料上下文（已保存资料的缓存），
+                          为 None 的项由文本解析
+
+    Returns:
+        生成器，产出 (index, result)，result 为
+        {"output_bytes", "fill_data", "missing_fields", "low_confidence_fields"} 或 {"error": str}
+    """
+    # 在返回生成器前编译模板，模板无效时可以直接报错
+    compiled = compile_template_stream(docx_bytes)
+    user_info_texts = list(user_info_texts)
+    if profile_contexts is None:
+        profile_contexts = [None] * len(user_info_texts)
+    return _iter_bounded_results(
+        list(zip(user_info_texts, profile_contexts)),
+        lambda task: _fill_result(docx_bytes, task[0], compiled=compiled, profile_context=task[1]),
+        max(1, int(max_workers)),
+        "批量填充",
+        deadline,
+    )
+
+
+_BATCH_DEADLINE_POLL_SECONDS = 0.5
+
+
+def _iter_bounded_results(task_args, worker, max_workers, label, deadline=None):
+    """
+    有限并发执行任务，按完成顺序产出 (index, result)；单个任务异常转为 {"error": str}
+    在途任务数有上限，已完成但未被消费的结果不会无限堆积
+
+    各任务在 deadline（默认为迭代时的当前截止时间）下执行；超时或被取消后不再提交新任务，
+    排队中的任务直接丢弃，抛出 DeadlineExceeded，执行中的任务在各自的下一个检查点结束
+    """
+    pending_items = iter(enumerate(task_args))
+    in_flight = {}
+    if deadline is None:
+        deadline = current_deadline()
+    bound_worker = partial(deadline.run, worker) if deadline is not None else worker
+    poll_seconds = _BATCH_DEADLINE_POLL_SECONDS if deadline is not None else None
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def submit_next():
+        if deadline is not None:
+            deadline.check()
+        item = next(pending_items, None)
+        if item is not None:
+            idx, arg = item
+            in_flight[executor.submit(bound_worker, arg)] = idx
+
+    try:
+        for _ in range(max_workers * 2):
+            submit_next()
+
+        while in_flight:
+            # 带超时等待，客户端断开（deadline.cancel）后不必等到当前任务完成才发现
+            done, _ = wait(in_flight, timeout=poll_seconds, return_when=FIRST_COMPLETED)
+            if deadline is not None:
+                deadline.check()
+            for future in done:
+                idx = in_flight.pop(future)
+                submit_next()
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ {label}第 {idx + 1} 份失败: {e}")
+                    result = {"error": str(e)}
+                yield idx, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _fill_result(docx_bytes, user_info_text, compiled=None, profile_context=None):
+    output_bytes, fill_data, missing_fields, metadata = fill_form(
+        docx_bytes,
+        user_info_text,
+        None,
+        return_fill_data=True,
+        return_metadata=True,
+        compiled=compiled,
+        profile_context=profile_context,
+    )
+    return {
+        "output_bytes": output_bytes,
+        "fill_data": fill_data,
+        "missing_fields": missing_fields,
+        "low_confidence_fields": metadata.get("low_confidence_fields", []),
+    }
+
+
+def iter_multi_template_fill(docx_bytes_list, user_info_text, max_workers=4, deadline=None, profile_context=None):
+    """
+    多模板填充：同一份个人信息 + 多个模板
+
+    个人信息只归一化一次，各模板并行编译和推理，按完成顺序逐个产出结果；
+    单个模板失败不会中断其他模板，超过截止时间或被取消时停止并抛出 DeadlineExceeded。
+
+    Args:
+        docx_bytes_list: 多个 Word 文档字节数据
+        user_info_text: 用户信息文本
+        max_workers: 最大并发数
+        deadline: 整批的 Deadline，默认使用迭代时的当前截止时间
+        profile_context: 可选，已解析的资料上下文（已保存资料的缓存），默认由 user_info_text 解析
+
+    Returns:
+        生成器，产出 (index, result)，result 格式同 iter_batch_fill
+    """
+    if profile_context is None:
+        profile_context = prepare_profile_context(user_info_text)
+    return _iter_bounded_results(
+        list(docx_bytes_list),
+        lambda docx_bytes: _fill_result(docx_bytes, user_info_text, profile_context=profile_context),
+        max(1, int(max_workers)),
+        "多模板填充",
+        deadline,
+    )
+
+
 def infer_field_names_with_ai(placeholder_info_map, markdown_context, user_info_text):
     """
     使用 AI 推断缺失字段的名称（当表头为空时）
@@ -970,13 +1917,12 @@ def infer_field_names_with_ai(placeholder_info_map, markdown_context, user_info_
     if not placeholder_info_map:
         return []
 
-    url = "https://api-inference.modelscope.cn/v1/chat/completions"
-    api_key = os.environ.get("MODELSCOPE_API_KEY", "")
-    model_endpoint = os.environ.get("MODEL_ENDPOINT") or "deepseek-ai/DeepSeek-V3.2"
+    profile = model_profile("infer_fields")
+    provider = profile["provider"]
 
     # 构建占位符信息
     placeholders_text = "\n".join([
-        f"- {k}: 表格{v['table_index']}第{v['row_index']}行第{v['col_index']}列"
+        f"- {k}: {v.get('location') or '表格' + str(v['table_index'])}第{v['row_index']}行第{v['col_index']}列"
         for k, v in placeholder_info_map.items()
     ])
 
@@ -1000,17 +1946,10 @@ def infer_field_names_with_ai(placeholder_info_map, markdown_context, user_info_
 
 只返回字段名称，不要其他解释。如果没有足够信息推断，可以使用通用描述如"字段"、"信息"等。"""
 
-    headers = {"Authorization": f"Bearer {api_key}", "Content-Type": "application/json"}
-    data = {
-        "model": model_endpoint,
-        "messages": [{"role": "user", "content": prompt}],
-        "temperature": 0.3,
-        "top_p": 0.7,
-        "max_tokens": 500
-    }
+    data = _model_request_data(profile, [{"role": "user", "content": prompt}])
 
     try:
-        response = requests.post(url, headers=headers, json=data)
+        response = _chat_completion(provider, data, "infer_fields", cache=True)
         if response.status_code != 200:
             # 如果 AI 调用失败，返回占位符作为默认
             return list(placeholder_info_map.keys())
@@ -1042,6 +1981,8 @@ def infer_field_names_with_ai(placeholder_info_map, markdown_context, user_info_
             if matches:
                 return matches
             return list(placeholder_info_map.keys())
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         print(f"❌ AI 推断字段名称失败: {e}")
         return list(placeholder_info_map.keys())
\ No newline at end of file
@@ -10,20 +10,23 @@ import io
 import json
 import os
 import re
-import requests
 from typing import Dict, Tuple, List
 from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
 from docx.shared import Cm
 
+from layout_analyzer import CELL_PHOTO, PHOTO_TOKEN, classify_cell
+from model_provider import DEFAULT_MODEL_ENDPOINT, get_model_provider
+
 
 class FormFiller:
     """智能表单填写器"""
 
     def __init__(self):
-        self.api_key = os.environ.get("MODELSCOPE_API_KEY", "")
-        self.model_endpoint = os.environ.get("MODEL_ENDPOINT") or "deepseek-ai/DeepSeek-V3.2"
-        self.url = "https://api-inference.modelscope.cn/v1/chat/completions"
+        self.provider = get_model_provider()
+        self.api_key = self.provider.api_key
+        self.model_endpoint = os.environ.get("MODEL_ENDPOINT") or DEFAULT_MODEL_ENDPOINT
+        self.url = self.provider.url
 
     def convert_to_markdown(self, doc: Document) -> Tuple[str, List[Tuple]]:
         """
@@ -33,40 +36,24 @@ class FormFiller:
         markdown_lines = []
         photo_coords = []
 
-        # 首先识别照片位置
-        for t_idx, table in enumerate(doc.tables):
-            for r_idx, row in enumerate(table.rows):
-                for c_idx, cell in enumerate(row.cells):
-                    text_lower = cell.text.lower()
-                    if ("照片" in text_lower) or ("相片" in text_lower) or ("证件照" in text_lower):
-                        photo_coords.append((t_idx, r_idx, c_idx))
-
-        # 转换为markdown
+        # 每个单元格只读取一次文字，照片识别与 markdown 生成在同一遍中完成
         for table_idx, table in enumerate(doc.tables):
             markdown_lines.append(f"\n## 表格 {table_idx + 1}\n")
 
-            # 获取表格最大行列数
-            max_rows = len(table.rows)
-            max_cols = max(len(row.cells) for row in table.rows)
+            rows_cells = [row.cells for row in table.rows]
+            max_cols = max(len(cells) for cells in rows_cells)
 
             # 生成markdown表格
-            for row_idx in range(max_rows):
+            for row_idx, cells in enumerate(rows_cells):
                 row_cells = []
-                for col_idx in range(max_cols):
-                    if row_idx < len(table.rows) and col_idx < len(table.rows[row_idx].cells):
-                        cell = table.rows[row_idx].cells[col_idx]
-
-                        # 检查是否是照片位置
-                        if (table_idx, row_idx, col_idx) in photo_coords:
-                            cell_text = "[照片]"
-                        else:
-                            cell_text = cell.text.strip()
-                            if not cell_text:
-                                cell_text = "<empty>"
+                for col_idx, cell in enumerate(cells):
+                    raw_text = cell.text
+                    if classify_cell(raw_text) == CELL_PHOTO:
+                        photo_coords.append((table_idx, row_idx, col_idx))
+                        row_cells.append(PHOTO_TOKEN)
                     else:
-                        cell_text = "<empty>"
-
-                    row_cells.append(cell_text)
+                        row_cells.append(raw_text.strip() or "<empty>")
+                row_cells.extend(["<empty>"] * (max_cols - len(cells)))
 
                 markdown_lines.append("| " + " | ".join(row_cells) + " |")
 
@@ -120,17 +107,15 @@ class FormFiller:
         4. 允许合理推理和推断。
         """
 
-        headers = {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
-        data = {
-            "model": self.model_endpoint,
-            "messages": [{"role": "user", "content": prompt}],
-            "extra_body": {"enable_thinking": True},
-            "top_p": 0.7,
-            "temperature": 1
-        }
+        data = self.provider.payload(
+            self.model_endpoint,
+            [{"role": "user", "content": prompt}],
+            {"top_p": 0.7, "temperature": 1},
+            thinking=True,
+        )
 
         try:
-            response = requests.post(self.url, headers=headers, json=data)
+            response = self.provider.post(data)
             print(f"📡 Response Status: {response.status_code}")
 
             if response.status_code != 200:
@@ -140,11 +125,11 @@ class FormFiller:
             res_json = response.json()
             print(f"🔍 Response Keys: {res_json.keys()}")
 
-            if 'choices' not in res_json or not res_json['choices']:
+            content = self.provider.message_content(res_json)
+            if content is None:
                 print("❌ No choices in response")
                 return {}
 
-            content = res_json['choices'][0]['message']['content']
             # 清理可能的代码块标记
             content = content.replace("```json", "").replace("```", "").strip()
             print(f"📄 Raw Content: {content[:200]}...")
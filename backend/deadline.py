@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+请求级截止时间
+每个请求创建一个 Deadline，在执行填表的工作线程中设为当前截止时间；
+模型调用、文档处理、存储上传在各个检查点读取它：超时或客户端断开（cancel）后抛出
+DeadlineExceeded，外部 HTTP 调用的超时也不超过剩余时间，被放弃的请求不再占用上游和 CPU。
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+
+class DeadlineExceeded(Exception):
+    """请求已超时或已被取消"""
+
+
+class Deadline:
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds if seconds and seconds > 0 else None
+        self.reason = None
+        self._cancelled = threading.Event()
+
+    def remaining(self):
+        """剩余秒数，没有截止时间时返回 None"""
+        if self.expires_at is None:
+            return None
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def cancel(self, reason="请求已取消"):
+        self.reason = reason
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def check(self):
+        """已取消或已超时时抛出 DeadlineExceeded"""
+        if self._cancelled.is_set():
+            raise DeadlineExceeded(self.reason)
+        if self.expires_at is not None and time.monotonic() >= self.expires_at:
+            raise DeadlineExceeded("请求处理超时")
+
+    def timeout(self, cap):
+        """外部调用的超时：不超过 cap，也不超过剩余时间"""
+        self.check()
+        remaining = self.remaining()
+        if remaining is None:
+            return cap
+        return max(0.001, min(cap, remaining)) if cap else max(0.001, remaining)
+
+    def run(self, func, *args, **kwargs):
+        """在当前线程中以本截止时间执行 func（用于交给线程池的任务）"""
+        with deadline_scope(self):
+            return func(*args, **kwargs)
+
+
+_CURRENT_DEADLINE = contextvars.ContextVar("request_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline):
+    token = _CURRENT_DEADLINE.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _CURRENT_DEADLINE.reset(token)
+
+
+def current_deadline():
+    return _CURRENT_DEADLINE.get()
+
+
+def check_deadline():
+    """检查当前截止时间（不在请求上下文中时什么也不做）"""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is not None:
+        deadline.check()
+
+
+def request_timeout(cap):
+    """外部 HTTP 调用使用的超时秒数：不在请求上下文中时为 cap，否则不超过剩余时间"""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
+
+
+def bind_current_deadline(func):
+    """把调用方的截止时间带到其他线程（ThreadPoolExecutor 不会自动传递 contextvars）"""
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is None:
+        return func
+
+    def bound(*args, **kwargs):
+        return deadline.run(func, *args, **kwargs)
+    return bound
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+表格版式分析：为每个待填单元格找到对应的字段名（表头）
+中文表单多为“标签 | 空格 | 标签 | 空格”的键值布局，字段名通常在左侧或上方的标签单元格中，
+只取首行同列文字作为表头会把大部分占位符判为无表头，需要额外调用模型推断字段名。
+"""
+
+from profile_normalizer import PROFILE_ALIAS_INDEX, PROFILE_FIELD_ALIASES, normalize_profile_key
+from text_automata import AhoCorasick
+
+# 常见的表单标签（单元格文字等于这些词时视为标签而非待填内容）
+FORM_LABEL_VOCABULARY = [
+    '姓名', '性别', '民族', '出生日期', '参加工作时间',
+    '政治面貌', '婚姻状况', '身份证号', '学历', '毕业院校',
+    '专业', '特长', '计算机', '能力', '是否', '残疾', '类别', '等级',
+    '持有', '驾驶证', '情况', '联系电话', '户口地址', '常住地址',
+    '照片', '相片', '贴', '年', '月', '日'
+]
+
+# 版式分析额外识别的常见字段名
+_EXTRA_FIELD_LABELS = [
+    '籍贯', '健康状况', '邮编', '工作单位', '职务', '职称', '家庭住址',
+    '通讯地址', '入党时间', '学位', '外语', '备注',
+]
+
+_LABEL_MAX_LENGTH = 12
+PHOTO_TOKEN = "[照片]"
+PHOTO_KEYWORDS = ["照片", "相片", "证件照"]
+
+# 单元格分类结果
+CELL_PHOTO = "photo"
+CELL_LABEL = "label"
+CELL_FILLABLE = "fillable"
+CELL_TEXT = "text"
+
+# 照片关键词与复选框/填空线标记放进同一个自动机，一次扫描即可完成分类
+_CELL_MARKERS = AhoCorasick({
+    **{keyword: CELL_PHOTO for keyword in PHOTO_KEYWORDS},
+    "□": "checkbox",
+    "___": "fillblank",
+})
+_LABEL_TEXTS = frozenset(label + suffix for label in FORM_LABEL_VOCABULARY for suffix in ("", "：", ":"))
+
+# 包含匹配只使用两个字及以上的词，避免“年”“日”之类误判
+_CONTAINED_LABEL_WORDS = [
+    word for word in dict.fromkeys(
+        FORM_LABEL_VOCABULARY
+        + _EXTRA_FIELD_LABELS
+        + [name for canonical, aliases in PROFILE_FIELD_ALIASES.items() for name in [canonical] + aliases]
+    )
+    if len(word) >= 2 and not word.isascii()
+]
+
+
+def classify_cell(raw_text):
+    """
+    单元格分类（单次扫描）
+
+    Returns:
+        CELL_PHOTO: 含照片关键词；CELL_LABEL: 表单标签；
+        CELL_FILLABLE: 空单元格或含 □/___ 的非标签单元格；CELL_TEXT: 其他已有内容
+    """
+    kinds = _CELL_MARKERS.matched_kinds(raw_text.lower())
+    if CELL_PHOTO in kinds:
+        return CELL_PHOTO
+    text = raw_text.strip()
+    if not text:
+        return CELL_FILLABLE
+    if text in _LABEL_TEXTS:
+        return CELL_LABEL
+    return CELL_FILLABLE if kinds else CELL_TEXT
+
+
+def is_label_text(text):
+    """判断单元格文字是否像字段标签"""
+    text = (text or "").strip()
+    if not text or text == PHOTO_TOKEN or len(text) > _LABEL_MAX_LENGTH:
+        return False
+    if text.endswith(("：", ":")):
+        return True
+    if text in _LABEL_TEXTS or normalize_profile_key(text) in PROFILE_ALIAS_INDEX:
+        return True
+    return any(word in text for word in _CONTAINED_LABEL_WORDS)
+
+
+def _clean_label(text):
+    return text.strip().rstrip("：:").strip()
+
+
+def _is_column_header_row(row):
+    """不含占位符，且有两个及以上不同的单元格像字段标签（合并的标题行只有一种文字，不算）"""
+    if any(isinstance(token, dict) for token in row):
+        return False
+    labels = {token.strip() for token in row if is_label_text(token)}
+    return len(labels) >= 2
+
+
+def _is_title_row(row):
+    """不含占位符、也不是列表头的行（如合并单元格的“个人信息表”标题）"""
+    return not any(isinstance(token, dict) for token in row) and not _is_column_header_row(row)
+
+
+def analyze_table_headers(rows, slot_groups):
+    """
+    为表格中的每个占位符确定字段名
+
+    Args:
+        rows: 表格的上下文行，元素为单元格文字或 {"slot": 占位符}
+        slot_groups: 占位符 -> 同一（合并）单元格的全部占位符
+
+    Returns:
+        dict: {占位符: (字段名, 来源)}，来源为
+            - "column": 首行（跳过开头的标题行）是列表头，取同列表头
+            - "left": 同一行左侧最近的标签
+            - "above": 同一列上方紧邻的标签
+            - "first_row": 以上都找不到时回退到首行（跳过标题行）同列文字（可能不是真正的表头）
+            - "": 没有字段名
+    """
+    if not rows:
+        return {}
+
+    # 开头的标题行不是表头，跳过后再判断首行是否为列表头
+    start = 0
+    while start < len(rows) and _is_title_row(rows[start]):
+        start += 1
+    if start == len(rows):
+        return {}
+
+    headers = [token.strip() if isinstance(token, str) else "" for token in rows[start]]
+    header_row = _is_column_header_row(rows[start])
+    result = {}
+
+    for r_idx, row in enumerate(rows):
+        for c_idx, token in enumerate(row):
+            if not isinstance(token, dict):
+                continue
+            tag = token["slot"]
+            column_header = headers[c_idx] if r_idx > start and c_idx < len(headers) else ""
+
+            # 纵向表头：每行左侧通常是行标识（如“父亲”），字段名以列表头为准
+            if header_row:
+                result[tag] = (column_header, "column" if column_header else "")
+                continue
+
+            group = slot_groups.get(tag, (tag,))
+
+            label = ""
+            for left in reversed(row[:c_idx]):
+                if isinstance(left, str):
+                    if is_label_text(left):
+                        label = _clean_label(left)
+                    break
+                if left["slot"] not in group:
+                    break
+            if label:
+                result[tag] = (label, "left")
+                continue
+
+            if r_idx > 0 and c_idx < len(rows[r_idx - 1]):
+                above = rows[r_idx - 1][c_idx]
+                if isinstance(above, str) and is_label_text(above):
+                    result[tag] = (_clean_label(above), "above")
+                    continue
+
+            result[tag] = (column_header, "first_row" if column_header else "")
+
+    # 合并单元格的多个占位符共用一个字段名（取其中通过左侧/上方标签确定的那个）
+    for tag, (label, source) in list(result.items()):
+        if source in ("left", "above"):
+            for member in slot_groups.get(tag, ()):
+                if member in result and result[member][1] not in ("left", "above"):
+                    result[member] = (label, source)
+
+    return result
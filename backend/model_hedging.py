@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型请求对冲（hedged requests）
+主请求在该通道近期延迟的指定分位数内仍未返回时，向同一或备用接口再发一份相同的请求，
+取先成功返回的结果；落后的请求通过各自的 AbortableSession 中断连接，不会继续占用线程和连接。
+主请求在调用线程上发送，只有对冲请求使用单独的线程，高负载下主请求不会因排队而误触发对冲。
+
+每个通道（填充、字段推断、审核等）单独统计延迟并有对冲预算：每个主请求积累
+MODEL_HEDGE_BUDGET_RATIO（不超过 1）个令牌，每次对冲消耗 1 个，
+因此对冲请求数不会超过主请求数，额外开销最多翻倍。
+
+配置（环境变量，调用时读取）:
+    MODEL_HEDGE_ENABLED          是否启用（默认 0）
+    MODEL_HEDGE_PERCENTILE       触发对冲的延迟分位数（默认 95）
+    MODEL_HEDGE_MIN_SAMPLES      使用分位数前需要的样本数（默认 20），不足时使用默认延迟
+    MODEL_HEDGE_DEFAULT_DELAY_MS 样本不足时的对冲延迟（默认 20000）
+    MODEL_HEDGE_BUDGET_RATIO     每个主请求积累的对冲令牌（默认 0.1，最大 1）
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+from deadline import DeadlineExceeded, bind_current_deadline, check_deadline
+from model_provider import AbortableSession
+
+_LATENCY_WINDOW_SIZE = 200
+_BUDGET_BURST = 5
+
+
+def _hedge_settings():
+    return {
+        "enabled": os.environ.get("MODEL_HEDGE_ENABLED", "0").strip().lower() in ("1", "true", "yes"),
+        "percentile": float(os.environ.get("MODEL_HEDGE_PERCENTILE", "95")),
+        "min_samples": int(os.environ.get("MODEL_HEDGE_MIN_SAMPLES", "20")),
+        "default_delay": int(os.environ.get("MODEL_HEDGE_DEFAULT_DELAY_MS", "20000")) / 1000,
+        "budget_ratio": min(1.0, max(0.0, float(os.environ.get("MODEL_HEDGE_BUDGET_RATIO", "0.1")))),
+    }
+
+
+class HedgeLane:
+    """单个通道的延迟窗口、对冲预算和计数"""
+
+    def __init__(self, name):
+        self.name = name
+        self._latencies = deque(maxlen=_LATENCY_WINDOW_SIZE)
+        self._tokens = 0.0
+        self._lock = threading.Lock()
+        self.primary_count = 0
+        self.hedge_count = 0
+        self.hedge_wins = 0
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def hedge_delay(self, percentile, min_samples, default_delay):
+        """近期成功请求延迟的分位数，样本不足时返回 default_delay"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < max(1, min_samples):
+            return default_delay
+        rank = min(len(samples) - 1, max(0, int(round(percentile / 100 * len(samples))) - 1))
+        return samples[rank]
+
+    def start_primary(self, budget_ratio):
+        with self._lock:
+            self.primary_count += 1
+            self._tokens = min(_BUDGET_BURST, self._tokens + budget_ratio)
+
+    def try_spend_hedge(self):
+        with self._lock:
+            # 0.1 累加 10 次为 0.999…，按 1 个令牌计
+            if round(self._tokens, 9) < 1:
+                return False
+            self._tokens -= 1
+            self.hedge_count += 1
+            return True
+
+    def record_hedge_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def stats(self):
+        with self._lock:
+            samples = sorted(self._latencies)
+            return {
+                "primary_requests": self.primary_count,
+                "hedged_requests": self.hedge_count,
+                "hedge_wins": self.hedge_wins,
+                "samples": len(samples),
+                "p50_ms": round(samples[len(samples) // 2] * 1000) if samples else None,
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000) if samples else None,
+            }
+
+
+_LANES = {}
+_LANES_LOCK = threading.Lock()
+
+
+def get_lane(name):
+    with _LANES_LOCK:
+        lane = _LANES.get(name)
+        if lane is None:
+            lane = _LANES[name] = HedgeLane(name)
+        return lane
+
+
+def lane_stats():
+    """各通道的请求数、对冲数和延迟分位数"""
+    with _LANES_LOCK:
+        lanes = list(_LANES.values())
+    return {lane.name: lane.stats() for lane in lanes}
+
+
+def _timed(send, session):
+    start = time.monotonic()
+    response = send(session)
+    return response, time.monotonic() - start
+
+
+class _HedgeRace:
+    """一次对冲调用中主请求与对冲请求的胜负；先成功的一方中断另一方的会话"""
+
+    def __init__(self, lane, hedge_send, delay):
+        self.lane = lane
+        self.hedge_send = hedge_send
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.winner = None
+        self.primary_done = False
+        self.primary_session = AbortableSession()
+        self.hedge_session = None
+        self.hedge_outcome = None
+        self.hedge_done = threading.Event()
+
+    def finish(self, name, outcome):
+        """记录一方的结果，成功且另一方尚未成功时成为胜者并中断另一方"""
+        response = outcome[0] if outcome else None
+        with self.lock:
+            if name == "primary":
+                self.primary_done = True
+            if response is None or response.status_code != 200 or self.winner is not None:
+                return False
+            self.winner = name
+            loser = self.hedge_session if name == "primary" else self.primary_session
+        self.lane.record_latency(outcome[1])
+        if name == "hedge":
+            self.lane.record_hedge_win()
+        if loser is not None:
+            loser.abort()
+        return True
+
+    def launch_hedge(self):
+        """定时器线程：主请求超过对冲延迟仍未返回时发送对冲请求"""
+        try:
+            check_deadline()
+        except DeadlineExceeded:
+            return
+        with self.lock:
+            if self.primary_done or not self.lane.try_spend_hedge():
+                return
+            self.hedge_session = AbortableSession()
+        print(f"🪁 {self.lane.name} 请求 {self.delay * 1000:.0f}ms 未返回，发送对冲请求")
+        try:
+            self.hedge_outcome = _timed(self.hedge_send, self.hedge_session)
+        except Exception as e:
+            self.hedge_outcome = e
+        finally:
+            self.hedge_session.close()
+        if not isinstance(self.hedge_outcome, Exception):
+            self.finish("hedge", self.hedge_outcome)
+        self.hedge_done.set()
+
+    def abort_all(self):
+        with self.lock:
+            self.primary_done = True
+            sessions = [self.primary_session, self.hedge_session]
+        for session in sessions:
+            if session is not None:
+                session.abort()
+
+
+def hedged_call(lane_name, send, hedge_send=None):
+    """
+    发送模型请求，必要时对冲
+
+    主请求在调用线程上发送，不经过线程池排队；对冲请求由定时器线程在延迟到达后发送。
+    每个请求使用独立的 AbortableSession，先成功的一方中断另一方的连接。
+
+    Args:
+        lane_name: 通道名，延迟统计和对冲预算按通道区分
+        send: 接收一个 session 参数（AbortableSession 或 None）的函数，发送主请求并返回 requests 的 Response
+        hedge_send: 可选，发送对冲请求（如备用接口），默认与 send 相同
+
+    Returns:
+        先成功（HTTP 200）返回的 Response；都失败时返回最后一个失败的 Response 或抛出异常
+    """
+    settings = _hedge_settings()
+    lane = get_lane(lane_name)
+    lane.start_primary(settings["budget_ratio"])
+
+    if not settings["enabled"]:
+        response, elapsed = _timed(send, None)
+        if response.status_code == 200:
+            lane.record_latency(elapsed)
+        return response
+
+    delay = lane.hedge_delay(settings["percentile"], settings["min_samples"], settings["default_delay"])
+    race = _HedgeRace(lane, hedge_send or send, delay)
+    timer = threading.Timer(delay, bind_current_deadline(race.launch_hedge))
+    timer.daemon = True
+    timer.start()
+
+    primary_outcome = None
+    primary_error = None
+    try:
+        primary_outcome = _timed(send, race.primary_session)
+    except DeadlineExceeded:
+        race.abort_all()
+        raise
+    except Exception as e:
+        primary_error = e
+    finally:
+        timer.cancel()
+        race.primary_session.close()
+
+    if race.finish("primary", primary_outcome):
+        return primary_outcome[0]
+
+    # 主请求失败（或被胜出的对冲请求中断）时，以对冲请求的结果为准
+    with race.lock:
+        hedge_started = race.hedge_session is not None
+    if hedge_started:
+        race.hedge_done.wait()
+        hedge_outcome = race.hedge_outcome
+        if race.winner == "hedge":
+            return hedge_outcome[0]
+        if not isinstance(hedge_outcome, Exception):
+            return hedge_outcome[0] if primary_outcome is None else primary_outcome[0]
+        if primary_error is None:
+            return primary_outcome[0]
+        raise primary_error
+
+    if primary_error is not None:
+        raise primary_error
+    return primary_outcome[0]
@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型服务接口
+core、core_improved、smart_replace_placeholders 都通过这里访问 OpenAI 兼容的 chat/completions 接口，
+地址、鉴权头、请求体格式只在这里出现一次。
+
+MODEL_PROVIDER 选择接口:
+    modelscope（默认）  API_BASE_URL，未配置时为 ModelScope 推理接口，密钥 MODELSCOPE_API_KEY
+    stub               本地桩服务（stub_model_server.py），地址 MODEL_STUB_URL，用于离线压测和基准
+"""
+
+import os
+import socket
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_MODEL_API_URL = "https://api-inference.modelscope.cn/v1/chat/completions"
+DEFAULT_MODEL_ENDPOINT = "deepseek-ai/DeepSeek-V3.2"
+DEFAULT_STUB_URL = "http://127.0.0.1:8765/v1/chat/completions"
+
+
+def _completions_url(url):
+    if url and not url.endswith("/chat/completions"):
+        url = url.rstrip("/") + "/chat/completions"
+    return url
+
+
+class AbortableSession(requests.Session):
+    """
+    可从其他线程中断的会话（对冲请求中落后的一方用它取消）
+
+    abort() 关闭该会话建立的所有连接，阻塞在读写上的请求立即以 ConnectionError 结束；
+    abort 之后新建的连接也会直接失败。每个请求使用独立的会话，互不影响
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._connections = []
+        self._abort_lock = threading.Lock()
+        self.aborted = False
+        for prefix in ("https://", "http://"):
+            self.mount(prefix, _AbortableAdapter(self))
+
+    def _register(self, connection):
+        with self._abort_lock:
+            if not self.aborted:
+                self._connections.append(connection)
+                return
+        _shutdown(connection)
+        raise ConnectionError("请求已取消")
+
+    def abort(self):
+        with self._abort_lock:
+            if self.aborted:
+                return
+            self.aborted = True
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            _shutdown(connection)
+
+
+def _shutdown(connection):
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class _AbortableAdapter(HTTPAdapter):
+    """新建连接时登记到所属会话，供 abort() 关闭"""
+
+    def __init__(self, session):
+        self._session = session
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self._track(self.poolmanager)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        self._track(manager)
+        return manager
+
+    def _track(self, manager):
+        if getattr(manager, "_abortable", False):
+            return
+        session = self._session
+        pool_classes = {}
+        for scheme, pool_cls in manager.pool_classes_by_scheme.items():
+            base_connection = pool_cls.ConnectionCls
+
+            def connect(connection, _base=base_connection):
+                _base.connect(connection)
+                session._register(connection)
+
+            connection_cls = type(base_connection.__name__, (base_connection,), {"connect": connect})
+            pool_classes[scheme] = type(pool_cls.__name__, (pool_cls,), {"ConnectionCls": connection_cls})
+        manager.pool_classes_by_scheme = pool_classes
+        manager._abortable = True
+
+
+class ModelProvider:
+    """一个 OpenAI 兼容的 chat/completions 接口"""
+
+    def __init__(self, url, api_key="", name="modelscope"):
+        self.url = _completions_url(url)
+        self.api_key = api_key or ""
+        self.name = name
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.api_key}", "Content-Type": "application/json"}
+
+    def payload(self, model, messages, params=None, thinking=None):
+        """
+        构造请求体
+
+        Args:
+            model: 模型名
+            messages: 对话消息列表
+            params: temperature、top_p、max_tokens 等采样参数
+            thinking: 是否开启思考（extra_body.enable_thinking），None 时不携带
+        """
+        data = {"model": model, "messages": messages, **(params or {})}
+        if thinking is not None:
+            data["extra_body"] = {"enable_thinking": thinking}
+        return data
+
+    def post(self, payload, timeout=None, session=None):
+        """
+        发送请求并返回 requests 的 Response
+
+        Args:
+            payload: 请求体（见 payload()）
+            timeout: 超时秒数，默认 MODEL_TIMEOUT_SECONDS（120 秒）
+            session: 可选的 AbortableSession，对冲时用于中断落后的请求
+        """
+        if timeout is None:
+            timeout = int(os.environ.get("MODEL_TIMEOUT_SECONDS", "120"))
+        return (session or requests).post(self.url, headers=self.headers(), json=payload, timeout=timeout)
+
+    def key_prefix(self):
+        """日志中显示的密钥前缀"""
+        return self.api_key[:5] + "..." if self.api_key else "NOT_SET"
+
+    @staticmethod
+    def message_content(res_json):
+        """取出回复文本，没有 choices 时返回 None"""
+        choices = res_json.get("choices") if isinstance(res_json, dict) else None
+        if not choices:
+            return None
+        return choices[0]["message"]["content"]
+
+
+def get_model_provider(api_key=None):
+    """
+    按环境变量返回当前使用的模型接口
+
+    Args:
+        api_key: 显式传入的密钥（命令行工具使用），默认读取 MODELSCOPE_API_KEY
+    """
+    name = os.environ.get("MODEL_PROVIDER", "modelscope").strip().lower()
+    if name == "stub":
+        return ModelProvider(os.environ.get("MODEL_STUB_URL") or DEFAULT_STUB_URL, api_key or "stub", name="stub")
+
+    url = os.environ.get("API_BASE_URL") or DEFAULT_MODEL_API_URL
+    return ModelProvider(url, api_key if api_key is not None else os.environ.get("MODELSCOPE_API_KEY", ""), name="modelscope")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模型调用统计
+按 任务 + 模型 分别记录调用次数、失败次数、缓存命中次数、延迟分位数和 token 用量；
+配置 MODEL_PRICES 后同时估算费用，格式为 JSON：
+    {"deepseek-ai/DeepSeek-V3.2": {"input": 2.0, "output": 3.0}}  （每百万 token 的价格）
+"""
+
+import json
+import os
+import threading
+from collections import deque
+
+_LATENCY_WINDOW_SIZE = 200
+
+_STATS = {}
+_STATS_LOCK = threading.Lock()
+
+
+def _model_prices():
+    raw = os.environ.get("MODEL_PRICES", "").strip()
+    if not raw:
+        return {}
+    try:
+        prices = json.loads(raw)
+    except json.JSONDecodeError:
+        print("⚠️ MODEL_PRICES 不是合法的 JSON，已忽略费用统计")
+        return {}
+    return prices if isinstance(prices, dict) else {}
+
+
+def _entry(task, model):
+    entry = _STATS.get((task, model))
+    if entry is None:
+        entry = _STATS[(task, model)] = {
+            "calls": 0,
+            "errors": 0,
+            "cache_hits": 0,
+            "total_seconds": 0.0,
+            "latencies": deque(maxlen=_LATENCY_WINDOW_SIZE),
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cost": 0.0,
+        }
+    return entry
+
+
+def record_model_call(task, model, seconds, status_code=None, usage=None):
+    """
+    记录一次模型调用
+
+    Args:
+        task: 任务名（fill、infer_fields、analyze_missing、audit）
+        model: 模型名
+        seconds: 端到端耗时（含对冲、重试等待）
+        status_code: HTTP 状态码，请求异常时为 None
+        usage: 接口返回的 usage（prompt_tokens / completion_tokens），可为空
+    """
+    usage = usage if isinstance(usage, dict) else {}
+    prompt_tokens = int(usage.get("prompt_tokens") or 0)
+    completion_tokens = int(usage.get("completion_tokens") or 0)
+    price = _model_prices().get(model) or {}
+    cost = (prompt_tokens * float(price.get("input", 0)) + completion_tokens * float(price.get("output", 0))) / 1_000_000
+
+    with _STATS_LOCK:
+        entry = _entry(task, model)
+        entry["calls"] += 1
+        entry["total_seconds"] += seconds
+        if status_code != 200:
+            entry["errors"] += 1
+        else:
+            entry["latencies"].append(seconds)
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+        entry["cost"] += cost
+
+
+def record_cache_hit(task, model):
+    """记录一次命中磁盘缓存（没有发出模型请求）"""
+    with _STATS_LOCK:
+        _entry(task, model)["cache_hits"] += 1
+
+
+def model_call_stats():
+    """各 任务 + 模型 的统计快照（列表）"""
+    with _STATS_LOCK:
+        snapshot = [(key, dict(entry, latencies=sorted(entry["latencies"]))) for key, entry in _STATS.items()]
+
+    result = []
+    for (task, model), entry in sorted(snapshot):
+        latencies = entry["latencies"]
+        result.append({
+            "task": task,
+            "model": model,
+            "calls": entry["calls"],
+            "errors": entry["errors"],
+            "cache_hits": entry["cache_hits"],
+            "avg_ms": round(entry["total_seconds"] / entry["calls"] * 1000) if entry["calls"] else None,
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000) if latencies else None,
+            "p95_ms": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000) if latencies else None,
+            "prompt_tokens": entry["prompt_tokens"],
+            "completion_tokens": entry["completion_tokens"],
+            "estimated_cost": round(entry["cost"], 6),
+        })
+    return result
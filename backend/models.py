@@ -5,7 +5,7 @@
 支持从 SQLite 平滑迁移到 PostgreSQL
 """
 
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, Boolean, UniqueConstraint, inspect, text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
@@ -94,6 +94,67 @@ class FileStorage(Base):
     operation_log_id = Column(Integer, nullable=True)  # 关联的操作日志ID
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class UserProfile(Base):
+    """个人资料表（按内容哈希去重，客户端通过 profile_id 引用）"""
+    __tablename__ = 'user_profiles'
+
+    id = Column(Integer, primary_key=True, index=True)
+    username = Column(String(50), nullable=False, index=True)  # 所属用户
+    content_hash = Column(String(64), nullable=False, index=True)  # 原始资料的 SHA-256
+    raw_text = Column(Text, nullable=False)  # 原始资料文本
+    canonical_fields = Column(Text, nullable=True)  # 标准字段映射（JSON格式）
+    file_path = Column(String(500), nullable=True)  # user-info bucket 中的文件路径
+    public_url = Column(String(1000), nullable=True)  # 公共访问URL
+    created_at = Column(DateTime, default=datetime.utcnow)
+    last_used_at = Column(DateTime, nullable=True)  # 最后使用时间
+
+    __table_args__ = (UniqueConstraint('username', 'content_hash', name='uq_user_profile_content'),)
+
+class FormTemplate(Base):
+    """模板库（管理员发布一次，编译结果随模板保存，用户通过 template_id 引用）"""
+    __tablename__ = 'form_templates'
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(255), nullable=False)  # 模板名称
+    content_hash = Column(String(64), nullable=False, index=True)  # 模板文件的 SHA-256
+    file_path = Column(String(500), nullable=False)  # docx-files bucket 中的文件路径（templates/ 下）
+    public_url = Column(String(1000), nullable=False)  # 公共访问URL
+    file_size = Column(Integer, nullable=False)  # 文件大小（字节）
+    compiled_template = Column(Text, nullable=False)  # 预编译结果（JSON格式，含字段名推断）
+    slot_count = Column(Integer, default=0)  # 占位符数量
+    created_by = Column(String(50), nullable=False)  # 发布的管理员
+    is_active = Column(Boolean, default=True)  # 下架后不再可用
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+class LearnedFieldAlias(Base):
+    """从填表结果中学习到的 表头 -> 标准字段 映射（命中次数达到阈值后并入别名索引）"""
+    __tablename__ = 'learned_field_aliases'
+
+    id = Column(Integer, primary_key=True, index=True)
+    header_key = Column(String(100), nullable=False, index=True)  # 归一化后的表头
+    header_text = Column(String(255), nullable=False)  # 表头原文（首次出现的写法）
+    canonical_field = Column(String(50), nullable=False)  # 标准字段（见 PROFILE_FIELD_ALIASES）
+    hits = Column(Integer, default=0)  # 观察到该映射的不同用户数（同一用户多份资料只计一次）
+    promoted = Column(Boolean, default=False)  # 是否已并入别名索引
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (UniqueConstraint('header_key', 'canonical_field', name='uq_learned_alias_header_field'),)
+
+class LearnedAliasObservation(Base):
+    """学习别名的观察来源（同一用户对同一映射只计一次）"""
+    __tablename__ = 'learned_alias_observations'
+
+    id = Column(Integer, primary_key=True, index=True)
+    header_key = Column(String(100), nullable=False, index=True)  # 归一化后的表头
+    canonical_field = Column(String(50), nullable=False)  # 标准字段
+    username = Column(String(50), nullable=False)  # 观察到该映射的用户
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint('header_key', 'canonical_field', 'username', name='uq_alias_observation_user'),
+    )
+
 # 数据库初始化 - 支持 PostgreSQL 和 SQLite
 def get_database_url():
     """获取数据库连接 URL"""
@@ -124,11 +185,42 @@ else:
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 表创建之后才加上的唯一约束：(表名, 约束名, 列)
+LATE_UNIQUE_CONSTRAINTS = [
+    ("user_profiles", "uq_user_profile_content", ("username", "content_hash")),
+    ("learned_field_aliases", "uq_learned_alias_header_field", ("header_key", "canonical_field")),
+]
+
+def migrate_unique_constraints(bind=None):
+    """
+    为已存在的表补上后加的唯一约束（create_all 不会修改已有表）
+
+    先删除重复行（每组保留 id 最小的一条），再建同名唯一索引；已有该约束或索引的表跳过
+    """
+    bind = bind or engine
+    inspector = inspect(bind)
+    for table, name, columns in LATE_UNIQUE_CONSTRAINTS:
+        if not inspector.has_table(table):
+            continue
+        existing = {item["name"] for item in inspector.get_unique_constraints(table)}
+        existing |= {item["name"] for item in inspector.get_indexes(table) if item.get("unique")}
+        if name in existing:
+            continue
+
+        column_list = ", ".join(columns)
+        with bind.begin() as conn:
+            deleted = conn.execute(text(
+                f"DELETE FROM {table} WHERE id NOT IN (SELECT MIN(id) FROM {table} GROUP BY {column_list})"
+            )).rowcount
+            conn.execute(text(f"CREATE UNIQUE INDEX {name} ON {table} ({column_list})"))
+        print(f"🔧 已为 {table} 添加唯一约束 {name}，删除重复行 {deleted} 条")
+
 def init_db():
     """初始化数据库"""
     try:
         # 创建所有表
         Base.metadata.create_all(bind=engine)
+        migrate_unique_constraints()
         print(f"✅ 数据库表创建成功！连接类型: {'PostgreSQL' if DATABASE_URL.startswith('postgresql') else 'SQLite'}")
 
         # 可选创建管理员账户（由环境变量控制，避免硬编码弱口令）
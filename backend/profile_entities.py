@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+自由文本个人资料的实体抽取
+PDF 提取的简历往往不是“字段：值”格式，这里用一个预编译的正则对全文扫描一遍，
+抽取身份证号、手机号、邮箱、出生/毕业日期、学历、毕业院校。
+同一类实体只有一个候选值时才采用，有歧义（如多个手机号）时放弃，交给模型处理。
+"""
+
+import re
+
+_ENTITY_RE = re.compile(
+    r"(?P<id_card>(?<![0-9A-Za-z])[1-9]\d{5}(?:18|19|20)\d{2}(?:0[1-9]|1[0-2])(?:0[1-9]|[12]\d|3[01])\d{3}[\dXx](?![0-9A-Za-z]))"
+    r"|(?P<mobile>(?<![0-9])(?:\+?86[-\s]?)?1[3-9]\d[-\s]?\d{4}[-\s]?\d{4}(?![0-9]))"
+    r"|(?P<email>[A-Za-z0-9._%+-]+@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,})"
+    r"|(?P<date_label>出生日期|出生年月|出生|生日|毕业时间|毕业日期|毕业)[^\d\n。；;，,]{0,8}"
+    r"(?P<date>(?:19|20)\d{2}\s*[年./-]\s*\d{1,2}(?:\s*[月./-]\s*\d{1,2}\s*日?|\s*月)?)"
+    r"|(?P<degree>博士研究生|硕士研究生|博士|硕士|研究生|本科|学士|大专|专科|高中|中专)"
+    r"|(?P<university>[一-龥]{2,20}?(?:大学|学院))"
+)
+
+# 院校名前面常粘连的叙述性文字，截取最后一个标记之后的部分
+_UNIVERSITY_PREFIX_RE = re.compile(r"^.*(?:毕业于|就读于|毕业|就读|考入|进入|院校|学校|于|在|入|是|的|年|月|日)")
+_SEPARATOR_RE = re.compile(r"[-\s]")
+
+_ID_CARD_WEIGHTS = (7, 9, 10, 5, 8, 4, 2, 1, 6, 3, 7, 9, 10, 5, 8, 4, 2)
+_ID_CARD_CHECK_CODES = "10X98765432"
+
+_DEGREE_CANONICAL = {
+    "博士研究生": "博士",
+    "硕士研究生": "硕士",
+    "学士": "本科",
+    "专科": "大专",
+}
+
+_DATE_LABEL_FIELDS = {
+    "出生日期": "出生日期",
+    "出生年月": "出生日期",
+    "出生": "出生日期",
+    "生日": "出生日期",
+    "毕业时间": "毕业时间",
+    "毕业日期": "毕业时间",
+    "毕业": "毕业时间",
+}
+
+
+def _is_valid_id_card(number):
+    total = sum(int(digit) * weight for digit, weight in zip(number[:17], _ID_CARD_WEIGHTS))
+    return _ID_CARD_CHECK_CODES[total % 11] == number[17].upper()
+
+
+def _normalize_mobile(text):
+    digits = _SEPARATOR_RE.sub("", text)
+    return digits[-11:]
+
+
+def _normalize_university(text):
+    name = _UNIVERSITY_PREFIX_RE.sub("", text)
+    return name if len(name) >= 4 else ""
+
+
+def extract_profile_entities(text):
+    """
+    从自由文本中抽取类型明确的字段
+
+    Returns:
+        dict: {标准字段名: 值}，只包含候选值唯一的字段；
+              字段名与 PROFILE_FIELD_ALIASES 的标准字段一致
+    """
+    candidates = {}
+    last_university_end = -1
+
+    for match in _ENTITY_RE.finditer(text or ""):
+        kind = match.lastgroup
+        if kind == "id_card":
+            value = match.group("id_card").upper()
+            if not _is_valid_id_card(value):
+                continue
+            field = "身份证号"
+        elif kind == "mobile":
+            field, value = "手机号码", _normalize_mobile(match.group("mobile"))
+        elif kind == "email":
+            field, value = "电子邮箱", match.group("email")
+        elif kind == "date":
+            field = _DATE_LABEL_FIELDS[match.group("date_label")]
+            value = _SEPARATOR_RE.sub("", match.group("date"))
+        elif kind == "degree":
+            raw = match.group("degree")
+            field, value = "学历", _DEGREE_CANONICAL.get(raw, raw)
+        else:
+            # 紧跟在院校名后的“XX学院”是院系，不算另一所院校
+            if match.start() == last_university_end:
+                last_university_end = match.end()
+                continue
+            last_university_end = match.end()
+            value = _normalize_university(match.group("university"))
+            if not value:
+                continue
+            field = "毕业院校"
+
+        candidates.setdefault(field, set()).add(value)
+
+    return {
+        field: next(iter(values))
+        for field, values in candidates.items()
+        if len(values) == 1
+    }
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+个人资料归一化
+正则在导入时预编译，并预先建立 别名 -> 标准字段 的反向索引，
+归一化只需对资料逐行扫描一遍
+"""
+
+import re
+from functools import lru_cache
+
+from text_automata import AhoCorasick, SuffixAutomaton
+
+PROFILE_FIELD_ALIASES = {
+    "姓名": ["名字", "姓名（中文）", "姓名(中文)", "name"],
+    "性别": ["gender"],
+    "出生日期": ["生日", "出生年月", "出生时间", "birth", "dateofbirth"],
+    "身份证号": ["身份证", "身份证号码", "证件号码", "id", "idcard"],
+    "手机号码": ["手机号", "手机", "电话", "联系电话", "联系方式", "mobile", "phone"],
+    "电子邮箱": ["邮箱", "邮件", "email", "e-mail"],
+    "毕业院校": ["毕业学校", "学校", "院校", "高校", "university", "college"],
+    "学历": ["教育程度", "education", "degree"],
+    "专业": ["所学专业", "major"],
+    "毕业时间": ["毕业日期", "graduation", "graduationdate"],
+    "应聘岗位": ["应聘职位", "求职岗位", "职位", "岗位", "position", "jobtitle"],
+    "期望城市": ["意向城市", "目标城市", "求职城市", "expectedcity"],
+    "现居住地": ["现居", "居住地", "居住地址", "地址", "address", "location"],
+    "政治面貌": ["政治身份"],
+    "紧急联系人": ["联系人", "紧急联络人", "emergencycontact"],
+    "紧急联系人电话": ["紧急联系人手机号", "紧急联系电话", "emergencyphone"],
+}
+
+PROFILE_KEY_NOISE_TOKENS = [
+    "必填",
+    "选填",
+    "必选",
+    "可选",
+    "required",
+    "optional",
+    "请填写",
+    "请输入",
+]
+
+PROFILE_REUSE_HEADER = "## 标准化资料映射（系统自动生成，用于跨模板复用）"
+
+_KEY_PUNCTUATION_RE = re.compile(r"[\s_\-（）()【】\[\]·.]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+_BULLET_PREFIX_RE = re.compile(r"^[-*•·]+\s*")
+_NUMBER_PREFIX_RE = re.compile(r"^\d+[.)、]\s*")
+_KEY_VALUE_SEPARATOR_RE = re.compile(r"[：:=]")
+
+
+@lru_cache(maxsize=4096)
+def normalize_profile_key(key):
+    """统一字段名：去掉空白/标点，转小写，去掉“必填”等噪声词"""
+    cleaned = _KEY_PUNCTUATION_RE.sub("", key or "").lower()
+    # 按列表顺序逐个删除，与逐词 replace 的结果保持一致
+    for token in PROFILE_KEY_NOISE_TOKENS:
+        if token in cleaned:
+            cleaned = cleaned.replace(token, "")
+    return cleaned.strip()
+
+
+def _build_alias_index():
+    """别名 -> [(标准字段, 优先级)]，优先级为该别名在候选列表中的位置（标准名本身为 0）"""
+    index = {}
+    for canonical, aliases in PROFILE_FIELD_ALIASES.items():
+        for priority, candidate in enumerate([canonical] + aliases):
+            candidate_key = normalize_profile_key(candidate)
+            index.setdefault(candidate_key, []).append((canonical, priority))
+    return index
+
+
+PROFILE_ALIAS_INDEX = _build_alias_index()
+
+# 从填表结果中学习到的别名排在内置别名之后
+LEARNED_ALIAS_PRIORITY = 100
+
+
+def register_learned_aliases(pairs):
+    """
+    把学习到的 别名 -> 标准字段 映射并入别名索引
+
+    原地修改 PROFILE_ALIAS_INDEX，已导入该索引的模块同样生效；已存在的别名（含内置别名）保持不变
+
+    Args:
+        pairs: [(别名, 标准字段)]
+
+    Returns:
+        int: 新增的别名数量
+    """
+    added = 0
+    for alias, canonical in pairs:
+        alias_key = normalize_profile_key(alias)
+        if not alias_key or alias_key in PROFILE_ALIAS_INDEX or canonical not in PROFILE_FIELD_ALIASES:
+            continue
+        PROFILE_ALIAS_INDEX[alias_key] = [(canonical, LEARNED_ALIAS_PRIORITY)]
+        added += 1
+    return added
+
+
+def sync_learned_aliases(pairs):
+    """
+    让别名索引中的学习别名与 pairs 一致：新增缺少的，移除 pairs 中已没有的（内置别名不受影响）
+
+    其他进程晋升或删除的别名通过定期调用本函数同步
+
+    Returns:
+        int: 新增和移除的别名数量之和
+    """
+    pairs = list(pairs)
+    keep = {normalize_profile_key(alias) for alias, _ in pairs}
+    stale = [
+        alias_key for alias_key, entries in PROFILE_ALIAS_INDEX.items()
+        if alias_key not in keep and all(priority == LEARNED_ALIAS_PRIORITY for _, priority in entries)
+    ]
+    for alias_key in stale:
+        del PROFILE_ALIAS_INDEX[alias_key]
+    return register_learned_aliases(pairs) + len(stale)
+
+
+def forget_learned_alias(alias):
+    """从别名索引中移除学习到的别名（内置别名不受影响）"""
+    alias_key = normalize_profile_key(alias)
+    entries = PROFILE_ALIAS_INDEX.get(alias_key)
+    if entries and all(priority == LEARNED_ALIAS_PRIORITY for _, priority in entries):
+        del PROFILE_ALIAS_INDEX[alias_key]
+        return True
+    return False
+
+
+def extract_profile_pairs(user_info_text):
+    """解析“字段：值”形式的行，同一字段只保留第一次出现的值"""
+    parsed_fields = {}
+    for raw_line in (user_info_text or "").splitlines():
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        line = _BULLET_PREFIX_RE.sub("", line)
+        line = _NUMBER_PREFIX_RE.sub("", line)
+
+        parts = _KEY_VALUE_SEPARATOR_RE.split(line, maxsplit=1)
+        if len(parts) != 2:
+            continue
+
+        key = parts[0].strip()
+        value = parts[1].strip().strip('"\'')
+        if not key or not value:
+            continue
+
+        normalized_key = normalize_profile_key(key)
+        if normalized_key and normalized_key not in parsed_fields:
+            parsed_fields[normalized_key] = value
+
+    return parsed_fields
+
+
+def _explicit_values_from_pairs(parsed_fields):
+    explicit_values = set()
+    for value in parsed_fields.values():
+        normalized_value = _WHITESPACE_RE.sub("", str(value or ""))
+        if normalized_value:
+            explicit_values.add(normalized_value)
+    return explicit_values
+
+
+def collect_explicit_profile_values(user_info_text):
+    """资料中明确给出的值（去除空白），用于判断模型输出是否来自资料"""
+    return _explicit_values_from_pairs(extract_profile_pairs(user_info_text))
+
+
+def _match_canonical_pairs(parsed_fields):
+    """
+    一次遍历已解析字段，通过反向索引找到每个标准字段的值；
+    多个别名命中同一标准字段时，取候选列表中靠前的那个
+    """
+    best = {}
+    for normalized_key, value in parsed_fields.items():
+        for canonical, priority in PROFILE_ALIAS_INDEX.get(normalized_key, ()):
+            current = best.get(canonical)
+            if current is None or priority < current[0]:
+                best[canonical] = (priority, value)
+
+    return [
+        (canonical, best[canonical][1])
+        for canonical in PROFILE_FIELD_ALIASES
+        if canonical in best
+    ]
+
+
+def _append_canonical_pairs(user_info_text, canonical_pairs):
+    augmented_lines = ["", PROFILE_REUSE_HEADER]
+    augmented_lines.extend([f"{k}：{v}" for k, v in canonical_pairs])
+    return user_info_text.rstrip() + "\n" + "\n".join(augmented_lines)
+
+
+def build_profile_reuse_context(user_info_text):
+    """在资料末尾追加标准字段映射，便于不同模板的表头复用同一份资料"""
+    if not user_info_text:
+        return user_info_text
+
+    if PROFILE_REUSE_HEADER in user_info_text:
+        return user_info_text
+
+    parsed_fields = extract_profile_pairs(user_info_text)
+    if not parsed_fields:
+        return user_info_text
+
+    canonical_pairs = _match_canonical_pairs(parsed_fields)
+    if not canonical_pairs:
+        return user_info_text
+
+    return _append_canonical_pairs(user_info_text, canonical_pairs)
+
+
+def parse_profile(user_info_text):
+    """
+    一次解析同时得到归一化文本、明确值集合和标准字段映射
+
+    追加的映射行的值都来自原资料，且映射标题行不含分隔符，
+    因此对原资料解析出的明确值与对归一化文本重新解析的结果相同，无需再扫描一遍
+
+    Returns:
+        dict: {"normalized_text": 归一化后的资料文本, "explicit_values": 明确值集合,
+               "canonical_fields": {标准字段: 值}, "profile_fields": {归一化字段名: 值}}
+    """
+    parsed_fields = extract_profile_pairs(user_info_text)
+    explicit_values = _explicit_values_from_pairs(parsed_fields)
+    canonical_pairs = _match_canonical_pairs(parsed_fields)
+
+    normalized_text = user_info_text
+    if user_info_text and PROFILE_REUSE_HEADER not in user_info_text and canonical_pairs:
+        normalized_text = _append_canonical_pairs(user_info_text, canonical_pairs)
+
+    return {
+        "normalized_text": normalized_text,
+        "explicit_values": explicit_values,
+        "canonical_fields": dict(canonical_pairs),
+        "profile_fields": parsed_fields,
+    }
+
+
+def normalize_profile(user_info_text):
+    """
+    Returns:
+        tuple: (归一化后的资料文本, 明确值集合)，见 parse_profile
+    """
+    profile = parse_profile(user_info_text)
+    return profile["normalized_text"], profile["explicit_values"]
+
+
+class ExplicitValueIndex:
+    """
+    明确值索引：判断模型填写的值是否来自用户资料，每个请求只构建一次
+
+    判定规则：
+    1. 去除空白后与某个明确值完全相同
+    2. 长度大于 1 时：是某个明确值的子串，或包含某个长度大于 1 的明确值
+       （例如 "上海" vs "上海市浦东新区"）
+    3. 长度大于 1 时：是去除空白后的原始资料的子串
+       （解决 PDF 提取的流式文本无法被解析为 key:value 对的问题）
+
+    规则 2 的前半与规则 3 合并为一个后缀自动机（原始资料与各明确值用换行拼接，
+    值已去除空白，不会跨段命中）；规则 2 的后半用 Aho-Corasick 自动机
+    """
+
+    _SEGMENT_SEPARATOR = "\n"
+
+    def __init__(self, explicit_values, raw_text=""):
+        self._explicit_values = set(explicit_values)
+        segments = [_WHITESPACE_RE.sub("", raw_text)] if raw_text else []
+        segments.extend(self._explicit_values)
+        self._substring_index = SuffixAutomaton(self._SEGMENT_SEPARATOR.join(segments))
+        self._containment_index = AhoCorasick(value for value in self._explicit_values if len(value) > 1)
+
+    def accepts(self, value):
+        normalized_value = _WHITESPACE_RE.sub("", str(value or ""))
+        if not normalized_value:
+            return False
+
+        if normalized_value in self._explicit_values:
+            return True
+
+        if len(normalized_value) <= 1:
+            return False
+
+        return (
+            self._substring_index.contains(normalized_value)
+            or self._containment_index.contains_any(normalized_value)
+        )
@@ -1,25 +1,40 @@
 import os
+import re
 import time
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import List, Optional
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends, Request, Body
 from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, RedirectResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 import json
 
 # 导入核心模块
-from core import fill_form, audit_template
-from models import init_db, User, OperationLog, Feedback, FileStorage, SessionLocal, SimpleUser
+from core import fill_form, audit_template, preview_form, iter_batch_fill, iter_multi_template_fill, prepare_profile_context, compile_template_stream, infer_template_headers, collect_alias_observations, model_profile, MODEL_TASK_PROFILES
+from models import init_db, User, OperationLog, Feedback, FileStorage, SessionLocal, SimpleUser, UserProfile, FormTemplate, LearnedFieldAlias, LearnedAliasObservation
 from auth import (
     get_db, hash_password, verify_password, create_user,
     authenticate_user, log_operation, get_current_user, is_admin,
     generate_token, security, create_temporary_account, check_user_expired,
     _decode_token
 )
-from supabase_client import upload_file_to_supabase, delete_file_from_supabase, generate_unique_filename
+from supabase_client import upload_file_to_supabase, delete_file_from_supabase, generate_unique_filename, open_file_stream_from_supabase
+from zip_stream import ZIP_STREAM_CHUNK_SIZE, stream_zip
+from deadline import Deadline, DeadlineExceeded
+from model_stats import model_call_stats
+from model_hedging import lane_stats
+from completion_cache import get_completion_cache
+from profile_normalizer import forget_learned_alias, register_learned_aliases, sync_learned_aliases
+from template_diff import carry_over_inferred_headers, diff_templates, signature_similarity, template_signature
 
 app = FastAPI(title="智能填表系统")
 
@@ -35,7 +50,21 @@ app.add_middleware(
 
 FILE_RETENTION_HOURS = int(os.getenv("FILE_RETENTION_HOURS", "24"))
 FILE_CLEANUP_INTERVAL_SECONDS = int(os.getenv("FILE_CLEANUP_INTERVAL_SECONDS", "1800"))
+BATCH_MAX_PROFILES = int(os.getenv("BATCH_MAX_PROFILES", "200"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+MULTI_TEMPLATE_MAX = int(os.getenv("MULTI_TEMPLATE_MAX", "10"))
+PROFILE_CACHE_SIZE = int(os.getenv("PROFILE_CACHE_SIZE", "256"))
+TEMPLATE_CACHE_SIZE = int(os.getenv("TEMPLATE_CACHE_SIZE", "32"))
+TEMPLATE_MATCH_MIN_SIMILARITY = float(os.getenv("TEMPLATE_MATCH_MIN_SIMILARITY", "0.6"))
+# 晋升的别名对所有用户生效，至少需要两个不同用户的观察，单个账号无法独自晋升
+ALIAS_PROMOTION_MIN_USERS = max(2, int(os.getenv("ALIAS_PROMOTION_MIN_USERS", "3")))
+ALIAS_PROMOTION_MIN_SHARE = float(os.getenv("ALIAS_PROMOTION_MIN_SHARE", "0.9"))
+ALIAS_RELOAD_INTERVAL_SECONDS = int(os.getenv("ALIAS_RELOAD_INTERVAL_SECONDS", "300"))
+REQUEST_DEADLINE_SECONDS = int(os.getenv("REQUEST_DEADLINE_SECONDS", "180"))
+BATCH_DEADLINE_SECONDS = int(os.getenv("BATCH_DEADLINE_SECONDS", "1800"))  # 批量/多模板整批的截止时间
+DISCONNECT_POLL_SECONDS = 0.5
 LAST_FILE_CLEANUP_AT = None
+LAST_ALIAS_RELOAD_AT = None
 SERVICE_STARTED_AT_UTC = datetime.now(timezone.utc)
 
 BUCKET_MAP = {
@@ -45,6 +74,56 @@ BUCKET_MAP = {
 }
 
 
+async def run_with_deadline(request: Optional[Request], deadline: Deadline, func, *args, **kwargs):
+    """
+    在线程池中以请求的截止时间执行同步工作（模型调用、文档处理、存储上传）
+
+    等待期间轮询客户端连接，断开后取消截止时间，工作在下一个检查点抛出 DeadlineExceeded；
+    外部调用的超时不超过剩余时间，因此超时后最迟在剩余时间内结束
+    """
+    task = asyncio.ensure_future(run_in_threadpool(deadline.run, func, *args, **kwargs))
+    while not task.done():
+        await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+        if task.done() or deadline.cancelled or request is None:
+            continue
+        if await request.is_disconnected():
+            print("🔌 客户端已断开，取消处理")
+            deadline.cancel("客户端已断开，处理已取消")
+    return task.result()
+
+
+_STREAM_END = object()
+
+
+async def stream_with_deadline(request: Optional[Request], deadline: Deadline, chunks):
+    """
+    以截止时间逐块产出同步生成器（批量/多模板压缩包）的内容
+
+    每一块都经 run_with_deadline 在线程池中生成，等待期间轮询客户端连接；
+    响应中途结束（客户端断开导致发送失败或任务被取消）时取消截止时间，未完成的填表任务随之停止
+    """
+    iterator = iter(chunks)
+    finished = False
+    try:
+        while True:
+            chunk = await run_with_deadline(request, deadline, next, iterator, _STREAM_END)
+            if chunk is _STREAM_END:
+                finished = True
+                return
+            yield chunk
+    finally:
+        if not finished and not deadline.cancelled:
+            print("🔌 压缩包响应已中止，取消剩余填表任务")
+            deadline.cancel("客户端已断开，处理已取消")
+
+
+def deadline_exceeded_response(deadline: Deadline):
+    """超时返回 504；客户端已断开时返回 499（响应不会被读取，仅用于日志）"""
+    if deadline.cancelled:
+        return JSONResponse(status_code=499, content={"error": deadline.reason})
+    return JSONResponse(status_code=504, content={"error": "请求处理超时，请稍后重试"})
+
+
 def resolve_docx_upload(docx: Optional[UploadFile], docx_file: Optional[UploadFile]) -> UploadFile:
     """兼容新旧上传字段：优先 docx，其次 docx_file。"""
     upload = docx or docx_file
@@ -53,11 +132,332 @@ def resolve_docx_upload(docx: Optional[UploadFile], docx_file: Optional[UploadFi
     return upload
 
 
+def safe_zip_member_name(name: str, fallback: str) -> str:
+    """清理压缩包内的文件名，去掉路径分隔符等非法字符"""
+    cleaned = re.sub(r'[\\/:*?"<>|\s]+', "_", str(name or "")).strip("._")
+    return cleaned[:60] or fallback
+
+
+def stream_filled_documents_zip(results, manifest, task_indices, charge_user_id=None, username=""):
+    """
+    将填充结果逐个写入压缩包并流式输出，最后写入 manifest.json
+
+    Args:
+        results: 产出 (task_idx, result) 的生成器（见 core.iter_batch_fill），抛出 DeadlineExceeded 时停止
+        manifest: 每一项的记录列表，需包含 index/name，成功/失败信息会写回其中
+        task_indices: task_idx -> manifest 下标
+        charge_user_id: Token 用户 ID，按成功份数扣减余额
+    """
+    success_count = 0
+
+    def iter_members():
+        nonlocal success_count
+        try:
+            for task_idx, result in results:
+                entry = manifest[task_indices[task_idx]]
+                if "error" in result:
+                    entry["error"] = result["error"]
+                    continue
+                filename = f"{entry['index']:03d}_{safe_zip_member_name(entry['name'], 'filled')}.docx"
+                entry.update({
+                    "success": True,
+                    "filename": filename,
+                    "missing_fields": result["missing_fields"],
+                    "low_confidence_fields": result["low_confidence_fields"],
+                })
+                success_count += 1
+                yield filename, result["output_bytes"]
+        except DeadlineExceeded as e:
+            # 超时或取消：已完成的文档保留，未完成的项记录原因
+            print(f"⏱️ 填表压缩包中止: {e}")
+            for entry in manifest:
+                if not entry["success"] and "error" not in entry:
+                    entry["error"] = str(e)
+        # manifest 在所有成员写完后才完整，放在最后
+        yield "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+
+    yield from stream_zip(iter_members())
+
+    print(f"📦 填表压缩包生成完成：成功 {success_count}/{len(manifest)}")
+
+    # Token 用户按成功份数扣减余额（流式响应结束时请求级会话可能已关闭，单独开会话）
+    if charge_user_id is not None and success_count:
+        balance_db = SessionLocal()
+        try:
+            token_user = balance_db.query(SimpleUser).filter(SimpleUser.id == charge_user_id).first()
+            if token_user:
+                token_user.balance = max(0, token_user.balance - success_count)
+                balance_db.commit()
+                print(f"💰 Token用户 {username} 余额剩余: {token_user.balance}")
+        finally:
+            balance_db.close()
+
+
+# 已保存资料的解析结果缓存（content_hash -> prepare_profile_context 的结果）
+PROFILE_CONTEXT_CACHE = OrderedDict()
+PROFILE_CONTEXT_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_profile_context(content_hash: str, raw_text: str):
+    """按内容哈希缓存归一化结果（含明确值索引），同一资料版本只解析一次"""
+    with PROFILE_CONTEXT_CACHE_LOCK:
+        profile_context = PROFILE_CONTEXT_CACHE.get(content_hash)
+        if profile_context is not None:
+            PROFILE_CONTEXT_CACHE.move_to_end(content_hash)
+            return profile_context
+
+    profile_context = prepare_profile_context(raw_text)
+
+    with PROFILE_CONTEXT_CACHE_LOCK:
+        PROFILE_CONTEXT_CACHE[content_hash] = profile_context
+        while len(PROFILE_CONTEXT_CACHE) > PROFILE_CACHE_SIZE:
+            PROFILE_CONTEXT_CACHE.popitem(last=False)
+    return profile_context
+
+
+def resolve_user_profile(db: Session, username: str, profile_id: Optional[int], user_info_text: Optional[str]):
+    """
+    解析请求中的个人资料：传了 profile_id 时使用已保存的资料，否则使用 user_info_text
+
+    Returns:
+        (user_info_text, profile_context, profile)，未使用 profile_id 时后两项为 None
+    """
+    if profile_id is None:
+        if not user_info_text:
+            raise HTTPException(status_code=422, detail="缺少个人信息，请提供 user_info_text 或 profile_id")
+        return user_info_text, None, None
+
+    profile = db.query(UserProfile).filter(
+        UserProfile.id == profile_id,
+        UserProfile.username == username
+    ).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="资料不存在或已过期，请重新保存")
+
+    profile.last_used_at = datetime.utcnow()
+    db.commit()
+    return profile.raw_text, get_cached_profile_context(profile.content_hash, profile.raw_text), profile
+
+
+# 模板库缓存（template_id -> {"compiled": 预编译结果, "docx_bytes": 模板文件，按需下载}）
+TEMPLATE_CACHE = OrderedDict()
+TEMPLATE_CACHE_LOCK = threading.Lock()
+
+
+def get_cached_template(template: FormTemplate, need_bytes: bool = True):
+    """
+    读取模板库中模板的编译结果（及文件字节）
+
+    编译结果从数据库反序列化一次后常驻缓存；模板文件只在需要生成 docx 时从
+    docx-files bucket 下载一次，网格预览等只用编译结果的场景不下载。
+    """
+    with TEMPLATE_CACHE_LOCK:
+        entry = TEMPLATE_CACHE.get(template.id)
+        if entry is not None and entry["content_hash"] == template.content_hash:
+            TEMPLATE_CACHE.move_to_end(template.id)
+        else:
+            entry = {
+                "content_hash": template.content_hash,
+                "compiled": json.loads(template.compiled_template),
+                "docx_bytes": None,
+            }
+            TEMPLATE_CACHE[template.id] = entry
+            while len(TEMPLATE_CACHE) > TEMPLATE_CACHE_SIZE:
+                TEMPLATE_CACHE.popitem(last=False)
+
+    if need_bytes and entry["docx_bytes"] is None:
+        docx_bytes = b"".join(open_file_stream_from_supabase(BUCKET_MAP["docx"], template.file_path))
+        if hashlib.sha256(docx_bytes).hexdigest() != template.content_hash:
+            raise HTTPException(status_code=409, detail="模板文件与发布时不一致，请管理员重新发布")
+        entry["docx_bytes"] = docx_bytes
+        print(f"📥 已下载模板文件 template_id={template.id} ({len(docx_bytes)} 字节)")
+
+    return entry["compiled"], entry["docx_bytes"]
+
+
+# 模板库结构签名（template_id -> (content_hash, 签名)），用于匹配用户上传的近似模板
+TEMPLATE_SIGNATURES = {}
+TEMPLATE_SIGNATURES_LOCK = threading.Lock()
+
+
+def find_similar_template(db: Session, compiled: dict):
+    """
+    在模板库中找出与 compiled 结构最相近的模板（相似度低于 TEMPLATE_MATCH_MIN_SIMILARITY 时返回 None）
+
+    Returns:
+        (FormTemplate, 相似度) 或 (None, 0.0)
+    """
+    signature = template_signature(compiled)
+    if not signature:
+        return None, 0.0
+
+    best_id, best_similarity = None, 0.0
+    for template_id, content_hash in db.query(FormTemplate.id, FormTemplate.content_hash).filter(
+        FormTemplate.is_active.is_(True)
+    ).all():
+        with TEMPLATE_SIGNATURES_LOCK:
+            cached = TEMPLATE_SIGNATURES.get(template_id)
+        if cached is None or cached[0] != content_hash:
+            template = db.query(FormTemplate).filter(FormTemplate.id == template_id).first()
+            template_compiled, _ = get_cached_template(template, need_bytes=False)
+            cached = (content_hash, template_signature(template_compiled))
+            with TEMPLATE_SIGNATURES_LOCK:
+                TEMPLATE_SIGNATURES[template_id] = cached
+
+        similarity = signature_similarity(signature, cached[1])
+        if similarity > best_similarity:
+            best_id, best_similarity = template_id, similarity
+
+    if best_id is None or best_similarity < TEMPLATE_MATCH_MIN_SIMILARITY:
+        return None, best_similarity
+    return db.query(FormTemplate).filter(FormTemplate.id == best_id).first(), best_similarity
+
+
+def reuse_library_analysis(db: Session, compiled: dict):
+    """
+    上传的模板与模板库中的某个模板结构相近时，未变化的占位符沿用其推断字段名（原地修改 compiled）
+
+    Returns:
+        匹配到的 FormTemplate，没有时返回 None
+    """
+    template, similarity = find_similar_template(db, compiled)
+    if not template:
+        return None
+
+    base_compiled, _ = get_cached_template(template, need_bytes=False)
+    diff = diff_templates(base_compiled, compiled)
+    carried = carry_over_inferred_headers(base_compiled, compiled, diff["slot_map"])
+    print(
+        f"🧬 上传模板与 template_id={template.id} 结构相近（相似度 {similarity:.2f}）："
+        f"{len(diff['slot_map'])} 个占位符未变化，{len(diff['changed_slots'])} 个新增/变化，"
+        f"沿用 {carried} 个推断字段名"
+    )
+    return template
+
+
+def resolve_form_template(db: Session, template_id: Optional[int]) -> Optional[FormTemplate]:
+    """解析请求中的 template_id（未传时返回 None，由调用方使用上传的 docx）"""
+    if template_id is None:
+        return None
+    template = db.query(FormTemplate).filter(
+        FormTemplate.id == template_id,
+        FormTemplate.is_active.is_(True)
+    ).first()
+    if not template:
+        raise HTTPException(status_code=404, detail="模板不存在或已下架")
+    return template
+
+
+def load_learned_aliases(db: Session):
+    """
+    把数据库中已晋升的学习别名同步到本进程的别名索引（启动时及每隔 ALIAS_RELOAD_INTERVAL_SECONDS）
+
+    晋升和删除都只直接作用于处理该请求的 worker，其他 worker 通过这里的定期同步获得
+    """
+    records = db.query(LearnedFieldAlias).filter(LearnedFieldAlias.promoted.is_(True)).all()
+    changed = sync_learned_aliases((record.header_text, record.canonical_field) for record in records)
+    if changed:
+        # 已缓存的资料解析结果按旧别名索引计算，需重新解析
+        with PROFILE_CONTEXT_CACHE_LOCK:
+            PROFILE_CONTEXT_CACHE.clear()
+        print(f"📖 已同步学习到的字段别名：{len(records)} 个已晋升，本进程变更 {changed} 个")
+    return changed
+
+
+def maybe_reload_learned_aliases(db: Session):
+    """按时间间隔同步其他 worker 晋升或删除的别名"""
+    global LAST_ALIAS_RELOAD_AT
+
+    now = datetime.utcnow()
+    if LAST_ALIAS_RELOAD_AT and (now - LAST_ALIAS_RELOAD_AT).total_seconds() < ALIAS_RELOAD_INTERVAL_SECONDS:
+        return None
+
+    LAST_ALIAS_RELOAD_AT = now
+    try:
+        return load_learned_aliases(db)
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ 同步学习别名失败: {e}")
+        return None
+
+
+def learn_field_aliases(db: Session, username: str, compiled: dict, fill_data: dict, profile_context: dict):
+    """
+    记录本次填表观察到的 表头 -> 标准字段 对应关系（见 core.collect_alias_observations）
+
+    fill_data 只能是本次推理得到的结果（不能含用户回传或修改过的值）。
+    同一用户对同一映射只计一次（不论用了几份资料），重复预览、检查不会累加；
+    观察到某映射的不同用户达到 ALIAS_PROMOTION_MIN_USERS 个、且占这个表头全部观察的
+    ALIAS_PROMOTION_MIN_SHARE 以上时晋升为别名，之后所有用户同样的表头直接确定性预填，不再交给模型。
+    记录失败不影响填表。
+    """
+    observations = collect_alias_observations(compiled, fill_data, profile_context)
+    if not observations:
+        return
+
+    promoted = []
+    try:
+        now = datetime.utcnow()
+        for header_key, header_text, canonical in observations:
+            seen = db.query(LearnedAliasObservation.id).filter(
+                LearnedAliasObservation.header_key == header_key,
+                LearnedAliasObservation.canonical_field == canonical,
+                LearnedAliasObservation.username == username
+            ).first()
+            if seen:
+                continue
+            db.add(LearnedAliasObservation(header_key=header_key, canonical_field=canonical, username=username))
+
+            record = db.query(LearnedFieldAlias).filter(
+                LearnedFieldAlias.header_key == header_key,
+                LearnedFieldAlias.canonical_field == canonical
+            ).first()
+            if not record:
+                record = LearnedFieldAlias(header_key=header_key, header_text=header_text, canonical_field=canonical, hits=0)
+                db.add(record)
+            record.hits = (record.hits or 0) + 1
+            record.updated_at = now
+        db.flush()
+
+        for header_key in {observation[0] for observation in observations}:
+            records = db.query(LearnedFieldAlias).filter(LearnedFieldAlias.header_key == header_key).all()
+            best = max(records, key=lambda record: record.hits)
+            total_hits = sum(record.hits for record in records)
+            if (not best.promoted and best.hits >= ALIAS_PROMOTION_MIN_USERS
+                    and best.hits >= total_hits * ALIAS_PROMOTION_MIN_SHARE):
+                best.promoted = True
+                promoted.append(best)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ 别名学习记录失败: {e}")
+        return
+
+    if promoted and register_learned_aliases((record.header_text, record.canonical_field) for record in promoted):
+        # 已缓存的资料解析结果按旧别名索引计算，需重新解析
+        with PROFILE_CONTEXT_CACHE_LOCK:
+            PROFILE_CONTEXT_CACHE.clear()
+        print(f"📖 新晋升字段别名: {[(record.header_text, record.canonical_field) for record in promoted]}")
+
+
 def cleanup_expired_files(db: Session):
     """删除超过保留期的文件记录与远端文件（默认24小时）"""
     cutoff = datetime.utcnow() - timedelta(hours=FILE_RETENTION_HOURS)
     expired_files = db.query(FileStorage).filter(FileStorage.created_at < cutoff).all()
 
+    # 已保存的资料按最后一次使用计算保留期，仍在使用的资料连同其 user-info 文件保留
+    profile_last_used = func.coalesce(UserProfile.last_used_at, UserProfile.created_at)
+    live_profile_paths = {
+        path for (path,) in db.query(UserProfile.file_path).filter(
+            profile_last_used >= cutoff,
+            UserProfile.file_path.isnot(None)
+        )
+    }
+    expired_files = [
+        file_record for file_record in expired_files
+        if not (file_record.file_type == "user_info" and file_record.file_path in live_profile_paths)
+    ]
+
     deleted_count = 0
     failed_count = 0
 
@@ -73,18 +473,27 @@ def cleanup_expired_files(db: Session):
         else:
             failed_count += 1
 
-    if deleted_count:
+    profiles_deleted = db.query(UserProfile).filter(profile_last_used < cutoff).delete(synchronize_session=False)
+
+    if deleted_count or profiles_deleted:
         db.commit()
 
-    if expired_files:
+    # 模型缓存中的提示词和回复含有个人信息，有效期同样不超过保留期
+    completion_cache = get_completion_cache()
+    cache_purged = completion_cache.purge_expired() if completion_cache is not None else 0
+
+    if expired_files or profiles_deleted or cache_purged:
         print(
-            f"🧹 文件保留清理：total={len(expired_files)}, deleted={deleted_count}, failed={failed_count}, cutoff={cutoff.isoformat()}"
+            f"🧹 文件保留清理：total={len(expired_files)}, deleted={deleted_count}, failed={failed_count}, "
+            f"profiles_deleted={profiles_deleted}, model_cache_purged={cache_purged}, cutoff={cutoff.isoformat()}"
         )
 
     return {
         "total": len(expired_files),
         "deleted": deleted_count,
         "failed": failed_count,
+        "profiles_deleted": profiles_deleted,
+        "model_cache_purged": cache_purged,
     }
 
 
@@ -110,6 +519,7 @@ async def startup_event():
     db = SessionLocal()
     try:
         maybe_cleanup_expired_files(db)
+        maybe_reload_learned_aliases(db)
     finally:
         db.close()
 
@@ -347,15 +757,379 @@ async def get_authenticated_user(
     # 如果都没有，返回None
     return None
 
+def serialize_user_profile(profile: UserProfile) -> dict:
+    return {
+        "profile_id": profile.id,
+        "content_hash": profile.content_hash,
+        "canonical_fields": json.loads(profile.canonical_fields) if profile.canonical_fields else {},
+        "user_info_url": profile.public_url,
+        "created_at": profile.created_at.isoformat() if profile.created_at else None,
+        "last_used_at": profile.last_used_at.isoformat() if profile.last_used_at else None,
+    }
+
+@app.post("/api/profiles")
+async def create_profile(
+    user_info_text: str = Form(...),
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """保存个人资料（需要认证）- 相同内容只保存和上传一次，返回 profile_id 供后续填表引用"""
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    username = auth_result["username"]
+    if not user_info_text.strip():
+        raise HTTPException(status_code=422, detail="个人信息不能为空")
+
+    try:
+        content_hash = hashlib.sha256(user_info_text.encode("utf-8")).hexdigest()
+        existing = db.query(UserProfile).filter(
+            UserProfile.username == username,
+            UserProfile.content_hash == content_hash
+        ).first()
+        if existing:
+            existing.last_used_at = datetime.utcnow()
+            db.commit()
+            print(f"♻️ 资料未变化，复用 profile_id={existing.id}")
+            return {"success": True, "created": False, **serialize_user_profile(existing)}
+
+        # 新版本资料：上传一次并记录文件信息
+        user_info_filename = generate_unique_filename(f"{username}_user_info.txt", "user_info_")
+        user_info_path = f"{username}/{user_info_filename}"
+        user_info_bytes = user_info_text.encode('utf-8')
+        user_info_url = upload_file_to_supabase(
+            user_info_bytes,
+            "user-info",
+            user_info_path,
+            "text/plain"
+        )
+
+        db.add(FileStorage(
+            username=username,
+            file_type="user_info",
+            original_filename=f"{username}_user_info.txt",
+            file_path=user_info_path,
+            public_url=user_info_url,
+            file_size=len(user_info_bytes),
+            content_type="text/plain"
+        ))
+
+        # 解析并放入缓存，标准字段随资料一起保存
+        profile_context = get_cached_profile_context(content_hash, user_info_text)
+        profile = UserProfile(
+            username=username,
+            content_hash=content_hash,
+            raw_text=user_info_text,
+            canonical_fields=json.dumps(profile_context["canonical_fields"], ensure_ascii=False),
+            file_path=user_info_path,
+            public_url=user_info_url
+        )
+        db.add(profile)
+        try:
+            db.commit()
+        except IntegrityError:
+            # 并发提交了同一份资料：以先写入的为准，删除本次多上传的文件
+            db.rollback()
+            existing = db.query(UserProfile).filter(
+                UserProfile.username == username,
+                UserProfile.content_hash == content_hash
+            ).first()
+            if not existing:
+                raise
+            delete_file_from_supabase("user-info", user_info_path)
+            print(f"♻️ 资料已由并发请求保存，复用 profile_id={existing.id}")
+            return {"success": True, "created": False, **serialize_user_profile(existing)}
+        db.refresh(profile)
+        print(f"🗂️ 已保存资料 profile_id={profile.id}")
+
+        return {"success": True, "created": True, **serialize_user_profile(profile)}
+    except Exception as e:
+        log_operation(db, username, "保存资料失败", details=str(e), status='failed')
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(
+    profile_id: int,
+    include_text: bool = False,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """查看已保存的资料（仅本人）"""
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    profile = db.query(UserProfile).filter(
+        UserProfile.id == profile_id,
+        UserProfile.username == auth_result["username"]
+    ).first()
+    if not profile:
+        raise HTTPException(status_code=404, detail="资料不存在或已过期，请重新保存")
+
+    result = serialize_user_profile(profile)
+    if include_text:
+        result["user_info_text"] = profile.raw_text
+    return result
+
+def serialize_form_template(template: FormTemplate, include_fields: bool = False) -> dict:
+    result = {
+        "template_id": template.id,
+        "name": template.name,
+        "content_hash": template.content_hash,
+        "slot_count": template.slot_count,
+        "template_url": template.public_url,
+        "created_at": template.created_at.isoformat() if template.created_at else None,
+    }
+    if include_fields:
+        compiled, _ = get_cached_template(template, need_bytes=False)
+        result["fields"] = [
+            {
+                "placeholder": tag,
+                "header": info.get("header") or info.get("inferred_header") or "",
+                "header_inferred": not info.get("header") and bool(info.get("inferred_header")),
+                "type": info.get("type", ""),
+                "location": info.get("location") or f"表格{info.get('table_index', 0)}",
+            }
+            for tag, info in compiled["placeholder_info"].items()
+        ]
+    return result
+
+@app.post("/api/admin/templates")
+async def publish_template(
+    docx: Optional[UploadFile] = File(None),
+    docx_file: Optional[UploadFile] = File(None),
+    name: Optional[str] = Form(None),
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """发布模板到模板库（仅管理员）- 上传并预编译一次，用户填表时通过 template_id 引用"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    upload_docx = resolve_docx_upload(docx, docx_file)
+    docx_bytes = await upload_docx.read()
+    template_name = (name or "").strip() or os.path.splitext(upload_docx.filename or "")[0] or "未命名模板"
+
+    try:
+        content_hash = hashlib.sha256(docx_bytes).hexdigest()
+        existing = db.query(FormTemplate).filter(
+            FormTemplate.content_hash == content_hash,
+            FormTemplate.is_active.is_(True)
+        ).first()
+        if existing:
+            print(f"♻️ 模板未变化，复用 template_id={existing.id}")
+            return {"success": True, "created": False, **serialize_form_template(existing)}
+
+        # 同一模板的新版本：未变化的占位符沿用已发布版本的推断结果；编译失败（文件损坏等）时不上传
+        compiled = compile_template_stream(docx_bytes)
+        base_template, _ = find_similar_template(db, compiled)
+        base_compiled = get_cached_template(base_template, need_bytes=False)[0] if base_template else None
+        infer_template_headers(compiled, base_compiled=base_compiled)
+
+        # 模板不写入 file_storage，不受文件保留期清理影响
+        template_path = f"templates/{generate_unique_filename(upload_docx.filename or 'template.docx', 'template_')}"
+        template_url = upload_file_to_supabase(
+            docx_bytes,
+            BUCKET_MAP["docx"],
+            template_path,
+            upload_docx.content_type
+        )
+
+        template = FormTemplate(
+            name=template_name,
+            content_hash=content_hash,
+            file_path=template_path,
+            public_url=template_url,
+            file_size=len(docx_bytes),
+            compiled_template=json.dumps(compiled, ensure_ascii=False),
+            slot_count=len(compiled["placeholder_info"]),
+            created_by=admin_user.username
+        )
+        db.add(template)
+        db.commit()
+        db.refresh(template)
+        log_operation(db, admin_user.username, "发布模板", details=f"模板: {template_name}, template_id: {template.id}")
+        print(f"📚 已发布模板 template_id={template.id}（{template.slot_count} 个占位符）")
+
+        return {"success": True, "created": True, **serialize_form_template(template, include_fields=True)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        log_operation(db, admin_user.username, "发布模板失败", details=str(e), status='failed')
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.delete("/api/admin/templates/{template_id}")
+async def unpublish_template(
+    template_id: int,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """下架模板（仅管理员）- 保留文件，历史操作日志中的链接仍可访问"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    template = resolve_form_template(db, template_id)
+    template.is_active = False
+    db.commit()
+    with TEMPLATE_CACHE_LOCK:
+        TEMPLATE_CACHE.pop(template_id, None)
+    with TEMPLATE_SIGNATURES_LOCK:
+        TEMPLATE_SIGNATURES.pop(template_id, None)
+
+    return {"success": True, "message": "模板已下架"}
+
+@app.get("/api/admin/field-aliases")
+async def get_learned_field_aliases(
+    promoted: Optional[bool] = None,
+    limit: int = 200,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """查看从填表结果中学习到的字段别名（仅管理员）"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    query = db.query(LearnedFieldAlias)
+    if promoted is not None:
+        query = query.filter(LearnedFieldAlias.promoted.is_(promoted))
+
+    records = query.order_by(LearnedFieldAlias.hits.desc()).limit(limit).all()
+    return [
+        {
+            "id": record.id,
+            "header": record.header_text,
+            "canonical_field": record.canonical_field,
+            "hits": record.hits,
+            "promoted": record.promoted,
+            "updated_at": record.updated_at.isoformat() if record.updated_at else None,
+        }
+        for record in records
+    ]
+
+@app.get("/api/admin/model-stats")
+async def get_model_stats(auth_result: dict = Depends(get_authenticated_user)):
+    """查看各任务的模型配置与调用统计（延迟、token 用量、估算费用、对冲、磁盘缓存）（仅管理员）"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    profiles = []
+    for task in MODEL_TASK_PROFILES:
+        profile = model_profile(task)
+        profiles.append({
+            "task": task,
+            "model": profile["model"],
+            "thinking": profile["thinking"],
+            "params": profile["params"],
+        })
+
+    completion_cache = get_completion_cache()
+    return {
+        "profiles": profiles,
+        "calls": model_call_stats(),
+        "hedging": lane_stats(),
+        "cache": completion_cache.stats() if completion_cache else None,
+    }
+
+@app.delete("/api/admin/model-cache")
+async def clear_model_cache(auth_result: dict = Depends(get_authenticated_user)):
+    """清空模型回复的磁盘缓存（仅管理员）- 更换模型或提示词效果异常时使用"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    completion_cache = get_completion_cache()
+    if completion_cache is None:
+        raise HTTPException(status_code=404, detail="模型缓存未启用")
+
+    completion_cache.clear()
+    return {"success": True, "message": "模型缓存已清空"}
+
+@app.delete("/api/admin/field-aliases/{alias_id}")
+async def delete_learned_field_alias(
+    alias_id: int,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """删除学习到的字段别名（仅管理员）- 已晋升的同时从本进程的别名索引中移除，其他 worker 在下次同步时移除"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    record = db.query(LearnedFieldAlias).filter(LearnedFieldAlias.id == alias_id).first()
+    if not record:
+        raise HTTPException(status_code=404, detail="别名不存在")
+
+    if record.promoted and forget_learned_alias(record.header_text):
+        with PROFILE_CONTEXT_CACHE_LOCK:
+            PROFILE_CONTEXT_CACHE.clear()
+    db.query(LearnedAliasObservation).filter(
+        LearnedAliasObservation.header_key == record.header_key,
+        LearnedAliasObservation.canonical_field == record.canonical_field
+    ).delete(synchronize_session=False)
+    db.delete(record)
+    db.commit()
+
+    return {"success": True, "message": "别名已删除"}
+
+@app.get("/api/templates")
+async def list_templates(
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """模板库列表（需要认证）"""
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    templates = db.query(FormTemplate).filter(
+        FormTemplate.is_active.is_(True)
+    ).order_by(FormTemplate.created_at.desc()).all()
+    return [serialize_form_template(template) for template in templates]
+
+@app.get("/api/templates/{template_id}")
+async def get_template(
+    template_id: int,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """查看模板详情及字段列表（需要认证）"""
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    return serialize_form_template(resolve_form_template(db, template_id), include_fields=True)
+
 @app.post("/api/process")
 async def process(
     docx: Optional[UploadFile] = File(None),
     docx_file: Optional[UploadFile] = File(None),
-    user_info_text: str = Form(...),
+    user_info_text: Optional[str] = Form(None),
+    profile_id: Optional[int] = Form(None),  # 引用已保存的资料（见 /api/profiles），替代 user_info_text
+    template_id: Optional[int] = Form(None),  # 引用模板库中的模板（见 /api/templates），替代上传 docx
     auth_token: Optional[str] = Form(None),  # 从表单获取token（保留兼容性）
     preview: Optional[str] = Form(None),  # 是否预览模式
     check_only: Optional[str] = Form(None),  # 仅检查缺失/低置信度字段，不返回预览文档
     fill_data: Optional[str] = Form(None),  # 预览时返回的填充数据，下载时可直接使用
+    refill_missing: Optional[str] = Form(None),  # 增量模式：仅对 fill_data 中缺失/低置信度的字段重新推理
     db: Session = Depends(get_db),
     request: Request = None,
     auth_result: dict = Depends(get_authenticated_user)
@@ -369,44 +1143,69 @@ async def process(
         user_type = auth_result["type"]
         username = auth_result["username"]
 
+        deadline = Deadline(REQUEST_DEADLINE_SECONDS)
         maybe_cleanup_expired_files(db)
-        upload_docx = resolve_docx_upload(docx, docx_file)
-        docx_bytes = await upload_docx.read()
+        maybe_reload_learned_aliases(db)
+        user_info_text, profile_context, profile = resolve_user_profile(db, username, profile_id, user_info_text)
+        if profile_context is None:
+            profile_context = prepare_profile_context(user_info_text)
+        template = resolve_form_template(db, template_id)
+        if template:
+            # 模板库中的模板：文件和编译结果都已在发布时准备好，无需上传和编译
+            compiled, docx_bytes = await run_with_deadline(request, deadline, get_cached_template, template)
+            docx_filename = f"{template.name}.docx"
+        else:
+            upload_docx = resolve_docx_upload(docx, docx_file)
+            docx_bytes = await upload_docx.read()
+            docx_filename = upload_docx.filename
+            # 与模板库中的模板结构相近时沿用其推断结果，只有新增/变化的占位符需要模型处理
+            compiled = await run_with_deadline(request, deadline, compile_template_stream, docx_bytes)
+            reuse_library_analysis(db, compiled)
 
         is_preview_mode = str(preview).lower() == 'true'
         is_check_only = str(check_only).lower() == 'true'
+        is_refill = str(refill_missing).lower() == 'true'
 
         # 上传文件到 Supabase Storage（仅在下载模式下）
         if not is_preview_mode and not is_check_only:
-            # 1. 上传 DOCX 文件
-            docx_filename = generate_unique_filename(upload_docx.filename, "docx_")
-            docx_path = f"{username}/{docx_filename}"
-            docx_url = upload_file_to_supabase(
-                docx_bytes,
-                "docx-files",
-                docx_path,
-                upload_docx.content_type
-            )
+            # 1. 上传 DOCX 文件；模板库中的模板发布时上传过，直接引用
+            if template:
+                docx_url = template.public_url
+            else:
+                docx_path = f"{username}/{generate_unique_filename(upload_docx.filename, 'docx_')}"
+                docx_url = await run_with_deadline(
+                    request, deadline, upload_file_to_supabase,
+                    docx_bytes,
+                    "docx-files",
+                    docx_path,
+                    upload_docx.content_type
+                )
 
-            # 2. 上传用户信息文件（保存为 txt）
-            user_info_filename = generate_unique_filename(f"{username}_user_info.txt", "user_info_")
-            user_info_path = f"{username}/{user_info_filename}"
-            user_info_bytes = user_info_text.encode('utf-8')
-            user_info_url = upload_file_to_supabase(
-                user_info_bytes,
-                "user-info",
-                user_info_path,
-                "text/plain"
-            )
+            # 2. 上传用户信息文件（保存为 txt）；已保存的资料在保存时上传过，直接引用
+            if profile:
+                user_info_url = profile.public_url
+            else:
+                user_info_filename = generate_unique_filename(f"{username}_user_info.txt", "user_info_")
+                user_info_path = f"{username}/{user_info_filename}"
+                user_info_bytes = user_info_text.encode('utf-8')
+                user_info_url = await run_with_deadline(
+                    request, deadline, upload_file_to_supabase,
+                    user_info_bytes,
+                    "user-info",
+                    user_info_path,
+                    "text/plain"
+                )
 
             # 准备提交数据
             submitted_data = {
-                "docx_filename": upload_docx.filename,
+                "docx_filename": docx_filename,
                 "docx_size": len(docx_bytes),
                 "docx_url": docx_url,
                 "user_info_preview": user_info_text[:500] + "..." if len(user_info_text) > 500 else user_info_text,
                 "user_info_length": len(user_info_text),
-                "user_info_url": user_info_url
+                "user_info_url": user_info_url,
+                "profile_id": profile.id if profile else None,
+                "template_id": template.id if template else None
             }
 
             # 记录操作日志（获取日志ID用于关联文件记录）
@@ -414,35 +1213,37 @@ async def process(
                 db,
                 username,
                 "提交文档处理",
-                details=f"文件名: {upload_docx.filename}, 用户类型: {user_type}",
+                details=f"文件名: {docx_filename}, 用户类型: {user_type}",
                 submitted_data=submitted_data,
                 ip_address=request.client.host if request else None
             )
 
             # 保存文件信息到数据库
             # DOCX 文件记录
-            db.add(FileStorage(
-                username=username,
-                file_type="docx",
-                original_filename=upload_docx.filename,
-                file_path=docx_path,
-                public_url=docx_url,
-                file_size=len(docx_bytes),
-                content_type=upload_docx.content_type,
-                operation_log_id=log_id
-            ))
+            if not template:
+                db.add(FileStorage(
+                    username=username,
+                    file_type="docx",
+                    original_filename=upload_docx.filename,
+                    file_path=docx_path,
+                    public_url=docx_url,
+                    file_size=len(docx_bytes),
+                    content_type=upload_docx.content_type,
+                    operation_log_id=log_id
+                ))
 
             # 用户信息文件记录
-            db.add(FileStorage(
-                username=username,
-                file_type="user_info",
-                original_filename=f"{username}_user_info.txt",
-                file_path=user_info_path,
-                public_url=user_info_url,
-                file_size=len(user_info_bytes),
-                content_type="text/plain",
-                operation_log_id=log_id
-            ))
+            if not profile:
+                db.add(FileStorage(
+                    username=username,
+                    file_type="user_info",
+                    original_filename=f"{username}_user_info.txt",
+                    file_path=user_info_path,
+                    public_url=user_info_url,
+                    file_size=len(user_info_bytes),
+                    content_type="text/plain",
+                    operation_log_id=log_id
+                ))
 
             db.commit()
 
@@ -450,14 +1251,18 @@ async def process(
         # 优化：减少重复推理 - 预览时返回 fill_data，下载时可以使用
         if is_check_only:
             # 轻量检查模式：只返回字段缺失/低置信度，不返回预览文档
-            _, returned_fill_data, missing_fields, metadata = fill_form(
+            _, returned_fill_data, missing_fields, metadata = await run_with_deadline(
+                request, deadline, fill_form,
                 docx_bytes,
                 user_info_text,
                 None,
                 return_fill_data=True,
                 return_metadata=True,
+                compiled=compiled,
+                profile_context=profile_context,
             )
             low_confidence_fields = metadata.get("low_confidence_fields", []) if isinstance(metadata, dict) else []
+            learn_field_aliases(db, username, compiled, returned_fill_data, profile_context)
 
             if missing_fields or low_confidence_fields:
                 message = (
@@ -484,19 +1289,29 @@ async def process(
                     parsed_fill_data = json.loads(fill_data)
                     if isinstance(parsed_fill_data, dict):
                         prefilled_data = parsed_fill_data
-                        print("📝 预览模式复用 fill_data（跳过 AI 推理）")
+                        if is_refill:
+                            print("🔁 预览模式增量填充：仅重新推理缺失字段")
+                        else:
+                            print("📝 预览模式复用 fill_data（跳过 AI 推理）")
                 except Exception as parse_error:
                     print(f"⚠️ 预览模式 fill_data 解析失败，回退到 AI 推理: {parse_error}")
 
-            output_bytes, returned_fill_data, missing_fields, metadata = fill_form(
+            output_bytes, returned_fill_data, missing_fields, metadata = await run_with_deadline(
+                request, deadline, fill_form,
                 docx_bytes,
                 user_info_text,
                 None,
                 return_fill_data=True,
                 prefilled_data=prefilled_data,
                 return_metadata=True,
+                refill_missing=is_refill,
+                compiled=compiled,
+                profile_context=profile_context,
             )
             low_confidence_fields = metadata.get("low_confidence_fields", []) if isinstance(metadata, dict) else []
+            # 增量模式的结果含用户回传（可能修改过）的值，不作为学习依据
+            if prefilled_data is None:
+                learn_field_aliases(db, username, compiled, returned_fill_data, profile_context)
 
             import base64
             output_base64 = base64.b64encode(output_bytes).decode('utf-8')
@@ -528,16 +1343,40 @@ async def process(
                 prefilled_data = json.loads(fill_data)
                 if isinstance(prefilled_data, dict):
                     print("📝 使用预览阶段 fill_data 直接填充文档（跳过 AI 推理）")
-                    output_bytes = fill_form(docx_bytes, user_info_text, None, prefilled_data=prefilled_data)
+                    output_bytes = await run_with_deadline(
+                        request, deadline, fill_form,
+                        docx_bytes,
+                        user_info_text,
+                        None,
+                        prefilled_data=prefilled_data,
+                        refill_missing=is_refill,
+                        compiled=compiled,
+                        profile_context=profile_context,
+                    )
                 else:
                     print("⚠️ fill_data 不是字典，回退到 AI 推理")
-                    output_bytes = fill_form(docx_bytes, user_info_text, None)
+                    output_bytes = await run_with_deadline(
+                        request, deadline, fill_form,
+                        docx_bytes, user_info_text, None, compiled=compiled, profile_context=profile_context
+                    )
             except Exception as parse_error:
                 print(f"⚠️ fill_data 解析失败，回退到 AI 推理: {parse_error}")
-                output_bytes = fill_form(docx_bytes, user_info_text, None)
+                output_bytes = await run_with_deadline(
+                    request, deadline, fill_form,
+                    docx_bytes, user_info_text, None, compiled=compiled, profile_context=profile_context
+                )
         else:
             # 没有 fill_data，调用 AI 推理
-            output_bytes = fill_form(docx_bytes, user_info_text, None)
+            output_bytes, returned_fill_data, _ = await run_with_deadline(
+                request, deadline, fill_form,
+                docx_bytes,
+                user_info_text,
+                None,
+                return_fill_data=True,
+                compiled=compiled,
+                profile_context=profile_context,
+            )
+            learn_field_aliases(db, username, compiled, returned_fill_data, profile_context)
 
         # 如果是Token用户，只有在首次下载文件时扣减余额（预览/检查模式和重复下载不扣减）
         if user_type == "token" and not is_preview_mode and not fill_data:
@@ -558,6 +1397,9 @@ async def process(
         )
     except HTTPException:
         raise
+    except DeadlineExceeded as e:
+        print(f"⏱️ 文档处理中止: {e}")
+        return deadline_exceeded_response(deadline)
     except Exception as e:
         # 记录错误日志
         try:
@@ -567,22 +1409,277 @@ async def process(
             pass
         return JSONResponse(status_code=500, content={"error": str(e)})
 
+@app.post("/api/preview-grid")
+async def preview_grid(
+    docx: Optional[UploadFile] = File(None),
+    docx_file: Optional[UploadFile] = File(None),
+    user_info_text: Optional[str] = Form(None),
+    profile_id: Optional[int] = Form(None),  # 引用已保存的资料，替代 user_info_text
+    template_id: Optional[int] = Form(None),  # 引用模板库中的模板，替代上传 docx
+    fill_data: Optional[str] = Form(None),  # 预览时返回的填充数据，可复用以跳过 AI 推理
+    refill_missing: Optional[str] = Form(None),  # 增量模式：仅对 fill_data 中缺失/低置信度的字段重新推理
+    db: Session = Depends(get_db),
+    request: Request = None,
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """
+    轻量预览（需要认证）：返回 JSON 表格网格（单元格文本、合并信息、填充值、状态），
+    不生成 docx，前端无需解包渲染 Word 文档
+    """
+    try:
+        if not auth_result:
+            raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+        deadline = Deadline(REQUEST_DEADLINE_SECONDS)
+        maybe_reload_learned_aliases(db)
+        user_info_text, profile_context, _ = resolve_user_profile(db, auth_result["username"], profile_id, user_info_text)
+        if profile_context is None:
+            profile_context = prepare_profile_context(user_info_text)
+        template = resolve_form_template(db, template_id)
+        if template:
+            # 网格预览只需要编译结果，不下载模板文件
+            compiled, docx_bytes = get_cached_template(template, need_bytes=False)
+        else:
+            upload_docx = resolve_docx_upload(docx, docx_file)
+            docx_bytes = await upload_docx.read()
+            compiled = await run_with_deadline(request, deadline, compile_template_stream, docx_bytes)
+            reuse_library_analysis(db, compiled)
+
+        prefilled_data = None
+        if fill_data and fill_data.strip():
+            try:
+                parsed_fill_data = json.loads(fill_data)
+                if isinstance(parsed_fill_data, dict):
+                    prefilled_data = parsed_fill_data
+                    print("📝 网格预览复用 fill_data（跳过 AI 推理）")
+            except Exception as parse_error:
+                print(f"⚠️ 网格预览 fill_data 解析失败，回退到 AI 推理: {parse_error}")
+
+        result = await run_with_deadline(
+            request, deadline, preview_form,
+            docx_bytes,
+            user_info_text,
+            prefilled_data=prefilled_data,
+            refill_missing=str(refill_missing).lower() == 'true',
+            profile_context=profile_context,
+            compiled=compiled,
+        )
+        missing_fields = result["missing_fields"]
+        # 增量模式的结果含用户回传（可能修改过）的值，不作为学习依据
+        if prefilled_data is None:
+            learn_field_aliases(db, auth_result["username"], compiled, result["fill_data"], profile_context)
+
+        if missing_fields:
+            message = f"预览生成完成，有 {len(missing_fields)} 个字段未能自动填充，请补全信息后重新生成"
+        else:
+            message = "预览数据生成成功，请在前端查看预览效果"
+
+        return {
+            "success": True,
+            "mode": "grid",
+            "grid": result["grid"],
+            "fill_data": json.dumps(result["fill_data"]),
+            "missing_fields": missing_fields,
+            "low_confidence_fields": result["low_confidence_fields"],
+            "message": message
+        }
+    except HTTPException:
+        raise
+    except DeadlineExceeded as e:
+        print(f"⏱️ 网格预览中止: {e}")
+        return deadline_exceeded_response(deadline)
+    except Exception as e:
+        print(f"❌ 网格预览 API 错误: {e}")
+        return JSONResponse(status_code=500, content={"error": str(e)})
+
+@app.post("/api/batch-process")
+async def batch_process(
+    docx: Optional[UploadFile] = File(None),
+    docx_file: Optional[UploadFile] = File(None),
+    profiles: str = Form(...),  # JSON 数组：["个人信息文本", ...] 或 [{"name": "...", "user_info_text": "..." 或 "profile_id": 1}]
+    db: Session = Depends(get_db),
+    request: Request = None,
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """
+    批量填表（需要认证）：同一模板 + 多份个人信息（文本，或以 profile_id 引用已保存的资料）
+    模板只编译一次，按有限并发推理，每完成一份就写入压缩包并流式返回；
+    单份失败记录在 manifest.json 中，不会中断整个批次；
+    整批超过 BATCH_DEADLINE_SECONDS 或客户端断开时停止，未完成的项同样记录在 manifest.json 中
+    """
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    user = auth_result["user"]
+    user_type = auth_result["type"]
+    username = auth_result["username"]
+
+    try:
+        parsed_profiles = json.loads(profiles)
+    except Exception:
+        raise HTTPException(status_code=422, detail="profiles 必须是 JSON 数组")
+    if not isinstance(parsed_profiles, list) or not parsed_profiles:
+        raise HTTPException(status_code=422, detail="profiles 不能为空")
+    if len(parsed_profiles) > BATCH_MAX_PROFILES:
+        raise HTTPException(status_code=422, detail=f"单次最多处理 {BATCH_MAX_PROFILES} 份个人信息")
+
+    items = []
+    for idx, entry in enumerate(parsed_profiles):
+        item = {"name": f"profile_{idx + 1}", "user_info_text": "", "profile_context": None}
+        if isinstance(entry, dict):
+            item["name"] = str(entry.get("name") or item["name"])
+            if entry.get("profile_id") is not None:
+                # 引用已保存的资料（见 /api/profiles），使用缓存的解析结果
+                try:
+                    text, profile_context, _ = resolve_user_profile(db, username, int(entry["profile_id"]), None)
+                    item.update({"user_info_text": text, "profile_context": profile_context})
+                except (HTTPException, TypeError, ValueError) as e:
+                    item["error"] = getattr(e, "detail", None) or "profile_id 无效"
+            else:
+                item["user_info_text"] = str(entry.get("user_info_text") or "")
+        elif isinstance(entry, str):
+            item["user_info_text"] = entry
+        items.append(item)
+
+    if user_type == "token" and user.balance < len(items):
+        raise HTTPException(status_code=403, detail=f"余额不足：本次需要 {len(items)} 次，剩余 {user.balance} 次")
+
+    upload_docx = resolve_docx_upload(docx, docx_file)
+    docx_bytes = await upload_docx.read()
+
+    manifest = [
+        {"index": idx + 1, "name": item["name"], "success": False}
+        for idx, item in enumerate(items)
+    ]
+    runnable = [idx for idx, item in enumerate(items) if "error" not in item and item["user_info_text"].strip()]
+    for idx, item in enumerate(items):
+        if "error" in item:
+            manifest[idx]["error"] = item["error"]
+        elif not item["user_info_text"].strip():
+            manifest[idx]["error"] = "个人信息为空"
+
+    deadline = Deadline(BATCH_DEADLINE_SECONDS)
+    try:
+        results = iter_batch_fill(
+            docx_bytes,
+            [items[idx]["user_info_text"] for idx in runnable],
+            max_workers=BATCH_MAX_CONCURRENCY,
+            deadline=deadline,
+            profile_contexts=[items[idx]["profile_context"] for idx in runnable],
+        )
+    except Exception as e:
+        return JSONResponse(status_code=400, content={"error": f"模板解析失败: {e}"})
+
+    log_operation(
+        db,
+        username,
+        "批量填表",
+        details=f"文件名: {upload_docx.filename}, 份数: {len(items)}, 用户类型: {user_type}",
+        ip_address=request.client.host if request else None
+    )
+
+    charge_user_id = user.id if user_type == "token" else None
+    headers = {
+        "Content-Disposition": f"attachment; filename=filled_batch_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    }
+    return StreamingResponse(
+        stream_with_deadline(
+            request, deadline, stream_filled_documents_zip(results, manifest, runnable, charge_user_id, username)
+        ),
+        media_type="application/zip",
+        headers=headers
+    )
+
+@app.post("/api/multi-process")
+async def multi_process(
+    docx: List[UploadFile] = File(...),  # 多个模板，重复使用字段 docx 上传
+    user_info_text: Optional[str] = Form(None),
+    profile_id: Optional[int] = Form(None),  # 引用已保存的资料，替代 user_info_text
+    db: Session = Depends(get_db),
+    request: Request = None,
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """
+    多模板填表（需要认证）：同一份个人信息（user_info_text 或 profile_id）+ 多个模板
+    个人信息只归一化一次，各模板并行编译和推理，所有填好的文档打包返回；
+    截止时间和客户端断开的处理同 /api/batch-process
+    """
+    if not auth_result:
+        raise HTTPException(status_code=401, detail="未认证，请登录或使用有效Token")
+
+    user = auth_result["user"]
+    user_type = auth_result["type"]
+    username = auth_result["username"]
+
+    if not docx:
+        raise HTTPException(status_code=422, detail="缺少 docx 文件，请使用字段 docx")
+    if len(docx) > MULTI_TEMPLATE_MAX:
+        raise HTTPException(status_code=422, detail=f"单次最多处理 {MULTI_TEMPLATE_MAX} 个模板")
+    if user_type == "token" and user.balance < len(docx):
+        raise HTTPException(status_code=403, detail=f"余额不足：本次需要 {len(docx)} 次，剩余 {user.balance} 次")
+
+    user_info_text, profile_context, _ = resolve_user_profile(db, username, profile_id, user_info_text)
+
+    docx_bytes_list = [await upload.read() for upload in docx]
+    manifest = [
+        {
+            "index": idx + 1,
+            "name": os.path.splitext(upload.filename or "")[0] or f"template_{idx + 1}",
+            "success": False,
+        }
+        for idx, upload in enumerate(docx)
+    ]
+
+    deadline = Deadline(BATCH_DEADLINE_SECONDS)
+    results = iter_multi_template_fill(
+        docx_bytes_list,
+        user_info_text,
+        max_workers=BATCH_MAX_CONCURRENCY,
+        deadline=deadline,
+        profile_context=profile_context,
+    )
+
+    log_operation(
+        db,
+        username,
+        "多模板填表",
+        details=f"模板数: {len(docx)}, 文件名: {', '.join(upload.filename or '' for upload in docx)}, 用户类型: {user_type}",
+        ip_address=request.client.host if request else None
+    )
+
+    charge_user_id = user.id if user_type == "token" else None
+    headers = {
+        "Content-Disposition": f"attachment; filename=filled_templates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+    }
+    return StreamingResponse(
+        stream_with_deadline(
+            request,
+            deadline,
+            stream_filled_documents_zip(results, manifest, list(range(len(manifest))), charge_user_id, username),
+        ),
+        media_type="application/zip",
+        headers=headers
+    )
+
 @app.post("/api/analyze-missing")
 async def analyze_missing(
     docx: Optional[UploadFile] = File(None),
     docx_file: Optional[UploadFile] = File(None),
     user_info_text: str = Form(...),
+    request: Request = None,
     auth_result: dict = Depends(get_optional_current_user)
 ):
     """
     分析模板和个人信息，返回缺失/低置信度字段列表
     使用与预览一致的填充逻辑，避免口径不一致
     """
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)
     try:
         upload_docx = resolve_docx_upload(docx, docx_file)
         docx_bytes = await upload_docx.read()
 
-        _, _, missing_fields, metadata = fill_form(
+        _, _, missing_fields, metadata = await run_with_deadline(
+            request, deadline, fill_form,
             docx_bytes,
             user_info_text,
             None,
@@ -600,6 +1697,9 @@ async def analyze_missing(
                 f"低置信度字段 {len(low_confidence_fields)} 个"
             )
         }
+    except DeadlineExceeded as e:
+        print(f"⏱️ 分析缺失字段中止: {e}")
+        return deadline_exceeded_response(deadline)
     except Exception as e:
         print(f"❌ 分析缺失字段 API 错误: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -609,18 +1709,20 @@ async def audit_template_api(
     docx: Optional[UploadFile] = File(None),
     docx_file: Optional[UploadFile] = File(None),
     user_info_text: str = Form(...),
+    request: Request = None,
     auth_result: dict = Depends(get_optional_current_user)
 ):
     """
     审核模板变量与个人信息的匹配情况
     返回每个占位符的匹配状态和值
     """
+    deadline = Deadline(REQUEST_DEADLINE_SECONDS)
     try:
         upload_docx = resolve_docx_upload(docx, docx_file)
         docx_bytes = await upload_docx.read()
 
         # 调用审核函数
-        result = audit_template(docx_bytes, user_info_text)
+        result = await run_with_deadline(request, deadline, audit_template, docx_bytes, user_info_text)
 
         if result.get("success"):
             return {
@@ -635,6 +1737,9 @@ async def audit_template_api(
                 status_code=500,
                 content={"success": False, "error": result.get("error", "Unknown error")}
             )
+    except DeadlineExceeded as e:
+        print(f"⏱️ 审核模板中止: {e}")
+        return deadline_exceeded_response(deadline)
     except Exception as e:
         print(f"❌ 审核模板 API 错误: {e}")
         return JSONResponse(status_code=500, content={"error": str(e)})
@@ -1026,6 +2131,95 @@ async def get_files(
         for f in files
     ]
 
+@app.get("/api/admin/files/download")
+async def download_files(
+    ids: Optional[str] = None,
+    limit: int = 100,
+    file_type: str = "docx",
+    username: Optional[str] = None,
+    db: Session = Depends(get_db),
+    auth_result: dict = Depends(get_authenticated_user)
+):
+    """批量下载存储的文件，逐个从 Supabase 流式拉取并写入压缩包（仅管理员）"""
+    if not auth_result or auth_result["type"] != "normal":
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    admin_user = auth_result["user"]
+    if not admin_user.is_admin:
+        raise HTTPException(status_code=403, detail="需要管理员权限")
+
+    bucket_name = BUCKET_MAP.get(file_type)
+    if not bucket_name:
+        raise HTTPException(status_code=400, detail=f"不支持的文件类型: {file_type}")
+
+    query = db.query(FileStorage).filter(FileStorage.file_type == file_type)
+    if ids:
+        try:
+            id_list = [int(item) for item in ids.split(",") if item.strip()]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids 需为逗号分隔的整数")
+        query = query.filter(FileStorage.id.in_(id_list))
+    if username:
+        query = query.filter(FileStorage.username == username)
+
+    files = query.order_by(FileStorage.created_at.desc()).limit(limit).all()
+    if not files:
+        raise HTTPException(status_code=404, detail="没有符合条件的文件")
+
+    # 流式响应期间请求级会话可能已关闭，先取出需要的字段
+    records = [
+        {
+            "id": f.id,
+            "username": f.username,
+            "original_filename": f.original_filename,
+            "file_path": f.file_path,
+        }
+        for f in files
+    ]
+
+    def iter_member_chunks(chunks, entry):
+        """逐块转发文件内容；读取中途失败时结束该成员（内容不完整）并在清单中记录错误，压缩包仍正常收尾"""
+        try:
+            for chunk in chunks:
+                yield chunk
+        except Exception as e:
+            print(f"❌ 文件 {entry['id']} 读取中断: {e}")
+            entry["error"] = f"读取中断，压缩包中的文件不完整: {e}"
+            return
+        entry["success"] = True
+
+    def iter_members():
+        manifest = []
+        for record in records:
+            entry = {"id": record["id"], "username": record["username"], "success": False}
+            try:
+                chunks = open_file_stream_from_supabase(bucket_name, record["file_path"], chunk_size=ZIP_STREAM_CHUNK_SIZE)
+            except Exception as e:
+                print(f"❌ 文件 {record['id']} 下载失败: {e}")
+                entry["error"] = str(e)
+                manifest.append(entry)
+                continue
+
+            base_name = os.path.basename(record["original_filename"] or record["file_path"])
+            filename = (
+                f"{safe_zip_member_name(record['username'], 'user')}/"
+                f"{record['id']}_{safe_zip_member_name(base_name, 'file')}"
+            )
+            entry["filename"] = filename
+            manifest.append(entry)
+            # success 在成员内容全部写入后才置为 True（清单在所有成员之后生成）
+            yield filename, iter_member_chunks(chunks, entry)
+        yield "manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8")
+
+    print(f"📦 管理员 {admin_user.username} 批量下载 {len(records)} 个 {file_type} 文件")
+
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return StreamingResponse(
+        stream_zip(iter_members()),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=files_{file_type}_{timestamp}.zip"}
+    )
+
 @app.get("/api/admin/file-retention/status")
 async def file_retention_status(
     run_cleanup: bool = False,
@@ -12,10 +12,11 @@
 import os
 import re
 import json
-import requests
 from typing import Dict, Tuple
 from docx import Document
 
+from model_provider import DEFAULT_MODEL_ENDPOINT, get_model_provider
+
 
 class PlaceholderReplacer:
     """占位符智能替换器"""
@@ -24,6 +25,7 @@ class PlaceholderReplacer:
         self.docx_path = docx_path
         self.personal_info_path = personal_info_path
         self.api_key = api_key
+        self.provider = get_model_provider(api_key)
         self.document = Document(docx_path)
         self.personal_info = self._read_personal_info()
 
@@ -94,35 +96,24 @@ class PlaceholderReplacer:
 - 不要在键或值中添加额外的引号或特殊字符"""
 
         # 调用API
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-
         messages = [{
             "role": "user",
             "content": prompt
         }]
 
-        data = {
-            "model": "deepseek-ai/DeepSeek-V3.2",
-            "messages": messages,
-            "extra_body": {"enable_thinking": True},
-            "top_p": 0.7,
-            "temperature": 1
-        }
+        data = self.provider.payload(
+            DEFAULT_MODEL_ENDPOINT,
+            messages,
+            {"top_p": 0.7, "temperature": 1},
+            thinking=True,
+        )
 
         try:
-            print(f"🔄 正在发送请求到: https://api-inference.modelscope.cn/v1/chat/completions")
-            print(f"📝 使用模型: deepseek-ai/DeepSeek-V3.2")
+            print(f"🔄 正在发送请求到: {self.provider.url}")
+            print(f"📝 使用模型: {DEFAULT_MODEL_ENDPOINT}")
             print(f"📊 提示词长度: {len(prompt)} 字符")
 
-            response = requests.post(
-                "https://api-inference.modelscope.cn/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=120
-            )
+            response = self.provider.post(data, timeout=120)
 
             print(f"📡 响应状态码: {response.status_code}")
 
@@ -133,12 +124,11 @@ class PlaceholderReplacer:
 
             api_response = response.json()
 
-            if 'choices' not in api_response or not api_response['choices']:
+            ai_response = self.provider.message_content(api_response)
+            if ai_response is None:
                 print(f"❌ 响应中缺少choices字段")
                 return {}
 
-            ai_response = api_response['choices'][0]['message']['content']
-
             print(f"\n🤖 AI响应内容：\n{ai_response}\n")
 
             # 解析JSON
@@ -284,7 +274,8 @@ def main():
     if not api_key:
         api_key = "YOUR_API_KEY_HERE"  # 请替换为您的实际API Key
 
-    if api_key == "YOUR_API_KEY_HERE":
+    # 本地桩服务（MODEL_PROVIDER=stub）不校验密钥
+    if api_key == "YOUR_API_KEY_HERE" and os.environ.get("MODEL_PROVIDER", "").strip().lower() != "stub":
         print("❌ 请设置您的API Key！")
         print("方法1：设置环境变量 MODELSCOPE_API_KEY")
         print(f"方法2：在当前目录创建 api_key.txt 文件并写入API Key")
@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+docx 各文本部件（正文、页眉、页脚、脚注、尾注）的流式扫描
+python-docx 的 doc.tables / doc.paragraphs 只覆盖正文顶层的表格和段落，
+嵌套表格、文本框、页眉页脚中的占位符会被漏掉。这里对每个部件做一次 iterparse，
+找出这些位置上的单元格和段落；处理完的顶层块随即释放，内存只与单个部件的大小有关。
+
+节点定位：部件名 + 节点类型（tc/p）+ 该部件内同类节点的先序序号，
+与 lxml element.iter() 的遍历顺序一致，写回时据此在 python-docx 文档中找回节点。
+
+文本与表格结构的读取（paragraph_text / cell_text / read_table_rows）与 python-docx 的
+Paragraph.text、_Cell.text、_Row.cells 语义一致，流式编译与基于 Document 的编译结果相同。
+"""
+
+import io
+import zipfile
+
+from docx.oxml import parse_xml
+from docx.oxml.simpletypes import ST_HpsMeasure
+from docx.table import _Cell
+from docx.text.paragraph import Paragraph
+from lxml import etree
+
+from layout_analyzer import CELL_FILLABLE, classify_cell
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_CT = "{http://schemas.openxmlformats.org/package/2006/content-types}"
+_MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+
+TAG_TBL = _W + "tbl"
+TAG_TR = _W + "tr"
+TAG_TC = _W + "tc"
+TAG_P = _W + "p"
+TAG_BODY = _W + "body"
+TAG_R = _W + "r"
+_TAG_HYPERLINK = _W + "hyperlink"
+_TAG_T = _W + "t"
+_TAG_TAB = _W + "tab"
+_TAG_PTAB = _W + "ptab"
+_TAG_BR = _W + "br"
+_TAG_CR = _W + "cr"
+_TAG_NO_BREAK_HYPHEN = _W + "noBreakHyphen"
+_TAG_TC_PR = _W + "tcPr"
+_TAG_TR_PR = _W + "trPr"
+_TAG_TXBX = _W + "txbxContent"
+_TAG_GRID_SPAN = _W + "gridSpan"
+_TAG_V_MERGE = _W + "vMerge"
+_TAG_DRAWING = _W + "drawing"
+_TAG_PICT = _W + "pict"
+
+# 顶层块的容器，块结束后即可释放
+_BLOCK_CONTAINERS = {TAG_BODY, _W + "hdr", _W + "ftr", _W + "footnote", _W + "endnote"}
+
+# 内容类型后缀 -> 部件显示名
+STORY_CONTENT_TYPES = {
+    "document.main+xml": "正文",
+    "header+xml": "页眉",
+    "footer+xml": "页脚",
+    "footnotes+xml": "脚注",
+    "endnotes+xml": "尾注",
+}
+MAIN_DOCUMENT_STORY = "正文"
+
+
+def paragraph_text(p):
+    """段落文本（同 python-docx Paragraph.text：只取段落直属及超链接中的 run）"""
+    parts = []
+    for child in p:
+        if child.tag == TAG_R:
+            runs = (child,)
+        elif child.tag == _TAG_HYPERLINK:
+            runs = child.iterchildren(TAG_R)
+        else:
+            continue
+        for run in runs:
+            for item in run:
+                tag = item.tag
+                if tag == _TAG_T:
+                    parts.append(item.text or "")
+                elif tag in (_TAG_TAB, _TAG_PTAB):
+                    parts.append("\t")
+                elif tag == _TAG_BR:
+                    if item.get(_W + "type", "textWrapping") == "textWrapping":
+                        parts.append("\n")
+                elif tag == _TAG_CR:
+                    parts.append("\n")
+                elif tag == _TAG_NO_BREAK_HYPHEN:
+                    parts.append("-")
+    return "".join(parts)
+
+
+def cell_text(tc):
+    """单元格文本（同 python-docx _Cell.text，不含嵌套表格）"""
+    return "\n".join(paragraph_text(p) for p in tc.iterchildren(TAG_P))
+
+
+def _int_property(parent, path, default):
+    elem = parent.find(path)
+    return int(elem.get(_W + "val")) if elem is not None else default
+
+
+def _v_merge(tc):
+    elem = tc.find(f"{_TAG_TC_PR}/{_TAG_V_MERGE}")
+    return None if elem is None else elem.get(_W + "val", "continue")
+
+
+def read_table_rows(tbl):
+    """
+    按 python-docx 的语义读取表格结构
+
+    Returns:
+        list: 每行 {"grid_before": 行首空缺列数, "tcs": [(tc, 跨列数, vMerge)], "cells": [tc]}，
+              cells 与 row.cells 一一对应：横向合并按跨列数重复，纵向合并的后续单元格取起始单元格
+    """
+    rows = []
+    above = {}  # 上一行 {起始列: (内容单元格, 跨列数)}
+    for tr in tbl.iterchildren(TAG_TR):
+        grid_before = _int_property(tr, f"{_TAG_TR_PR}/{_W}gridBefore", 0)
+        tcs = []
+        cells = []
+        current = {}
+        offset = grid_before
+        for tc in tr.iterchildren(TAG_TC):
+            span = _int_property(tc, f"{_TAG_TC_PR}/{_TAG_GRID_SPAN}", 1)
+            v_merge = _v_merge(tc)
+            root = (tc, span)
+            if v_merge == "continue" and offset in above:
+                root = above[offset]
+            current[offset] = root
+            cells.extend([root[0]] * root[1])
+            tcs.append((tc, span, v_merge))
+            offset += span
+        rows.append({"grid_before": grid_before, "tcs": tcs, "cells": cells})
+        above = current
+    return rows
+
+
+def table_cell_texts(rows):
+    """[[单元格文本]]，同 [[cell.text for cell in row.cells] for row in table.rows]，合并单元格只读取一次"""
+    texts_by_tc = {}
+    row_texts = []
+    for row in rows:
+        texts = []
+        for tc in row["cells"]:
+            if tc not in texts_by_tc:
+                texts_by_tc[tc] = cell_text(tc)
+            texts.append(texts_by_tc[tc])
+        row_texts.append(texts)
+    return row_texts
+
+
+def table_default_font(tbl):
+    """
+    表格默认字体（同 python-docx：按 row.cells 顺序，第一个带字体名或字号的段落首个 run），
+    返回 (font_name, font_size)
+
+    row.cells 中重复出现的合并单元格不会带来新的结果，这里直接按 w:tc 顺序遍历，
+    跳过纵向合并的后续单元格（首行除外，python-docx 对它们取自身）
+    """
+    for r_idx, tr in enumerate(tbl.iterchildren(TAG_TR)):
+        for tc in tr.iterchildren(TAG_TC):
+            if r_idx and _v_merge(tc) == "continue":
+                continue
+            for p in tc.iterchildren(TAG_P):
+                run = p.find(TAG_R)
+                if run is None:
+                    continue
+                fonts = run.find(f"{_W}rPr/{_W}rFonts")
+                size = run.find(f"{_W}rPr/{_W}sz")
+                font_name = fonts.get(_W + "ascii") if fonts is not None else None
+                font_size = ST_HpsMeasure.convert_from_xml(size.get(_W + "val")) if size is not None else None
+                if font_name or font_size:
+                    return font_name, font_size
+    return None, None
+
+
+def list_story_parts(archive):
+    """从 [Content_Types].xml 中列出全部文本部件 [(部件名, 显示名)]，正文在前"""
+    root = etree.fromstring(archive.read("[Content_Types].xml"))
+    parts = []
+    for override in root.iter(_CT + "Override"):
+        content_type = override.get("ContentType", "")
+        for suffix, story in STORY_CONTENT_TYPES.items():
+            if content_type.endswith(suffix):
+                parts.append((override.get("PartName", "").lstrip("/"), story))
+                break
+    parts.sort(key=lambda item: (item[1] != MAIN_DOCUMENT_STORY, item[0]))
+    return parts
+
+
+def open_docx_archive(docx_source):
+    """docx 字节数据、文件路径或可 seek 的文件对象 -> ZipFile"""
+    if isinstance(docx_source, (bytes, bytearray)):
+        docx_source = io.BytesIO(docx_source)
+    return zipfile.ZipFile(docx_source)
+
+
+def scan_story_parts(docx_bytes):
+    """
+    扫描 python-docx 顶层遍历覆盖不到的表格与段落
+
+    Returns:
+        list: 按部件、文档顺序排列的块
+            - {"kind": "table", "part", "location", "nested", "rows": [[{"ordinal", "text", "span", "fillable"}]]}
+            - {"kind": "paragraph", "part", "location", "ordinal", "text"}
+            location 为显示用的位置（如“页眉”“正文文本框”），nested 表示表格嵌套在单元格中；
+            正文顶层表格只在其含有嵌套表格时以嵌套表格的形式出现
+    """
+    with open_docx_archive(docx_bytes) as archive:
+        return list(iter_story_blocks(archive))
+
+
+def iter_body_tables(docx_source):
+    """流式产出正文顶层表格的 w:tbl 元素（只扫描正文部件，元素在下一次迭代前有效）"""
+    with open_docx_archive(docx_source) as archive:
+        for part_name, story in list_story_parts(archive):
+            if story != MAIN_DOCUMENT_STORY:
+                continue
+            with archive.open(part_name) as stream:
+                for block in _scan_part(stream, part_name, story, body_blocks=True):
+                    if block["kind"] == "body" and block["element"].tag == TAG_TBL:
+                        yield block["element"]
+
+
+def iter_story_blocks(archive, body_blocks=False):
+    """
+    依次流式扫描 archive 中的全部文本部件，产出 scan_story_parts 描述的块
+
+    body_blocks 为 True 时还会按文档顺序产出正文顶层的表格和段落
+    {"kind": "body", "element": w:tbl 或 w:p 元素}，元素只在本次迭代期间有效（随后被释放）
+    """
+    for part_name, story in list_story_parts(archive):
+        with archive.open(part_name) as stream:
+            yield from _scan_part(stream, part_name, story, body_blocks)
+
+
+def _scan_part(stream, part_name, story, body_blocks=False):
+    is_document = story == MAIN_DOCUMENT_STORY
+    counters = {TAG_TC: 0, TAG_P: 0}
+    tables = []      # 打开的表格 {"rows", "extra", "nested", "location"}
+    cells = []       # 打开的单元格
+    paragraphs = []  # 打开的段落的序号
+    textbox_depth = 0
+    fallback_depth = 0
+
+    def location():
+        return story + "文本框" if textbox_depth else story
+
+    # 与 python-docx 的解析器一样去掉空白文本节点
+    for event, elem in etree.iterparse(stream, events=("start", "end"), remove_blank_text=True):
+        tag = elem.tag
+        if event == "start":
+            if tag == TAG_TC:
+                cells.append({"ordinal": counters[TAG_TC], "has_table": False, "has_picture": False})
+                counters[TAG_TC] += 1
+            elif tag == TAG_P:
+                paragraphs.append(counters[TAG_P])
+                counters[TAG_P] += 1
+            elif tag == TAG_TBL:
+                parent_tag = elem.getparent().tag
+                nested = parent_tag == TAG_TC
+                if nested:
+                    cells[-1]["has_table"] = True
+                tables.append({
+                    "rows": [],
+                    "extra": not (is_document and parent_tag == TAG_BODY),
+                    "nested": nested,
+                    "location": location(),
+                })
+            elif tag == TAG_TR:
+                tables[-1]["rows"].append([])
+            elif tag == _TAG_TXBX:
+                textbox_depth += 1
+            elif tag == _MC_FALLBACK:
+                # 兼容内容中的备用副本（旧版文本框）不单独作为占位符
+                fallback_depth += 1
+            elif tag in (_TAG_DRAWING, _TAG_PICT) and cells:
+                cells[-1]["has_picture"] = True
+            continue
+
+        if tag == TAG_P:
+            ordinal = paragraphs.pop()
+            parent_tag = elem.getparent().tag
+            if parent_tag != TAG_TC and not (is_document and parent_tag == TAG_BODY) and not fallback_depth:
+                stripped = paragraph_text(elem).strip()
+                if "___" in stripped or "□" in stripped:
+                    yield {
+                        "kind": "paragraph",
+                        "part": part_name,
+                        "location": location(),
+                        "ordinal": ordinal,
+                        "text": stripped,
+                    }
+        elif tag == TAG_TC:
+            record = cells.pop()
+            text = cell_text(elem)
+            tables[-1]["rows"][-1].append({
+                "ordinal": record["ordinal"],
+                "text": text,
+                "span": _int_property(elem, f"{_TAG_TC_PR}/{_TAG_GRID_SPAN}", 1),
+                # 含嵌套表格或图片的单元格是版式容器，纵向合并的后续单元格不单独填写
+                "fillable": (
+                    not fallback_depth
+                    and _v_merge(elem) != "continue"
+                    and not record["has_table"]
+                    and not record["has_picture"]
+                    and classify_cell(text) == CELL_FILLABLE
+                ),
+            })
+        elif tag == TAG_TBL:
+            table = tables.pop()
+            if table["extra"] and not fallback_depth and table["rows"]:
+                yield {
+                    "kind": "table",
+                    "part": part_name,
+                    "location": table["location"],
+                    "nested": table["nested"],
+                    "rows": table["rows"],
+                }
+        elif tag == _TAG_TXBX:
+            textbox_depth -= 1
+        elif tag == _MC_FALLBACK:
+            fallback_depth -= 1
+
+        parent = elem.getparent()
+        if parent is not None and parent.tag in _BLOCK_CONTAINERS:
+            if body_blocks and parent.tag == TAG_BODY and tag in (TAG_TBL, TAG_P):
+                yield {"kind": "body", "element": elem}
+            elem.clear()
+            while elem.getprevious() is not None:
+                del parent[0]
+
+
+class _PartParent:
+    """python-docx 代理对象需要的父对象，只提供 part"""
+
+    def __init__(self, part):
+        self.part = part
+
+
+class StoryNodeLocator:
+    """
+    按扫描得到的定位信息 {"part", "node", "ordinal"} 找回 python-docx 中的单元格/段落
+    每个部件的同类节点只遍历一次；脚注、尾注在 python-docx 中没有解析好的 XML，
+    写回前需要调用 flush 把修改序列化到部件中
+    """
+
+    def __init__(self, doc):
+        self._parts = {str(part.partname).lstrip("/"): part for part in doc.part.package.iter_parts()}
+        self._roots = {}
+        self._blob_roots = {}
+        self._nodes = {}
+
+    def _root(self, part_name):
+        if part_name not in self._roots:
+            part = self._parts[part_name]
+            element = getattr(part, "element", None)
+            if element is None:
+                element = parse_xml(part.blob)
+                self._blob_roots[part_name] = element
+            self._roots[part_name] = element
+        return self._roots[part_name]
+
+    def locate(self, locator):
+        part_name = locator["part"]
+        key = (part_name, locator["node"])
+        if key not in self._nodes:
+            self._nodes[key] = list(self._root(part_name).iter(_W + locator["node"]))
+        element = self._nodes[key][locator["ordinal"]]
+        parent = _PartParent(self._parts[part_name])
+        if locator["node"] == "tc":
+            return _Cell(element, parent)
+        return Paragraph(element, parent)
+
+    def flush(self):
+        for part_name, root in self._blob_roots.items():
+            self._parts[part_name]._blob = etree.tostring(
+                root, xml_declaration=True, encoding="UTF-8", standalone=True
+            )
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模型桩服务
+实现 OpenAI 兼容的 POST /v1/chat/completions，按提示词类型返回确定性的结果，不访问网络，
+用于离线压测和基准测试整条填表流程（配合 MODEL_PROVIDER=stub）：
+
+    填表        JSON 对象；占位符左侧单元格的文字在个人信息中以“字段：值”出现时填该值，
+                否则填 "示例n"（占位符优先取 response_format 中的 required 字段）
+    审核        {"items": [...]}，全部标记为已匹配
+    字段名推断  JSON 数组，每个占位符推断为 "字段n"
+    缺失字段    空数组
+
+延迟 = latency_ms ± jitter_ms，并以 tail_ratio 的概率改为 tail_ms，用来模拟长尾（例如观察请求对冲的效果）；
+随机数由 seed 决定，同样的请求序列得到同样的延迟序列。
+
+用法: python stub_model_server.py [--port 8765] [--latency-ms 800] [--jitter-ms 200] [--tail-ratio 0.05] [--tail-ms 8000]
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_PLACEHOLDER_RE = re.compile(r"\{(\d+)\}")
+_INFER_LINE_RE = re.compile(r"^- \{(\d+)\}:", re.MULTILINE)
+_LABELED_SLOT_RE = re.compile(r"\|\s*([^|{}\n]+?)\s*\|\s*\{(\d+)\}")
+_PROFILE_LINE_RE = re.compile(r"^\s*([^：:\n]{1,20})[：:]\s*(.+?)\s*$", re.MULTILINE)
+
+
+def _placeholder_numbers(text):
+    return list(dict.fromkeys(int(n) for n in _PLACEHOLDER_RE.findall(text)))
+
+
+def _profile_values(prompt):
+    """个人信息段落中的 字段：值"""
+    if "**个人信息" not in prompt:
+        return {}
+    section = prompt.split("**个人信息", 1)[1].split("**表单上下文", 1)[0]
+    return {key.strip(): value for key, value in _PROFILE_LINE_RE.findall(section.split("\n", 1)[-1])}
+
+
+def _schema_keys(response_format):
+    """json_schema 模式下要求返回的占位符"""
+    if not isinstance(response_format, dict) or response_format.get("type") != "json_schema":
+        return None
+    schema = (response_format.get("json_schema") or {}).get("schema") or {}
+    return schema.get("required") or list((schema.get("properties") or {}).keys()) or None
+
+
+def build_reply(messages, response_format=None):
+    """按最后一条用户消息的任务类型生成确定性的回复文本"""
+    prompt = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+
+    if "需要推断的占位符位置" in prompt:
+        numbers = [int(n) for n in _INFER_LINE_RE.findall(prompt)]
+        return json.dumps([f"字段{n}" for n in numbers], ensure_ascii=False)
+
+    if "缺失列表" in prompt:
+        return "[]"
+
+    if '"isMatched"' in prompt:
+        # 返回格式中的示例占位符不参与
+        numbers = _placeholder_numbers(prompt.split("**返回格式")[0])
+        items = [{"key": f"{{{n}}}", "label": f"字段{n}", "value": f"示例{n}", "isMatched": True} for n in numbers]
+        return json.dumps({"items": items}, ensure_ascii=False)
+
+    # 任务要求中的格式示例不参与，只取表单上下文（追问消息没有该标题，取全文）
+    context = prompt.split("**表单上下文")[-1]
+    keys = _schema_keys(response_format)
+    if keys is None:
+        keys = [f"{{{n}}}" for n in _placeholder_numbers(context)]
+
+    profile = _profile_values(next((m.get("content") or "" for m in messages if m.get("role") == "user"), ""))
+    labels = {f"{{{n}}}": label for label, n in _LABELED_SLOT_RE.findall(context)}
+    fill = {}
+    for key in keys:
+        value = profile.get(labels.get(key, ""))
+        fill[key] = value if value is not None else f"示例{key.strip('{}')}"
+    return json.dumps(fill, ensure_ascii=False)
+
+
+class StubModelServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=0, jitter_ms=0, tail_ratio=0.0, tail_ms=0, seed=0):
+        super().__init__(address, StubModelHandler)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tail_ratio = tail_ratio
+        self.tail_ms = tail_ms
+        self.request_count = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def next_delay(self):
+        """本次请求的延迟（秒）"""
+        with self._lock:
+            self.request_count += 1
+            if self.tail_ratio and self._random.random() < self.tail_ratio:
+                return self.tail_ms / 1000
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0, self.latency_ms + jitter) / 1000
+
+
+class StubModelHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = request["messages"]
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": {"message": f"invalid request: {e}"}})
+            return
+
+        time.sleep(self.server.next_delay())
+        content = build_reply(messages, request.get("response_format"))
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        self._send_json(200, {
+            "id": f"stub-{self.server.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_chars,
+                "completion_tokens": len(content),
+                "total_tokens": prompt_chars + len(content),
+            },
+        })
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模型桩服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="基础延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="延迟抖动范围（毫秒）")
+    parser.add_argument("--tail-ratio", type=float, default=0.0, help="长尾请求比例")
+    parser.add_argument("--tail-ms", type=float, default=0, help="长尾请求延迟（毫秒）")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = StubModelServer(
+        (args.host, args.port),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        tail_ratio=args.tail_ratio,
+        tail_ms=args.tail_ms,
+        seed=args.seed,
+    )
+    print(f"🧪 模型桩服务: http://{args.host}:{args.port}/v1/chat/completions")
+    print(f"   使用方式: MODEL_PROVIDER=stub MODEL_STUB_URL=http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -6,9 +6,12 @@ Supabase 客户端配置
 """
 
 import os
+import requests
 from supabase import create_client, Client
 from datetime import datetime
 
+from deadline import check_deadline, request_timeout
+
 # Supabase 配置（必须由环境变量注入）
 SUPABASE_URL = os.getenv("SUPABASE_URL", "").strip()
 SUPABASE_SERVICE_ROLE_KEY = (
@@ -45,6 +48,8 @@ def upload_file_to_supabase(file_content: bytes, bucket_name: str, file_path: st
     Returns:
         公共访问 URL
     """
+    # 请求已超时或客户端已断开时不再上传
+    check_deadline()
     try:
         client = _require_supabase_client()
 
@@ -105,6 +110,40 @@ def delete_file_from_supabase(bucket_name: str, file_path: str) -> bool:
         print(f"文件删除失败: {e}")
         return False
 
+def open_file_stream_from_supabase(bucket_name: str, file_path: str, chunk_size: int = 64 * 1024, timeout: int = 60):
+    """
+    以流的方式下载 Supabase Storage 中的文件
+
+    先建立连接并检查状态码，失败时直接抛出异常；成功时返回按块产出内容的生成器，
+    调用方无需把整个文件读入内存
+
+    Args:
+        bucket_name: bucket 名称
+        file_path: 文件路径
+        chunk_size: 每块字节数
+        timeout: 连接/读取超时（秒），在请求上下文中不超过剩余时间
+
+    Returns:
+        产出 bytes 数据块的生成器
+    """
+    client = _require_supabase_client()
+    public_url = client.storage.from_(bucket_name).get_public_url(file_path)
+
+    response = requests.get(public_url, stream=True, timeout=request_timeout(timeout))
+    if response.status_code != 200:
+        response.close()
+        raise Exception(f"文件下载失败: HTTP {response.status_code}")
+
+    def iter_chunks():
+        try:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if chunk:
+                    yield chunk
+        finally:
+            response.close()
+
+    return iter_chunks()
+
 def get_file_info(bucket_name: str, file_path: str) -> dict:
     """
     获取文件信息
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+模板结构指纹与差异比对
+用户上传的模板常是模板库中某个模板的轻微改版（改了标题、删了一行、rsid 等格式属性不同），
+按文件哈希匹配全部落空。这里基于编译结果（纯文字结构）为每个表格行/段落计算指纹，
+格式、run 切分、占位符编号都不参与计算；再按指纹序列比对两个模板，
+把未变化的占位符对应起来，沿用已推断的字段名，只有新增/变化的占位符需要模型处理。
+"""
+
+import difflib
+import hashlib
+import re
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_DIGITS_RE = re.compile(r"\d+")
+
+
+def _normalize(text):
+    return _WHITESPACE_RE.sub("", text or "").lower()
+
+
+def _digest(parts):
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def fingerprint_template(compiled):
+    """
+    按文档顺序计算结构指纹
+
+    Returns:
+        list: [{"fingerprint": 指纹, "slots": [占位符, ...]}]，每个表格先产出一个表格起始单元
+              （列数 + 去掉序号的标题），随后每行一个单元；段落占位符各一个单元
+    """
+    placeholder_info = compiled["placeholder_info"]
+    units = []
+
+    def slot_token(tag):
+        info = placeholder_info[tag]
+        return f"\x00{info.get('type', '')}:{_normalize(info['original_text'])}"
+
+    for block in compiled["context_blocks"]:
+        if block["kind"] == "paragraph":
+            tag = block["slot"]
+            units.append({
+                "fingerprint": _digest(["P", block.get("location") or "", slot_token(tag)]),
+                "slots": [tag],
+            })
+            continue
+
+        title = _DIGITS_RE.sub("", block.get("title") or "")
+        units.append({"fingerprint": _digest(["T", str(block["columns"]), title]), "slots": []})
+        for row in block["rows"]:
+            parts = ["R"]
+            slots = []
+            for token in row:
+                if isinstance(token, str):
+                    parts.append(_normalize(token))
+                    continue
+                parts.append(slot_token(token["slot"]))
+                # 合并单元格的占位符在行内重复出现，只记录一次
+                if token["slot"] not in slots:
+                    slots.append(token["slot"])
+            units.append({"fingerprint": _digest(parts), "slots": slots})
+
+    return units
+
+
+def template_signature(compiled):
+    """含占位符的结构单元指纹集合，用于在模板库中快速找出最相近的模板"""
+    return frozenset(unit["fingerprint"] for unit in fingerprint_template(compiled) if unit["slots"])
+
+
+def signature_similarity(signature_a, signature_b):
+    """两个模板签名的 Jaccard 相似度"""
+    if not signature_a or not signature_b:
+        return 0.0
+    return len(signature_a & signature_b) / len(signature_a | signature_b)
+
+
+def diff_templates(base_compiled, compiled):
+    """
+    比对两个模板的结构
+
+    同一位置（指纹序列对齐后相等的行/段落）上的占位符视为同一个字段；
+    字段名取决于上方行和首行，对齐后还要求版式分析得到的字段名与来源一致。
+
+    Returns:
+        dict: {
+            "slot_map": {新模板占位符: 旧模板占位符}（未变化的占位符）,
+            "changed_slots": 新增或变化的占位符列表,
+            "unchanged_units": 未变化的结构单元数, "total_units": 新模板结构单元数
+        }
+    """
+    base_units = fingerprint_template(base_compiled)
+    units = fingerprint_template(compiled)
+    base_info = base_compiled["placeholder_info"]
+    placeholder_info = compiled["placeholder_info"]
+
+    matcher = difflib.SequenceMatcher(
+        None,
+        [unit["fingerprint"] for unit in base_units],
+        [unit["fingerprint"] for unit in units],
+        autojunk=False,
+    )
+
+    slot_map = {}
+    unchanged_units = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            continue
+        unchanged_units += i2 - i1
+        for base_unit, unit in zip(base_units[i1:i2], units[j1:j2]):
+            for base_slot, slot in zip(base_unit["slots"], unit["slots"]):
+                old, new = base_info[base_slot], placeholder_info[slot]
+                if (old.get("header"), old.get("header_source")) == (new.get("header"), new.get("header_source")):
+                    slot_map[slot] = base_slot
+
+    return {
+        "slot_map": slot_map,
+        "changed_slots": [tag for tag in placeholder_info if tag not in slot_map],
+        "unchanged_units": unchanged_units,
+        "total_units": len(units),
+    }
+
+
+def carry_over_inferred_headers(base_compiled, compiled, slot_map):
+    """
+    把旧模板中已推断的字段名沿用到新模板未变化的占位符上（原地修改 compiled）
+
+    Returns:
+        int: 沿用的字段名数量
+    """
+    base_info = base_compiled["placeholder_info"]
+    placeholder_info = compiled["placeholder_info"]
+    carried = 0
+    for slot, base_slot in slot_map.items():
+        inferred_header = base_info[base_slot].get("inferred_header")
+        if inferred_header and not placeholder_info[slot].get("header"):
+            placeholder_info[slot]["inferred_header"] = inferred_header
+            carried += 1
+    return carried
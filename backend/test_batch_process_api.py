@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import io
+import json
+import os
+import sys
+import zipfile
+
+import requests
+
+BASE_URL = os.getenv("TEST_BASE_URL", "http://localhost:8000")
+TEMPLATE_PATH = os.getenv("TEST_TEMPLATE_PATH", "报名表.docx")
+USERNAME = os.getenv("TEST_USERNAME", "admin")
+PASSWORD = os.getenv("TEST_PASSWORD", "admin123")
+BATCH_SIZE = int(os.getenv("TEST_BATCH_SIZE", "3"))
+TIMEOUT_SECONDS = int(os.getenv("TEST_TIMEOUT_SECONDS", "180"))
+
+
+def fail(message: str) -> None:
+    print(f"FAIL: {message}")
+    sys.exit(1)
+
+
+def login() -> str:
+    response = requests.post(
+        f"{BASE_URL}/api/login",
+        data={"username": USERNAME, "password": PASSWORD},
+        timeout=TIMEOUT_SECONDS,
+    )
+    if response.status_code != 200:
+        fail(f"login status={response.status_code}, body={response.text[:300]}")
+
+    token = response.json().get("token")
+    if not token:
+        fail(f"login missing token, body={response.text[:300]}")
+    return token
+
+
+def build_profiles() -> list[dict]:
+    profiles = [
+        {
+            "name": f"candidate_{idx + 1}",
+            "user_info_text": f"姓名：测试{idx + 1}\n联系电话：1380000000{idx}\n毕业院校：测试大学",
+        }
+        for idx in range(BATCH_SIZE)
+    ]
+    # 空资料应作为单项失败出现在 manifest 中，而不是中断整个批次
+    profiles.append({"name": "empty", "user_info_text": ""})
+    return profiles
+
+
+def run_batch(token: str, template_bytes: bytes, profiles: list[dict]) -> None:
+    files = {
+        "docx": (
+            "template.docx",
+            template_bytes,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ),
+        "profiles": (None, json.dumps(profiles, ensure_ascii=False)),
+    }
+    response = requests.post(
+        f"{BASE_URL}/api/batch-process",
+        headers={"Authorization": f"Bearer {token}"},
+        files=files,
+        timeout=TIMEOUT_SECONDS,
+    )
+    if response.status_code != 200:
+        fail(f"batch status={response.status_code}, body={response.text[:300]}")
+
+    if "application/zip" not in response.headers.get("content-type", ""):
+        fail(f"batch content-type unexpected: {response.headers.get('content-type')}")
+
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    names = archive.namelist()
+    if "manifest.json" not in names:
+        fail(f"batch zip missing manifest.json: {names}")
+
+    manifest = json.loads(archive.read("manifest.json"))
+    if len(manifest) != len(profiles):
+        fail(f"manifest size={len(manifest)}, expected={len(profiles)}")
+
+    succeeded = [item for item in manifest if item.get("success")]
+    failed = [item for item in manifest if not item.get("success")]
+    if len(succeeded) != BATCH_SIZE or len(failed) != 1:
+        fail(f"unexpected manifest result: {manifest}")
+
+    for item in succeeded:
+        if not archive.read(item["filename"]).startswith(b"PK"):
+            fail(f"{item['filename']} does not look like a docx file")
+
+    print(f"OK: batch succeeded={len(succeeded)}, failed={len(failed)}, members={len(names)}")
+
+
+def main() -> None:
+    print(f"BASE_URL={BASE_URL}")
+    with open(TEMPLATE_PATH, "rb") as f:
+        template_bytes = f.read()
+    token = login()
+    run_batch(token, template_bytes, build_profiles())
+
+
+if __name__ == "__main__":
+    main()
@@ -131,6 +131,50 @@ def run_preview(token: str, template_bytes: bytes) -> dict:
     return payload
 
 
+def run_preview_grid(token: str, template_bytes: bytes) -> dict:
+    url = f"{BASE_URL}/api/preview-grid"
+    headers = {"Authorization": f"Bearer {token}"}
+    files = {
+        "docx": (
+            "template.docx",
+            template_bytes,
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        ),
+        "user_info_text": (None, USER_INFO_TEXT),
+    }
+
+    response = requests.post(url, headers=headers, files=files, timeout=TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        fail(f"preview-grid status={response.status_code}, body={response.text[:300]}")
+
+    payload = response.json()
+    if not payload.get("success"):
+        fail(f"preview-grid success=false, body={response.text[:500]}")
+
+    grid = payload.get("grid")
+    if not isinstance(grid, dict) or not isinstance(grid.get("tables"), list):
+        fail("preview-grid grid.tables is not a list")
+
+    slot_cells = [
+        cell
+        for table in grid["tables"]
+        for row in table.get("rows", [])
+        for cell in row
+        if cell.get("slot")
+    ]
+    if not slot_cells:
+        fail("preview-grid has no slot cells")
+
+    for cell in slot_cells:
+        if cell.get("status") not in {"filled", "unchanged", "missing", "low_confidence"}:
+            fail(f"preview-grid unexpected slot status: {cell}")
+
+    if not isinstance(payload.get("missing_fields"), list):
+        fail("preview-grid missing_fields is not a list")
+
+    return payload
+
+
 def run_download_with_fill_data(token: str, template_bytes: bytes, fill_data: str) -> None:
     url = f"{BASE_URL}/api/process"
     headers = {"Authorization": f"Bearer {token}"}
@@ -163,12 +207,14 @@ def main() -> None:
     template = download_template()
     analyzed_missing_fields = run_analyze_missing(token, template)
     preview_payload = run_preview(token, template)
+    grid_payload = run_preview_grid(token, template)
     run_download_with_fill_data(token, template, preview_payload.get("fill_data", ""))
     print(
         "OK: "
         f"analyze_missing={len(analyzed_missing_fields)}, "
         f"preview_missing={len(preview_payload.get('missing_fields', []))}, "
         f"preview_low_confidence={len(preview_payload.get('low_confidence_fields', []))}, "
+        f"grid_bytes={len(json.dumps(grid_payload.get('grid', {}), ensure_ascii=False))}, "
         "download=pass"
     )
 
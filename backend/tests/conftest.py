@@ -0,0 +1,12 @@
+# -*- coding: utf-8 -*-
+"""离线单元测试：不访问网络，直接导入 backend 下的模块"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 导入 server_with_auth 的测试使用临时 SQLite，不触碰仓库中的 test.db
+os.environ.setdefault("DATABASE_URL", "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="sff-tests-"), "test.db"))
+os.environ.setdefault("MODEL_CACHE_ENABLED", "0")
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import server_with_auth
+from models import Base, LearnedAliasObservation, LearnedFieldAlias
+from profile_normalizer import PROFILE_ALIAS_INDEX
+
+COMPILED = {
+    "placeholder_info": {
+        "{1}": {"type": "empty", "header": "户籍住址", "header_source": "left", "original_text": ""},
+    }
+}
+ADDRESS = "北京市海淀区中关村大街1号"
+
+
+def _profile_context(note):
+    return {"canonical_fields": {"现居住地": ADDRESS, "姓名": f"张三{note}"}}
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    snapshot = {key: list(entries) for key, entries in PROFILE_ALIAS_INDEX.items()}
+    yield session
+    session.close()
+    PROFILE_ALIAS_INDEX.clear()
+    PROFILE_ALIAS_INDEX.update(snapshot)
+
+
+def _learn(db, username, note):
+    server_with_auth.learn_field_aliases(db, username, COMPILED, {"{1}": ADDRESS}, _profile_context(note))
+
+
+def test_one_user_with_many_profiles_cannot_promote(db):
+    for note in range(10):
+        _learn(db, "alice", note)
+
+    record = db.query(LearnedFieldAlias).one()
+    assert record.hits == 1
+    assert not record.promoted
+    assert db.query(LearnedAliasObservation).count() == 1
+    assert "户籍住址" not in PROFILE_ALIAS_INDEX
+
+
+def test_distinct_users_promote(db):
+    users = [f"user{idx}" for idx in range(server_with_auth.ALIAS_PROMOTION_MIN_USERS)]
+    for username in users[:-1]:
+        _learn(db, username, username)
+        _learn(db, username, username + "-v2")
+    assert not db.query(LearnedFieldAlias).one().promoted
+
+    _learn(db, users[-1], "x")
+    record = db.query(LearnedFieldAlias).one()
+    assert record.hits == len(users)
+    assert record.promoted
+    assert PROFILE_ALIAS_INDEX["户籍住址"][0][0] == "现居住地"
+
+
+def test_promotion_threshold_is_at_least_two_users():
+    assert server_with_auth.ALIAS_PROMOTION_MIN_USERS >= 2
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import uuid
+import zipfile
+
+import pytest
+from fastapi.testclient import TestClient
+
+import models
+import server_with_auth
+from deadline import DeadlineExceeded
+from models import Base, SessionLocal, SimpleUser
+
+DOCX = ("docx", ("表.docx", b"docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document"))
+
+
+def _success(tag):
+    return {"output_bytes": tag.encode(), "missing_fields": [], "low_confidence_fields": []}
+
+
+@pytest.fixture
+def token():
+    Base.metadata.create_all(bind=models.engine)
+    value = uuid.uuid4().hex
+    db = SessionLocal()
+    db.add(SimpleUser(token=value, balance=10, total_balance=10))
+    db.commit()
+    db.close()
+    return value
+
+
+def _balance(token):
+    db = SessionLocal()
+    try:
+        return db.query(SimpleUser).filter(SimpleUser.token == token).first().balance
+    finally:
+        db.close()
+
+
+def _manifest(response):
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        return json.loads(archive.read("manifest.json"))
+
+
+def _post(path, token, **kwargs):
+    client = TestClient(server_with_auth.app)
+    return client.post(path, headers={"Authorization": f"Bearer {token}"}, **kwargs)
+
+
+def test_batch_charges_only_successful_items(token, monkeypatch):
+    def fake_batch(docx_bytes, user_info_texts, max_workers=4, deadline=None, profile_contexts=None):
+        assert len(user_info_texts) == 3  # 空资料不参与填充
+        yield 0, _success("a")
+        yield 1, {"error": "模型调用失败"}
+        yield 2, _success("c")
+
+    monkeypatch.setattr(server_with_auth, "iter_batch_fill", fake_batch)
+    profiles = ["姓名：甲", "姓名：乙", "", "姓名：丁"]
+    response = _post("/api/batch-process", token, files=[DOCX], data={"profiles": json.dumps(profiles, ensure_ascii=False)})
+
+    manifest = _manifest(response)
+    assert [entry["success"] for entry in manifest] == [True, False, False, True]
+    assert _balance(token) == 8
+
+
+def test_multi_charges_only_successful_templates(token, monkeypatch):
+    def fake_multi(docx_bytes_list, user_info_text, max_workers=4, deadline=None, profile_context=None):
+        yield 1, {"error": "File is not a zip file"}
+        yield 0, _success("a")
+
+    monkeypatch.setattr(server_with_auth, "iter_multi_template_fill", fake_multi)
+    response = _post("/api/multi-process", token, files=[DOCX, DOCX], data={"user_info_text": "姓名：甲"})
+
+    assert [entry["success"] for entry in _manifest(response)] == [True, False]
+    assert _balance(token) == 9
+
+
+def test_stopped_batch_charges_items_finished_before_the_deadline(token, monkeypatch):
+    def fake_batch(docx_bytes, user_info_texts, max_workers=4, deadline=None, profile_contexts=None):
+        yield 0, _success("a")
+        raise DeadlineExceeded("请求处理超时")
+
+    monkeypatch.setattr(server_with_auth, "iter_batch_fill", fake_batch)
+    response = _post("/api/batch-process", token, files=[DOCX], data={"profiles": json.dumps(["甲", "乙", "丙"])})
+
+    assert [entry.get("error") for entry in _manifest(response)] == [None, "请求处理超时", "请求处理超时"]
+    assert _balance(token) == 9
+
+
+def test_all_failed_batch_is_not_charged(token, monkeypatch):
+    def fake_batch(docx_bytes, user_info_texts, max_workers=4, deadline=None, profile_contexts=None):
+        for idx in range(len(user_info_texts)):
+            yield idx, {"error": "模型调用失败"}
+
+    monkeypatch.setattr(server_with_auth, "iter_batch_fill", fake_batch)
+    response = _post("/api/batch-process", token, files=[DOCX], data={"profiles": json.dumps(["甲", "乙"])})
+
+    assert not any(entry["success"] for entry in _manifest(response))
+    assert _balance(token) == 10
+
+
+def test_batch_larger_than_balance_is_rejected_without_charge(token):
+    response = _post("/api/batch-process", token, files=[DOCX], data={"profiles": json.dumps(["甲"] * 11)})
+    assert response.status_code == 403
+    assert _balance(token) == 10
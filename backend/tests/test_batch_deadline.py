@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import io
+import json
+import threading
+import time
+import zipfile
+
+import pytest
+from docx import Document
+
+import core
+from deadline import Deadline, DeadlineExceeded
+
+
+def _slow_worker(started):
+    def worker(seconds):
+        started.append(seconds)
+        end = time.monotonic() + seconds
+        # 与真实任务一样在检查点响应截止时间
+        while time.monotonic() < end:
+            core.check_deadline()
+            time.sleep(0.01)
+        return {"output_bytes": b"docx", "missing_fields": [], "low_confidence_fields": [], "seconds": seconds}
+    return worker
+
+
+def test_expired_deadline_stops_iteration():
+    started = []
+    deadline = Deadline(0.3)
+    results = core._iter_bounded_results([0.05] + [5] * 10, _slow_worker(started), 2, "测试", deadline)
+
+    start = time.monotonic()
+    collected = []
+    with pytest.raises(DeadlineExceeded):
+        for idx, result in results:
+            collected.append((idx, result))
+    assert time.monotonic() - start < 1.5
+    assert [(idx, result["seconds"]) for idx, result in collected] == [(0, 0.05)]
+    # 在途上限为 2 * max_workers，超时后排队任务不再执行
+    assert len(started) < 11
+
+
+def test_cancel_stops_iteration():
+    started = []
+    deadline = Deadline(60)
+    results = core._iter_bounded_results([5] * 4, _slow_worker(started), 2, "测试", deadline)
+    threading.Timer(0.2, deadline.cancel, args=("客户端已断开",)).start()
+
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="客户端已断开"):
+        list(results)
+    assert time.monotonic() - start < 1.5
+
+
+def test_iter_batch_fill_with_cancelled_deadline_does_not_run():
+    doc = Document()
+    table = doc.add_table(rows=1, cols=2)
+    table.cell(0, 0).text = "姓名"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+
+    deadline = Deadline(60)
+    deadline.cancel()
+    results = core.iter_batch_fill(buffer.getvalue(), ["姓名：张三"] * 3, deadline=deadline)
+    with pytest.raises(DeadlineExceeded):
+        next(results)
+
+
+def test_zip_records_unfinished_items_when_deadline_expires():
+    import server_with_auth
+
+    def results():
+        yield 0, {
+            "output_bytes": b"docx-0",
+            "missing_fields": [],
+            "low_confidence_fields": [],
+        }
+        raise DeadlineExceeded("请求处理超时")
+
+    manifest = [{"index": idx + 1, "name": f"p{idx + 1}", "success": False} for idx in range(3)]
+    archive = b"".join(server_with_auth.stream_filled_documents_zip(results(), manifest, [0, 1, 2]))
+
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        assert zf.namelist() == ["001_p1.docx", "manifest.json"]
+        written = json.loads(zf.read("manifest.json"))
+    assert [entry["success"] for entry in written] == [True, False, False]
+    assert [entry.get("error") for entry in written] == [None, "请求处理超时", "请求处理超时"]
+
+
+class _DisconnectingRequest:
+    def __init__(self, after):
+        self.disconnect_at = time.monotonic() + after
+
+    async def is_disconnected(self):
+        return time.monotonic() >= self.disconnect_at
+
+
+def test_stream_cancels_deadline_when_client_disconnects():
+    import server_with_auth
+
+    started = []
+    deadline = Deadline(60)
+    results = core._iter_bounded_results([0.05] + [5] * 3, _slow_worker(started), 2, "测试", deadline)
+    manifest = [{"index": idx + 1, "name": f"p{idx + 1}", "success": False} for idx in range(4)]
+    chunks = server_with_auth.stream_filled_documents_zip(results, manifest, [0, 1, 2, 3])
+
+    async def consume():
+        return [chunk async for chunk in server_with_auth.stream_with_deadline(_DisconnectingRequest(0.3), deadline, chunks)]
+
+    start = time.monotonic()
+    archive = b"".join(asyncio.run(consume()))
+    assert time.monotonic() - start < 2.5
+    assert deadline.cancelled
+    with zipfile.ZipFile(io.BytesIO(archive)) as zf:
+        written = json.loads(zf.read("manifest.json"))
+    assert [entry["success"] for entry in written] == [True, False, False, False]
+    assert all(entry["error"] == "客户端已断开，处理已取消" for entry in written[1:])
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+from checkbox_resolver import CHECKED_MARK, resolve_checkbox, resolve_fill_blank
+
+
+def test_fill_blank_with_plain_value():
+    assert resolve_fill_blank("___岁", "年龄", {}, {"年龄": "28"}) == "28 岁"
+
+
+def test_fill_blank_strips_unit_already_in_value():
+    assert resolve_fill_blank("___cm", "身高", {}, {"身高": "175cm"}) == "175 cm"
+    assert resolve_fill_blank("___岁", "年龄", {}, {"年龄": "28岁"}) == "28 岁"
+    assert resolve_fill_blank("___CM", "身高", {}, {"身高": "175cm"}) == "175 CM"
+
+
+def test_fill_blank_value_that_is_only_the_unit_goes_to_model():
+    assert resolve_fill_blank("___岁", "年龄", {}, {"年龄": "岁"}) is None
+
+
+def test_fill_blank_label_from_both_sides():
+    assert resolve_fill_blank("持有___驾驶证", "", {}, {"驾驶证": "C1"}) == "持有 C1 驾驶证"
+
+
+def test_fill_blank_declines_negative_or_missing_values():
+    assert resolve_fill_blank("持有___驾驶证", "", {}, {"驾驶证": "无"}) is None
+    assert resolve_fill_blank("___岁", "年龄", {}, {}) is None
+    assert resolve_fill_blank("___至___", "起止时间", {}, {"起止时间": "2020"}) is None
+
+
+def test_checkbox_gender():
+    assert resolve_checkbox("□男 □女", "性别", {}, {"性别": "女"}) == "□男 " + CHECKED_MARK + "女"
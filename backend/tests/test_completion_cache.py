@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import time
+
+import pytest
+
+import completion_cache
+import core
+from completion_cache import CompletionCache
+from model_provider import ModelProvider
+
+PAYLOAD = {"model": "m", "temperature": 0.1, "messages": [{"role": "user", "content": "姓名：张三"}]}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return CompletionCache(str(tmp_path / "cache.db"), ttl_seconds=3600, max_bytes=10 ** 6)
+
+
+def test_put_and_get(cache):
+    assert cache.get("url", PAYLOAD) is None
+    cache.put("url", PAYLOAD, '{"{1}": "张三"}')
+    assert cache.get("url", PAYLOAD) == '{"{1}": "张三"}'
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cache.stats()["entries"] == 1
+
+
+def test_key_depends_on_provider_model_params_and_messages(cache):
+    cache.put("url", PAYLOAD, "{}")
+    assert cache.get("other-url", PAYLOAD) is None
+    assert cache.get("url", {**PAYLOAD, "model": "n"}) is None
+    assert cache.get("url", {**PAYLOAD, "temperature": 0.2}) is None
+    assert cache.get("url", {**PAYLOAD, "messages": [{"role": "user", "content": "姓名：李四"}]}) is None
+    # 参数顺序不影响键
+    assert cache.get("url", {"messages": PAYLOAD["messages"], "temperature": 0.1, "model": "m"}) == "{}"
+
+
+def test_survives_reopen(tmp_path):
+    path = str(tmp_path / "cache.db")
+    CompletionCache(path, 3600, 10 ** 6).put("url", PAYLOAD, "{}")
+    assert CompletionCache(path, 3600, 10 ** 6).get("url", PAYLOAD) == "{}"
+
+
+def test_expired_entries_are_missed_and_purged(cache):
+    cache.put("url", PAYLOAD, "{}")
+    cache.put("url", {**PAYLOAD, "model": "n"}, "{}")
+    cache._conn.execute("UPDATE completions SET created_at = ?", (time.time() - 7200,))
+    cache._conn.commit()
+
+    assert cache.get("url", PAYLOAD) is None
+    assert cache.purge_expired() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_evicts_least_recently_used_over_size_limit(tmp_path):
+    cache = CompletionCache(str(tmp_path / "cache.db"), ttl_seconds=0, max_bytes=2000)
+    payloads = [{"model": "m", "messages": [{"content": str(i)}]} for i in range(10)]
+    for payload in payloads[:5]:
+        cache.put("url", payload, "x" * 300)
+        time.sleep(0.01)
+    cache.get("url", payloads[0])
+    for payload in payloads[5:]:
+        cache.put("url", payload, "x" * 300)
+        time.sleep(0.01)
+
+    assert cache.stats()["bytes"] <= 2000
+    assert cache.get("url", payloads[0]) is not None
+    assert cache.get("url", payloads[1]) is None
+    assert cache.get("url", payloads[9]) is not None
+
+
+def test_ttl_is_capped_by_file_retention(tmp_path, monkeypatch):
+    monkeypatch.setattr(completion_cache, "_CACHE", None)
+    monkeypatch.setenv("MODEL_CACHE_ENABLED", "1")
+    monkeypatch.setenv("MODEL_CACHE_PATH", str(tmp_path / "env.db"))
+    monkeypatch.setenv("FILE_RETENTION_HOURS", "2")
+    monkeypatch.setenv("MODEL_CACHE_TTL_SECONDS", str(7 * 24 * 3600))
+    assert completion_cache.get_completion_cache().ttl_seconds == 2 * 3600
+
+    monkeypatch.setattr(completion_cache, "_CACHE", None)
+    monkeypatch.setenv("MODEL_CACHE_TTL_SECONDS", "600")
+    assert completion_cache.get_completion_cache().ttl_seconds == 600
+
+    monkeypatch.setenv("MODEL_CACHE_ENABLED", "0")
+    assert completion_cache.get_completion_cache() is None
+
+
+class _Reply:
+    status_code = 200
+
+    def __init__(self, content):
+        self.text = content
+        self._content = content
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+@pytest.fixture
+def hedged_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(completion_cache, "_CACHE", None)
+    monkeypatch.setenv("MODEL_CACHE_ENABLED", "1")
+    monkeypatch.setenv("MODEL_CACHE_PATH", str(tmp_path / "hedge.db"))
+    monkeypatch.setenv("MODEL_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("MODEL_HEDGE_MIN_SAMPLES", "1000")
+    monkeypatch.setenv("MODEL_HEDGE_DEFAULT_DELAY_MS", "50")
+    monkeypatch.setenv("MODEL_HEDGE_BUDGET_RATIO", "1")
+    monkeypatch.setenv("MODEL_HEDGE_URL", "http://backup.local/v1")
+    monkeypatch.setenv("MODEL_HEDGE_MODEL", "backup-model")
+
+    def configure(primary_delay):
+        def post(self, payload, timeout=None, session=None):
+            if self.url.startswith("http://primary.local"):
+                time.sleep(primary_delay)
+            return _Reply('{"{1}": "%s"}' % payload["model"])
+        monkeypatch.setattr(ModelProvider, "post", post)
+        return ModelProvider("http://primary.local/v1", "key")
+    yield configure
+    monkeypatch.setattr(completion_cache, "_CACHE", None)
+
+
+def test_hedge_endpoint_reply_is_not_cached(hedged_cache):
+    provider = hedged_cache(primary_delay=0.3)
+    response = core._chat_completion(provider, PAYLOAD, "test-cache-hedge", cache=True)
+    assert response.json()["choices"][0]["message"]["content"] == '{"{1}": "backup-model"}'
+    assert completion_cache.get_completion_cache().get(provider.url, PAYLOAD) is None
+
+
+def test_primary_reply_is_cached_with_hedging_enabled(hedged_cache):
+    provider = hedged_cache(primary_delay=0)
+    core._chat_completion(provider, PAYLOAD, "test-cache-primary", cache=True)
+    assert completion_cache.get_completion_cache().get(provider.url, PAYLOAD) == '{"{1}": "m"}'
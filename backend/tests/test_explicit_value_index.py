@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+import random
+import re
+
+from profile_normalizer import ExplicitValueIndex
+
+
+def _reference_is_explicit_value(value, explicit_values, raw_text=""):
+    """引入 ExplicitValueIndex 之前 core._is_explicit_value 的逐个扫描实现，作为对照"""
+    normalized_value = re.sub(r"\s+", "", str(value or "")).strip()
+    if not normalized_value:
+        return False
+    if normalized_value in explicit_values:
+        return True
+    if len(normalized_value) <= 1:
+        return False
+    for explicit in explicit_values:
+        if len(explicit) <= 1:
+            continue
+        if normalized_value in explicit or explicit in normalized_value:
+            return True
+    if raw_text:
+        normalized_raw = re.sub(r"\s+", "", raw_text)
+        if len(normalized_value) >= 2 and normalized_value in normalized_raw:
+            return True
+    return False
+
+
+PROFILE_TEXT = "姓名：张三\n现居住地：上海市浦东新区\n毕业院校：复旦 大学\n性别：男\n"
+EXPLICIT_VALUES = {"张三", "上海市浦东新区", "复旦大学", "男"}
+
+
+def test_accepts_known_cases():
+    index = ExplicitValueIndex(EXPLICIT_VALUES, PROFILE_TEXT)
+    assert index.accepts("张三")
+    assert index.accepts(" 张 三 ")
+    assert index.accepts("男")
+    assert index.accepts("上海")  # 明确值的子串
+    assert index.accepts("上海市浦东新区张江镇")  # 包含明确值
+    assert index.accepts("现居住地")  # 原始资料的子串
+    assert not index.accepts("女")
+    assert not index.accepts("三")  # 单字只能完全相同
+    assert not index.accepts("北京")
+    assert not index.accepts("")
+    assert not index.accepts(None)
+
+
+def test_does_not_match_across_segments():
+    # 各明确值在自动机中以换行分隔，拼接处不构成子串
+    index = ExplicitValueIndex({"张三", "李四"})
+    assert not index.accepts("三李")
+    assert _reference_is_explicit_value("三李", {"张三", "李四"}) is False
+
+
+def test_matches_previous_scan_on_random_inputs():
+    rng = random.Random(0)
+    alphabet = "张三李四上海 市"
+    for _ in range(300):
+        explicit_values = {
+            re.sub(r"\s+", "", "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))))
+            for _ in range(rng.randint(0, 4))
+        } - {""}
+        raw_text = "".join(rng.choice(alphabet + "\n") for _ in range(rng.randint(0, 20)))
+        index = ExplicitValueIndex(explicit_values, raw_text)
+        for _ in range(20):
+            value = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 6)))
+            assert index.accepts(value) == _reference_is_explicit_value(value, explicit_values, raw_text), (
+                value, explicit_values, raw_text
+            )
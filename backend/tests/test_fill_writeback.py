@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+import copy
+import io
+
+from docx import Document
+from docx.shared import Pt
+from lxml import etree
+
+import core
+
+USER_INFO = "性别：男\n电话：13800000000\n驾驶证：C1"
+FILL_DATA = {"{1}": "[√]男 □女", "{2}": "13800000000", "{3}": "驾驶证：持有 C1 证"}
+
+
+def _build_template():
+    doc = Document()
+    paragraph = doc.add_paragraph()
+    paragraph.add_run("驾驶证：持有").bold = True
+    paragraph.add_run("___").underline = True
+    paragraph.add_run("证")
+
+    table = doc.add_table(rows=2, cols=2)
+    label = table.cell(0, 0).paragraphs[0].add_run("性别")
+    label.font.name = "宋体"
+    label.font.size = Pt(12)
+    choice = table.cell(0, 1).paragraphs[0]
+    first = choice.add_run("□男")
+    first.bold = True
+    first.font.name = "仿宋"
+    first.font.size = Pt(14)
+    choice.add_run(" □女").italic = True
+    table.cell(1, 0).paragraphs[0].add_run("电话")
+    # 表格第 2 行第 2 列没有 run，写入时需要回退到表格默认字体
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _first_rpr_xml(paragraph):
+    rpr = paragraph.runs[0]._r.rPr
+    return etree.tostring(copy.deepcopy(rpr)) if rpr is not None else None
+
+
+def test_round_trip_keeps_first_run_format_and_drops_other_runs():
+    template_bytes = _build_template()
+    template = Document(io.BytesIO(template_bytes))
+    original_paragraph_rpr = _first_rpr_xml(template.paragraphs[0])
+    original_cell_rpr = _first_rpr_xml(template.tables[0].cell(0, 1).paragraphs[0])
+
+    output = core.fill_form(template_bytes, USER_INFO, None, prefilled_data=FILL_DATA)
+    filled = Document(io.BytesIO(output))
+
+    paragraph = filled.paragraphs[0]
+    assert [run.text for run in paragraph.runs] == ["驾驶证：持有 C1 证"]
+    assert _first_rpr_xml(paragraph) == original_paragraph_rpr
+    assert paragraph.runs[0].underline is None
+
+    cell_paragraph = filled.tables[0].cell(0, 1).paragraphs[0]
+    assert [run.text for run in cell_paragraph.runs] == ["[√]男 □女"]
+    assert _first_rpr_xml(cell_paragraph) == original_cell_rpr
+    run = cell_paragraph.runs[0]
+    assert (run.bold, run.italic, run.font.name, run.font.size) == (True, None, "仿宋", Pt(14))
+
+
+def test_cell_without_runs_uses_table_default_font():
+    output = core.fill_form(_build_template(), USER_INFO, None, prefilled_data=FILL_DATA)
+    cell_paragraph = Document(io.BytesIO(output)).tables[0].cell(1, 1).paragraphs[0]
+
+    assert [run.text for run in cell_paragraph.runs] == ["13800000000"]
+    assert (cell_paragraph.runs[0].font.name, cell_paragraph.runs[0].font.size) == ("宋体", Pt(12))
+
+
+def test_needs_table_default_font_only_for_cells_without_runs():
+    table = Document(io.BytesIO(_build_template())).tables[0]
+    assert not core._needs_table_default_font(table.cell(0, 1))
+    assert core._needs_table_default_font(table.cell(1, 1))
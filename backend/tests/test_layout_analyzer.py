@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import random
+
+from layout_analyzer import (
+    CELL_FILLABLE,
+    CELL_LABEL,
+    CELL_PHOTO,
+    CELL_TEXT,
+    FORM_LABEL_VOCABULARY,
+    analyze_table_headers,
+    classify_cell,
+    is_label_text,
+)
+
+
+def slot(n):
+    return {"slot": f"{{{n}}}"}
+
+
+def test_left_labels_in_key_value_layout():
+    rows = [
+        ["姓名", slot(1), "性别", slot(2)],
+        ["电话", slot(3), "邮箱", slot(4)],
+    ]
+    result = analyze_table_headers(rows, {})
+    assert result == {
+        "{1}": ("姓名", "left"),
+        "{2}": ("性别", "left"),
+        "{3}": ("电话", "left"),
+        "{4}": ("邮箱", "left"),
+    }
+
+
+def test_merged_title_row_is_not_a_column_header():
+    rows = [
+        ["个人信息表"] * 4,
+        ["姓名", slot(1), "性别", slot(2)],
+        ["电话", slot(3), "邮箱", slot(4)],
+    ]
+    result = analyze_table_headers(rows, {})
+    assert result["{1}"] == ("姓名", "left")
+    assert result["{2}"] == ("性别", "left")
+    assert result["{3}"] == ("电话", "left")
+    assert result["{4}"] == ("邮箱", "left")
+
+
+def test_title_row_before_column_header_row_is_skipped():
+    rows = [
+        ["家庭成员"] * 3,
+        ["称谓", "姓名", "工作单位"],
+        ["父亲", slot(1), slot(2)],
+    ]
+    result = analyze_table_headers(rows, {})
+    assert result == {"{1}": ("姓名", "column"), "{2}": ("工作单位", "column")}
+
+
+def test_column_header_row():
+    rows = [
+        ["称谓", "姓名", "工作单位"],
+        ["父亲", slot(1), slot(2)],
+        [slot(3), slot(4), slot(5)],
+    ]
+    result = analyze_table_headers(rows, {})
+    assert result["{1}"] == ("姓名", "column")
+    assert result["{3}"] == ("称谓", "column")
+    assert result["{5}"] == ("工作单位", "column")
+
+
+def test_above_label_and_merged_cell_group():
+    rows = [
+        ["学历", "毕业院校"],
+        [slot(1), slot(2)],
+    ]
+    # 首行只有标签、没有占位符时按列表头处理
+    assert analyze_table_headers(rows, {})["{1}"] == ("学历", "column")
+
+    rows = [
+        ["户口地址：", slot(1), slot(2)],
+    ]
+    groups = {"{1}": ("{1}", "{2}"), "{2}": ("{1}", "{2}")}
+    result = analyze_table_headers(rows, groups)
+    assert result == {"{1}": ("户口地址", "left"), "{2}": ("户口地址", "left")}
+
+
+def test_no_label_gives_empty_header():
+    assert analyze_table_headers([[slot(1), slot(2)]], {}) == {"{1}": ("", ""), "{2}": ("", "")}
+
+
+def test_classify_cell_and_label_text():
+    assert classify_cell("") == CELL_FILLABLE
+    assert classify_cell("贴照片处") == CELL_PHOTO
+    assert classify_cell("姓名：") == CELL_LABEL
+    assert classify_cell("□是 □否") == CELL_FILLABLE
+    assert is_label_text("联系电话")
+    assert not is_label_text("个人信息表")
+    assert not is_label_text("北京市海淀区中关村大街一号院三号楼")
+
+
+def _reference_classify_cell(raw_text):
+    """改用自动机之前 compile_template 中逐个关键词扫描的分类逻辑，作为对照"""
+    if any(keyword in raw_text.lower() for keyword in ["照片", "相片", "证件照"]):
+        return CELL_PHOTO
+    text = raw_text.strip()
+    is_label = any(text in (label, label + "：", label + ":") for label in FORM_LABEL_VOCABULARY)
+    if not text or (not is_label and ("□" in text or "___" in text)):
+        return CELL_FILLABLE
+    return CELL_LABEL if is_label else CELL_TEXT
+
+
+def test_classify_cell_matches_previous_scan():
+    pieces = ["姓名", "：", ":", " ", "□", "_", "___", "照", "片", "相片", "证件照", "是", "年", "月", "X"]
+    rng = random.Random(0)
+    samples = [label + suffix for label in FORM_LABEL_VOCABULARY for suffix in ("", "：", ":", " ")]
+    samples += ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 5))) for _ in range(500)]
+    for text in samples:
+        assert classify_cell(text) == _reference_classify_cell(text), text
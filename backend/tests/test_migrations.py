@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+from models import migrate_unique_constraints
+
+
+@pytest.fixture
+def legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        # 加约束之前的表结构
+        conn.execute(text(
+            "CREATE TABLE user_profiles (id INTEGER PRIMARY KEY, username VARCHAR(50) NOT NULL, "
+            "content_hash VARCHAR(64) NOT NULL, raw_text TEXT NOT NULL)"
+        ))
+        for username, content_hash in [("alice", "h1"), ("alice", "h1"), ("alice", "h2"), ("bob", "h1"), ("alice", "h1")]:
+            conn.execute(
+                text("INSERT INTO user_profiles (username, content_hash, raw_text) VALUES (:u, :h, 'x')"),
+                {"u": username, "h": content_hash},
+            )
+    return engine
+
+
+def test_duplicates_are_removed_and_constraint_added(legacy_engine):
+    migrate_unique_constraints(legacy_engine)
+
+    with legacy_engine.connect() as conn:
+        rows = conn.execute(text("SELECT id, username, content_hash FROM user_profiles ORDER BY id")).fetchall()
+    assert [tuple(row) for row in rows] == [(1, "alice", "h1"), (3, "alice", "h2"), (4, "bob", "h1")]
+
+    indexes = inspect(legacy_engine).get_indexes("user_profiles")
+    assert any(index["name"] == "uq_user_profile_content" and index["unique"] for index in indexes)
+    with pytest.raises(IntegrityError):
+        with legacy_engine.begin() as conn:
+            conn.execute(text("INSERT INTO user_profiles (username, content_hash, raw_text) VALUES ('bob', 'h1', 'y')"))
+
+
+def test_migration_is_idempotent_and_skips_missing_tables(legacy_engine):
+    migrate_unique_constraints(legacy_engine)
+    migrate_unique_constraints(legacy_engine)
+    assert not inspect(legacy_engine).has_table("learned_field_aliases")
+
+
+def test_tables_created_with_constraint_are_left_alone(tmp_path, capsys):
+    from models import Base
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    Base.metadata.create_all(bind=engine)
+    migrate_unique_constraints(engine)
+    assert "🔧" not in capsys.readouterr().out
+    assert not any(index["unique"] for index in inspect(engine).get_indexes("user_profiles"))
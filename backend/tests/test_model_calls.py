@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+import json
+
+import pytest
+
+import core
+from model_provider import ModelProvider
+
+MARKDOWN = "| 姓名 | {1} |\n| 性别 | {2} |"
+
+
+class _Response:
+    def __init__(self, status_code, content=None):
+        self.status_code = status_code
+        self.text = content or ""
+        self._content = content
+
+    def json(self):
+        return {"choices": [{"message": {"content": self._content}}]}
+
+
+class _ScriptedProvider(ModelProvider):
+    """按顺序返回预设回复的模型接口，记录每次收到的请求体"""
+
+    def __init__(self, replies):
+        super().__init__("http://stub.local/v1", "key", name="stub")
+        self.replies = list(replies)
+        self.payloads = []
+
+    def post(self, payload, timeout=None, session=None):
+        self.payloads.append(json.loads(json.dumps(payload)))
+        reply = self.replies.pop(0)
+        return reply if isinstance(reply, _Response) else _Response(200, reply)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    monkeypatch.setenv("MODEL_CACHE_ENABLED", "0")
+    monkeypatch.setenv("MODEL_HEDGE_ENABLED", "0")
+    monkeypatch.setenv("MODEL_RESPONSE_FORMAT", "json_schema")
+    monkeypatch.delenv("MODEL_REASK_LIMIT", raising=False)
+    monkeypatch.setattr(core, "_UNSUPPORTED_RESPONSE_FORMATS", set())
+
+    def install(replies):
+        scripted = _ScriptedProvider(replies)
+        monkeypatch.setattr(core, "get_model_provider", lambda: scripted)
+        return scripted
+    return install
+
+
+def test_invalid_reply_is_reasked_once(provider):
+    scripted = provider(["抱歉，我无法输出 JSON", '{"{1}": "张三", "{2}": "男"}'])
+
+    fill_data = core.get_modelscope_response("姓名：张三\n性别：男", MARKDOWN)
+
+    assert fill_data == {"{1}": "张三", "{2}": "男"}
+    assert len(scripted.payloads) == 2
+    reask = scripted.payloads[1]["messages"]
+    assert [message["role"] for message in reask] == ["user", "assistant", "user"]
+    assert "{1}、{2}" in reask[-1]["content"]
+    # 追问只要求缺失的占位符
+    assert scripted.payloads[1]["response_format"]["json_schema"]["schema"]["required"] == ["{1}", "{2}"]
+
+
+def test_reask_only_accepts_missing_keys(provider):
+    scripted = provider(['{"{1}": "张三"}', '{"{1}": "李四", "{2}": "男"}'])
+
+    fill_data = core.get_modelscope_response("姓名：张三\n性别：男", MARKDOWN)
+
+    assert fill_data == {"{1}": "张三", "{2}": "男"}
+    assert scripted.payloads[1]["response_format"]["json_schema"]["schema"]["required"] == ["{2}"]
+
+
+def test_still_invalid_after_reask_limit(provider, monkeypatch):
+    monkeypatch.setenv("MODEL_REASK_LIMIT", "2")
+    scripted = provider(["不是 JSON", "还是不是", "[1, 2]"])
+
+    fill_data = core.get_modelscope_response("姓名：张三", MARKDOWN)
+
+    assert fill_data == {}
+    assert len(scripted.payloads) == 3
+    assert scripted.replies == []
+
+
+def test_reask_disabled(provider, monkeypatch):
+    monkeypatch.setenv("MODEL_REASK_LIMIT", "0")
+    scripted = provider(["不是 JSON"])
+
+    assert core.get_modelscope_response("姓名：张三", MARKDOWN) == {}
+    assert len(scripted.payloads) == 1
+
+
+def test_rejected_response_format_is_retried_without_it_and_remembered(provider):
+    scripted = provider([
+        _Response(400, '{"error": "response_format is not supported"}'),
+        '{"{1}": "张三", "{2}": "男"}',
+        '{"{1}": "李四", "{2}": "女"}',
+    ])
+
+    assert core.get_modelscope_response("姓名：张三", MARKDOWN) == {"{1}": "张三", "{2}": "男"}
+    assert "response_format" in scripted.payloads[0]
+    assert "response_format" not in scripted.payloads[1]
+    assert len(core._UNSUPPORTED_RESPONSE_FORMATS) == 1
+
+    # 之后的请求不再携带 response_format，也不再先失败一次
+    assert core.get_modelscope_response("姓名：李四", MARKDOWN) == {"{1}": "李四", "{2}": "女"}
+    assert len(scripted.payloads) == 3
+    assert "response_format" not in scripted.payloads[2]
+
+
+def test_other_errors_do_not_disable_response_format(provider):
+    scripted = provider([_Response(500, "upstream error"), '{"{1}": "张三", "{2}": "男"}'])
+
+    assert core.get_modelscope_response("姓名：张三", MARKDOWN) == {}
+    assert core._UNSUPPORTED_RESPONSE_FORMATS == set()
+    assert len(scripted.payloads) == 1
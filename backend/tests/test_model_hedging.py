@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from model_hedging import HedgeLane, get_lane, hedged_call
+from model_provider import AbortableSession
+
+
+class _Response:
+    def __init__(self, status_code, name):
+        self.status_code = status_code
+        self.name = name
+
+
+def _sender(name, delay=0.0, status_code=200, calls=None):
+    def send(session):
+        if calls is not None:
+            calls.append(name)
+        time.sleep(delay)
+        return _Response(status_code, name)
+    return send
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setenv("MODEL_HEDGE_ENABLED", "1")
+    monkeypatch.setenv("MODEL_HEDGE_MIN_SAMPLES", "1000")
+    monkeypatch.setenv("MODEL_HEDGE_DEFAULT_DELAY_MS", "50")
+    monkeypatch.setenv("MODEL_HEDGE_BUDGET_RATIO", "1")
+
+
+def test_disabled_sends_only_primary(monkeypatch):
+    monkeypatch.setenv("MODEL_HEDGE_ENABLED", "0")
+    calls = []
+    response = hedged_call("test-disabled", _sender("primary", calls=calls), _sender("hedge", calls=calls))
+    assert response.name == "primary"
+    assert calls == ["primary"]
+    assert get_lane("test-disabled").stats()["samples"] == 1
+
+
+def test_slow_primary_is_hedged_and_hedge_wins(hedging):
+    response = hedged_call("test-hedge-wins", _sender("primary", delay=0.5), _sender("hedge"))
+    assert response.name == "hedge"
+    stats = get_lane("test-hedge-wins").stats()
+    assert (stats["primary_requests"], stats["hedged_requests"], stats["hedge_wins"]) == (1, 1, 1)
+
+
+def test_fast_primary_is_not_hedged(hedging):
+    calls = []
+    response = hedged_call("test-fast", _sender("primary", calls=calls), _sender("hedge", calls=calls))
+    assert response.name == "primary"
+    assert calls == ["primary"]
+
+
+def test_no_hedge_without_budget(hedging, monkeypatch):
+    monkeypatch.setenv("MODEL_HEDGE_BUDGET_RATIO", "0")
+    calls = []
+    response = hedged_call("test-no-budget", _sender("primary", delay=0.2, calls=calls), _sender("hedge", calls=calls))
+    assert response.name == "primary"
+    assert calls == ["primary"]
+    assert get_lane("test-no-budget").stats()["hedged_requests"] == 0
+
+
+def test_failed_hedge_falls_back_to_primary_result(hedging):
+    def broken_hedge(session):
+        raise ConnectionError("reset")
+
+    response = hedged_call("test-hedge-fails", _sender("primary", delay=0.2, status_code=500), broken_hedge)
+    assert response.status_code == 500
+
+
+def test_all_attempts_raising_propagates_error(hedging):
+    def broken(session):
+        time.sleep(0.1)
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        hedged_call("test-all-fail", broken)
+
+
+def test_hedge_delay_uses_percentile_after_min_samples():
+    lane = HedgeLane("percentile")
+    assert lane.hedge_delay(95, 3, 20.0) == 20.0
+    for seconds in (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0):
+        lane.record_latency(seconds)
+    assert lane.hedge_delay(50, 3, 20.0) == 0.5
+    assert lane.hedge_delay(95, 3, 20.0) == 1.0
+
+
+def test_hedge_budget_is_bounded_by_primary_requests():
+    lane = HedgeLane("budget")
+    for _ in range(10):
+        lane.start_primary(0.1)
+    assert lane.try_spend_hedge()
+    assert not lane.try_spend_hedge()
+
+    # 令牌积累有上限，长时间不对冲后也不会连续大量对冲
+    for _ in range(100):
+        lane.start_primary(1.0)
+    spent = 0
+    while lane.try_spend_hedge():
+        spent += 1
+    assert spent == 5
+
+
+def test_concurrent_primaries_share_one_budget():
+    lane = HedgeLane("concurrent")
+    threads = [threading.Thread(target=lane.start_primary, args=(0.5,)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert lane.primary_count == 4
+    assert lane.try_spend_hedge() and lane.try_spend_hedge()
+    assert not lane.try_spend_hedge()
+
+
+class _SlowHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(float(self.path.strip("/") or 0))
+        body = b'{"ok": true}'
+        try:
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _http_sender(url, seconds, sessions):
+    def send(session):
+        sessions.append(session)
+        return (session or requests).post(f"{url}/{seconds}", json={}, timeout=10)
+    return send
+
+
+def test_abort_interrupts_blocked_request(slow_server):
+    session = AbortableSession()
+    threading.Timer(0.2, session.abort).start()
+    start = time.monotonic()
+    with pytest.raises(requests.ConnectionError):
+        session.post(f"{slow_server}/3", json={}, timeout=10)
+    assert time.monotonic() - start < 1.5
+
+    with pytest.raises(requests.ConnectionError):
+        session.post(f"{slow_server}/0", json={}, timeout=10)
+
+
+def test_hedge_win_aborts_slow_primary(hedging, slow_server):
+    sessions = []
+    start = time.monotonic()
+    response = hedged_call("test-abort-primary", _http_sender(slow_server, 3, sessions), _http_sender(slow_server, 0, sessions))
+    assert response.status_code == 200
+    assert time.monotonic() - start < 1.5
+    primary_session, hedge_session = sessions
+    assert primary_session.aborted and not hedge_session.aborted
+
+
+def test_primary_win_aborts_slow_hedge(hedging, slow_server):
+    sessions = []
+    response = hedged_call("test-abort-hedge", _http_sender(slow_server, 0.3, sessions), _http_sender(slow_server, 3, sessions))
+    assert response.status_code == 200
+    primary_session, hedge_session = sessions
+    assert hedge_session.aborted and not primary_session.aborted
+    stats = get_lane("test-abort-hedge").stats()
+    assert (stats["hedged_requests"], stats["hedge_wins"]) == (1, 0)
+
+
+def test_concurrent_primaries_do_not_queue(hedging, monkeypatch):
+    # 主请求在调用线程上发送，并发数远超任何线程池大小时也立即开始，不会排队误触发对冲
+    monkeypatch.setenv("MODEL_HEDGE_DEFAULT_DELAY_MS", "1000")
+    callers = 64
+    started = []
+    release = threading.Event()
+
+    def send(session):
+        started.append(time.monotonic())
+        release.wait(5)
+        return _Response(200, "primary")
+
+    begin = time.monotonic()
+    threads = [threading.Thread(target=hedged_call, args=("test-no-queue", send)) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    deadline = time.monotonic() + 2
+    while len(started) < callers and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(started) == callers
+    assert max(started) - begin < 0.5
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert get_lane("test-no-queue").stats()["hedged_requests"] == 0
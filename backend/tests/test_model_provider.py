@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from model_provider import (
+    DEFAULT_MODEL_API_URL,
+    DEFAULT_STUB_URL,
+    ModelProvider,
+    get_model_provider,
+)
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("MODEL_PROVIDER", "API_BASE_URL", "MODELSCOPE_API_KEY", "MODEL_STUB_URL", "MODEL_TIMEOUT_SECONDS"):
+        monkeypatch.delenv(name, raising=False)
+
+
+def test_default_is_modelscope(monkeypatch):
+    monkeypatch.setenv("MODELSCOPE_API_KEY", "ms-secret")
+    provider = get_model_provider()
+    assert (provider.name, provider.url, provider.api_key) == ("modelscope", DEFAULT_MODEL_API_URL, "ms-secret")
+    assert provider.key_prefix() == "ms-se..."
+
+
+def test_api_base_url_and_explicit_key(monkeypatch):
+    monkeypatch.setenv("API_BASE_URL", "https://llm.example.com/v1/")
+    monkeypatch.setenv("MODELSCOPE_API_KEY", "ms-secret")
+    provider = get_model_provider(api_key="cli-key")
+    assert provider.url == "https://llm.example.com/v1/chat/completions"
+    assert provider.api_key == "cli-key"
+    # 显式传入空密钥时不回退到环境变量
+    assert get_model_provider(api_key="").api_key == ""
+
+
+def test_stub_provider(monkeypatch):
+    monkeypatch.setenv("MODEL_PROVIDER", " Stub ")
+    provider = get_model_provider()
+    assert (provider.name, provider.url, provider.api_key) == ("stub", DEFAULT_STUB_URL, "stub")
+
+    monkeypatch.setenv("MODEL_STUB_URL", "http://127.0.0.1:9000/v1")
+    assert get_model_provider().url == "http://127.0.0.1:9000/v1/chat/completions"
+
+
+def test_payload_and_message_content():
+    provider = ModelProvider("http://x/v1/chat/completions", "k")
+    messages = [{"role": "user", "content": "hi"}]
+    assert provider.payload("m", messages) == {"model": "m", "messages": messages}
+    assert provider.payload("m", messages, {"temperature": 0.2}, thinking=False) == {
+        "model": "m", "messages": messages, "temperature": 0.2, "extra_body": {"enable_thinking": False},
+    }
+    assert provider.headers() == {"Authorization": "Bearer k", "Content-Type": "application/json"}
+    assert ModelProvider.message_content({"choices": [{"message": {"content": "{}"}}]}) == "{}"
+    assert ModelProvider.message_content({"error": "bad"}) is None
+    assert ModelProvider.message_content([]) is None
+
+
+def test_post_uses_given_session_and_default_timeout(monkeypatch):
+    calls = []
+
+    class _Session:
+        def post(self, url, **kwargs):
+            calls.append((url, kwargs))
+            return "response"
+
+    monkeypatch.setenv("MODEL_TIMEOUT_SECONDS", "7")
+    provider = ModelProvider("http://x/v1", "k")
+    assert provider.post({"model": "m"}, session=_Session()) == "response"
+    url, kwargs = calls[0]
+    assert url == "http://x/v1/chat/completions"
+    assert kwargs["json"] == {"model": "m"}
+    assert kwargs["timeout"] == 7
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pytest
+from docx import Document
+
+import core
+from model_provider import DEFAULT_MODEL_ENDPOINT
+
+
+@pytest.fixture(autouse=True)
+def clean_env(monkeypatch):
+    for name in ("MODEL_PROVIDER", "API_BASE_URL", "MODEL_ENDPOINT", "MODEL_LIGHT_ENDPOINT"):
+        monkeypatch.delenv(name, raising=False)
+    for task in core.MODEL_TASK_PROFILES:
+        monkeypatch.delenv(f"MODEL_ENDPOINT_{task.upper()}", raising=False)
+        monkeypatch.delenv(f"MODEL_THINKING_{task.upper()}", raising=False)
+
+
+def test_light_tasks_use_light_model_without_thinking():
+    for task in ("analyze_missing", "infer_fields"):
+        profile = core.model_profile(task)
+        assert profile["model"] == core.DEFAULT_LIGHT_MODEL_ENDPOINT
+        assert profile["thinking"] is False
+        assert core._model_request_data(profile, [])["extra_body"] == {"enable_thinking": False}
+
+
+def test_fill_uses_strong_model_with_thinking():
+    profile = core.model_profile("fill")
+    assert profile["model"] == DEFAULT_MODEL_ENDPOINT
+    assert profile["thinking"] is True
+    assert core._model_request_data(profile, [])["extra_body"] == {"enable_thinking": True}
+    # 审核同样用强模型，不携带思考开关
+    assert core.model_profile("audit")["model"] == DEFAULT_MODEL_ENDPOINT
+    assert "extra_body" not in core._model_request_data(core.model_profile("audit"), [])
+
+
+def test_endpoint_overrides(monkeypatch):
+    monkeypatch.setenv("MODEL_ENDPOINT", "strong-model")
+    monkeypatch.setenv("MODEL_LIGHT_ENDPOINT", "light-model")
+    monkeypatch.setenv("MODEL_ENDPOINT_INFER_FIELDS", "infer-model")
+    monkeypatch.setenv("MODEL_THINKING_FILL", "0")
+
+    assert core.model_profile("fill")["model"] == "strong-model"
+    assert core.model_profile("fill")["thinking"] is False
+    assert core.model_profile("analyze_missing")["model"] == "light-model"
+    assert core.model_profile("infer_fields")["model"] == "infer-model"
+
+
+def test_light_tasks_fall_back_to_main_model_on_other_providers(monkeypatch):
+    # 非默认接口上不知道小模型名，未配置 MODEL_LIGHT_ENDPOINT 时使用主模型
+    monkeypatch.setenv("MODEL_PROVIDER", "stub")
+    monkeypatch.setenv("MODEL_ENDPOINT", "local-model")
+    assert core.model_profile("analyze_missing")["model"] == "local-model"
+    assert core.model_profile("infer_fields")["thinking"] is False
+
+
+def test_calls_are_sent_with_their_task_profile(monkeypatch):
+    sent = []
+
+    def fake_chat_completion(provider, data, lane, cache=False):
+        sent.append((lane, data["model"], data.get("extra_body")))
+        raise RuntimeError("offline")
+
+    monkeypatch.setattr(core, "_chat_completion", fake_chat_completion)
+    doc = Document()
+    doc.add_table(rows=2, cols=2).cell(0, 0).text = "姓名"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    assert core.analyze_missing_fields(buffer.getvalue(), "姓名：张三") == []
+    core.infer_field_names_with_ai({"{1}": {"table_index": 0, "row_index": 0, "col_index": 1}}, "| {1} |", "姓名：张三")
+    core.get_modelscope_response("姓名：张三", "| 姓名 | {1} |")
+
+    assert sent == [
+        ("analyze_missing", core.DEFAULT_LIGHT_MODEL_ENDPOINT, {"enable_thinking": False}),
+        ("infer_fields", core.DEFAULT_LIGHT_MODEL_ENDPOINT, {"enable_thinking": False}),
+        ("fill", DEFAULT_MODEL_ENDPOINT, {"enable_thinking": True}),
+    ]
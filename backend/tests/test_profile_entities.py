@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from profile_entities import extract_profile_entities
+
+VALID_ID = "11010519491231002X"
+
+
+def test_extracts_entities_from_free_text():
+    text = (
+        f"张三，身份证 {VALID_ID.lower()}，电话 138-0013-8000，邮箱 zs@example.com，"
+        "2012年6月毕业于北京大学计算机学院，本科学历。"
+    )
+    assert extract_profile_entities(text) == {
+        "身份证号": VALID_ID,
+        "手机号码": "13800138000",
+        "电子邮箱": "zs@example.com",
+        "毕业院校": "北京大学",
+        "学历": "本科",
+    }
+
+
+def test_rejects_id_card_with_bad_checksum():
+    assert "身份证号" not in extract_profile_entities("身份证 110105194912310021")
+
+
+def test_id_card_inside_longer_number_is_ignored():
+    assert "身份证号" not in extract_profile_entities(f"流水号 9{VALID_ID}")
+
+
+def test_ambiguous_values_are_dropped():
+    assert extract_profile_entities("手机 13800138000 或 13900139000") == {}
+
+
+def test_same_value_repeated_is_not_ambiguous():
+    assert extract_profile_entities("2008年考入清华大学 清华大学") == {"毕业院校": "清华大学"}
+
+
+def test_mobile_with_country_code():
+    assert extract_profile_entities("+86 138 0013 8000") == {"手机号码": "13800138000"}
+
+
+def test_labelled_dates():
+    assert extract_profile_entities("出生日期：1990年5月12日\n毕业时间 2012.06") == {
+        "出生日期": "1990年5月12日",
+        "毕业时间": "2012.06",
+    }
+
+
+def test_degree_is_canonicalized():
+    assert extract_profile_entities("硕士研究生")["学历"] == "硕士"
+    assert extract_profile_entities("专科")["学历"] == "大专"
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import server_with_auth
+from models import Base, FileStorage, UserProfile
+
+
+@pytest.fixture
+def db(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    monkeypatch.setattr(server_with_auth, "delete_file_from_supabase", lambda bucket, path: True)
+    monkeypatch.setattr(server_with_auth, "get_completion_cache", lambda: None)
+    yield session
+    session.close()
+
+
+def _add_profile(db, content_hash, created_days_ago, last_used_days_ago=None):
+    now = datetime.utcnow()
+    path = f"alice/{content_hash}.txt"
+    db.add(FileStorage(
+        username="alice", file_type="user_info", original_filename="info.txt", file_path=path,
+        public_url="https://x/" + path, file_size=1, created_at=now - timedelta(days=created_days_ago),
+    ))
+    db.add(UserProfile(
+        username="alice", content_hash=content_hash, raw_text="姓名：张三", file_path=path,
+        created_at=now - timedelta(days=created_days_ago),
+        last_used_at=now - timedelta(days=last_used_days_ago) if last_used_days_ago is not None else None,
+    ))
+    db.commit()
+
+
+def test_profiles_expire_by_last_use(db):
+    _add_profile(db, "recently-used", created_days_ago=5, last_used_days_ago=0)
+    _add_profile(db, "stale", created_days_ago=5, last_used_days_ago=3)
+    _add_profile(db, "never-used", created_days_ago=5)
+    _add_profile(db, "new", created_days_ago=0)
+
+    result = server_with_auth.cleanup_expired_files(db)
+
+    assert result["profiles_deleted"] == 2
+    assert {profile.content_hash for profile in db.query(UserProfile)} == {"recently-used", "new"}
+    # 仍在使用的资料保留其 user-info 文件
+    assert {record.file_path for record in db.query(FileStorage)} == {"alice/recently-used.txt", "alice/new.txt"}
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import io
+import threading
+from concurrent.futures import Future
+
+import pytest
+from docx import Document
+
+import core
+
+
+def _compiled():
+    doc = Document()
+    doc.add_table(rows=2, cols=2).cell(0, 0).text = "姓名"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    compiled = core.compile_template_stream(buffer.getvalue())
+    # {1}/{2} 有表头，{3} 没有表头
+    assert [info["header"] for info in compiled["placeholder_info"].values()] == ["姓名", "姓名", ""]
+    return compiled
+
+
+@pytest.fixture
+def speculation(monkeypatch):
+    monkeypatch.setenv("MODEL_SPECULATIVE_HEADERS", "1")
+    calls = []
+
+    def fake_infer(positions, markdown_context, user_info_text):
+        calls.append(list(positions))
+        return ["紧急联系人" for _ in positions]
+
+    monkeypatch.setattr(core, "infer_field_names_with_ai", fake_infer)
+    return calls
+
+
+def _fill_with(monkeypatch, reply):
+    monkeypatch.setattr(core, "get_modelscope_response", lambda *args, **kwargs: dict(reply))
+    compiled = _compiled()
+    profile_context = core.prepare_profile_context("姓名：张三")
+    fill_data, header_inference = core._request_fill_data(compiled, profile_context)
+    return compiled, profile_context, fill_data, header_inference
+
+
+def test_speculative_result_is_reused_when_slot_is_missing(speculation, monkeypatch):
+    compiled, profile_context, fill_data, header_inference = _fill_with(monkeypatch, {"{1}": "张三", "{2}": "", "{3}": ""})
+    assert header_inference is not None
+    assert speculation == [["{3}"]]
+
+    resolved = core._resolve_fill_data(compiled, fill_data, profile_context, header_inference)
+    assert "紧急联系人" in resolved["missing_fields"]
+    # 没有再同步推断一次
+    assert speculation == [["{3}"]]
+
+
+def test_speculation_is_cancelled_when_unused():
+    compiled = _compiled()
+    profile_context = core.prepare_profile_context("姓名：张三\n电话：13800000000")
+    pending = Future()
+
+    resolved = core._resolve_fill_data(compiled, {"{1}": "张三", "{2}": "张三", "{3}": "13800000000"}, profile_context, pending)
+    assert pending.cancelled()
+    assert resolved["missing_fields"] == []
+
+
+def test_failed_speculation_falls_back_to_synchronous_inference(monkeypatch):
+    calls = []
+    monkeypatch.setattr(
+        core, "infer_field_names_with_ai", lambda positions, *args: calls.append(list(positions)) or ["备注"]
+    )
+    failed = Future()
+    failed.set_exception(RuntimeError("offline"))
+    compiled = _compiled()
+    profile_context = core.prepare_profile_context("姓名：张三")
+
+    resolved = core._resolve_fill_data(compiled, {"{1}": "张三", "{2}": "", "{3}": ""}, profile_context, failed)
+    assert calls == [["{3}"]]
+    assert "备注" in resolved["missing_fields"]
+
+
+def test_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("MODEL_SPECULATIVE_HEADERS", raising=False)
+    monkeypatch.setattr(core, "infer_field_names_with_ai", lambda *args: pytest.fail("不应提前推断"))
+    _, _, _, header_inference = _fill_with(monkeypatch, {"{1}": "张三", "{2}": "", "{3}": "x"})
+    assert header_inference is None
+
+
+def test_only_requested_headerless_slots_are_speculated(speculation):
+    compiled = _compiled()
+    profile_context = core.prepare_profile_context("姓名：张三")
+    assert core._start_header_inference(compiled, profile_context, ["{1}", "{2}"]) is None
+
+    future = core._start_header_inference(compiled, profile_context, ["{3}"])
+    assert future.result(timeout=5) == {"{3}": "紧急联系人"}
+
+
+def test_speculation_is_skipped_when_all_slots_are_busy(monkeypatch):
+    monkeypatch.setenv("MODEL_SPECULATIVE_HEADERS", "1")
+    release = threading.Event()
+    monkeypatch.setattr(core, "infer_field_names_with_ai", lambda positions, *args: release.wait(5) and ["x"])
+    compiled = _compiled()
+    profile_context = core.prepare_profile_context("姓名：张三")
+
+    futures = []
+    while True:
+        future = core._start_header_inference(compiled, profile_context, ["{3}"])
+        if future is None:
+            break
+        futures.append(future)
+        assert len(futures) <= 64
+    # 在途数有上限，达到上限后不排队
+    assert futures
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import io
+
+from docx import Document
+from docx.oxml import parse_xml
+
+from story_scanner import StoryNodeLocator, iter_body_tables, scan_story_parts
+
+_TEXTBOX_RUN = (
+    '<w:r xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main" '
+    'xmlns:v="urn:schemas-microsoft-com:vml">'
+    "<w:pict><v:shape><v:textbox><w:txbxContent>"
+    "<w:p><w:r><w:t>{text}</w:t></w:r></w:p>"
+    "</w:txbxContent></v:textbox></v:shape></w:pict>"
+    "</w:r>"
+)
+
+
+def _build_fixture():
+    doc = Document()
+
+    section = doc.sections[0]
+    header_table = section.header.add_table(rows=1, cols=2, width=section.page_width)
+    header_table.cell(0, 0).text = "姓名："
+    section.footer.paragraphs[0].text = "签字：___ 日期：___"
+
+    outer = doc.add_table(rows=1, cols=2)
+    outer.cell(0, 0).text = "家庭成员"
+    inner = outer.cell(0, 1).add_table(rows=2, cols=2)
+    inner.cell(0, 0).text = "称谓"
+    inner.cell(0, 1).text = "姓名"
+    inner.cell(1, 0).text = "父亲"
+
+    body_paragraph = doc.add_paragraph("正文段落 ___ 不在扫描范围内")
+    body_paragraph._p.append(parse_xml(_TEXTBOX_RUN.format(text="是否服从调剂 □是 □否")))
+
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def test_scan_finds_header_footer_textbox_and_nested_tables():
+    blocks = scan_story_parts(_build_fixture())
+    by_location = {}
+    for block in blocks:
+        by_location.setdefault((block["kind"], block["location"]), []).append(block)
+
+    header_tables = by_location[("table", "页眉")]
+    assert len(header_tables) == 1
+    header_cells = header_tables[0]["rows"][0]
+    assert [cell["text"] for cell in header_cells] == ["姓名：", ""]
+    assert [cell["fillable"] for cell in header_cells] == [False, True]
+    assert header_tables[0]["nested"] is False
+
+    footer_paragraphs = by_location[("paragraph", "页脚")]
+    assert [block["text"] for block in footer_paragraphs] == ["签字：___ 日期：___"]
+
+    nested_tables = by_location[("table", "正文")]
+    assert len(nested_tables) == 1
+    assert nested_tables[0]["nested"] is True
+    assert [[cell["text"] for cell in row] for row in nested_tables[0]["rows"]] == [["称谓", "姓名"], ["父亲", ""]]
+
+    textbox_paragraphs = by_location[("paragraph", "正文文本框")]
+    assert [block["text"] for block in textbox_paragraphs] == ["是否服从调剂 □是 □否"]
+
+    # 正文顶层段落由 python-docx 的 doc.paragraphs 处理，不重复产出
+    assert not any("正文段落" in block.get("text", "") for block in blocks)
+
+
+def test_iter_body_tables_yields_only_top_level_tables():
+    assert len(list(iter_body_tables(_build_fixture()))) == 1
+
+
+def test_text_and_vertically_merged_cells_are_not_fillable():
+    blocks = scan_story_parts(_build_fixture())
+    nested = next(block for block in blocks if block["kind"] == "table" and block["nested"])
+    assert [cell["fillable"] for cell in nested["rows"][1]] == [False, True]
+
+    doc = Document()
+    table = doc.sections[0].header.add_table(rows=2, cols=2, width=doc.sections[0].page_width)
+    table.cell(0, 1).merge(table.cell(1, 1))
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    (header_table,) = scan_story_parts(buffer.getvalue())
+    assert [[cell["fillable"] for cell in row] for row in header_table["rows"]] == [[True, True], [True, False]]
+
+
+def test_locator_finds_scanned_nodes_in_python_docx():
+    docx_bytes = _build_fixture()
+    blocks = scan_story_parts(docx_bytes)
+    locator = StoryNodeLocator(Document(io.BytesIO(docx_bytes)))
+
+    for block in blocks:
+        if block["kind"] == "table":
+            for row in block["rows"]:
+                for cell in row:
+                    found = locator.locate({"part": block["part"], "node": "tc", "ordinal": cell["ordinal"]})
+                    assert found.text == cell["text"]
+        else:
+            found = locator.locate({"part": block["part"], "node": "p", "ordinal": block["ordinal"]})
+            assert found.text.strip() == block["text"]
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import io
+
+from docx import Document
+
+from core import compile_template_stream
+from template_diff import carry_over_inferred_headers, diff_templates, signature_similarity, template_signature
+
+ROWS = [
+    ["姓名", "", "性别", ""],
+    ["民族", "", "籍贯", ""],
+    ["联系电话", "", "邮箱", ""],
+]
+
+
+def _compile(rows, title="入职登记表", bold_labels=False):
+    doc = Document()
+    doc.add_paragraph(title)
+    table = doc.add_table(rows=len(rows), cols=len(rows[0]))
+    for r_idx, row in enumerate(rows):
+        for c_idx, text in enumerate(row):
+            if bold_labels and text:
+                # 同样的文字拆成多个 run，格式不同
+                paragraph = table.cell(r_idx, c_idx).paragraphs[0]
+                paragraph.add_run(text[:1]).bold = True
+                paragraph.add_run(text[1:])
+            else:
+                table.cell(r_idx, c_idx).text = text
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return compile_template_stream(buffer.getvalue())
+
+
+def test_deleted_row_maps_remaining_slots():
+    base = _compile(ROWS)
+    edited = _compile([ROWS[0], ROWS[2]])
+
+    result = diff_templates(base, edited)
+    assert result["slot_map"] == {"{1}": "{1}", "{2}": "{2}", "{3}": "{5}", "{4}": "{6}"}
+    assert result["changed_slots"] == []
+
+
+def test_added_and_changed_rows_are_reported():
+    base = _compile(ROWS)
+    edited = _compile([ROWS[0], ["学历", "", "学位", ""], ROWS[1], ["联系电话", "", "微信", ""]])
+
+    result = diff_templates(base, edited)
+    assert result["slot_map"] == {"{1}": "{1}", "{2}": "{2}", "{5}": "{3}", "{6}": "{4}"}
+    assert result["changed_slots"] == ["{3}", "{4}", "{7}", "{8}"]
+
+
+def test_formatting_and_title_numbers_do_not_change_fingerprints():
+    base = _compile(ROWS, title="附件1 入职登记表")
+    edited = _compile(ROWS, title="附件2 入职登记表", bold_labels=True)
+
+    assert template_signature(base) == template_signature(edited)
+    assert signature_similarity(template_signature(base), template_signature(edited)) == 1.0
+    assert diff_templates(base, edited)["changed_slots"] == []
+
+
+def test_carry_over_inferred_headers_only_fills_headerless_slots():
+    base = _compile(ROWS)
+    edited = _compile([ROWS[0], ROWS[2]])
+    base["placeholder_info"]["{5}"]["inferred_header"] = "手机号码"
+    base["placeholder_info"]["{6}"]["inferred_header"] = "电子邮箱"
+    edited["placeholder_info"]["{4}"]["header"] = ""
+
+    carried = carry_over_inferred_headers(base, edited, {"{3}": "{5}", "{4}": "{6}"})
+    assert carried == 1
+    assert "inferred_header" not in edited["placeholder_info"]["{3}"]
+    assert edited["placeholder_info"]["{4}"]["inferred_header"] == "电子邮箱"
+
+
+def test_signature_similarity_of_unrelated_templates():
+    assert signature_similarity(frozenset(), frozenset({"a"})) == 0.0
+    assert signature_similarity(frozenset({"a", "b"}), frozenset({"b", "c"})) == 1 / 3
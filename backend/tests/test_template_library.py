@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import hashlib
+import io
+import json
+
+import pytest
+from docx import Document
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import server_with_auth
+from core import compile_template_stream
+from models import Base, FormTemplate
+
+ROWS = [["姓名", "", "性别", ""], ["联系电话", "", "邮箱", ""], ["", "", "", ""]]
+
+
+def _docx(rows):
+    doc = Document()
+    table = doc.add_table(rows=len(rows), cols=len(rows[0]))
+    for r_idx, row in enumerate(rows):
+        for c_idx, text in enumerate(row):
+            table.cell(r_idx, c_idx).text = text
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def library(monkeypatch):
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    monkeypatch.setattr(server_with_auth, "TEMPLATE_CACHE", server_with_auth.OrderedDict())
+    monkeypatch.setattr(server_with_auth, "TEMPLATE_SIGNATURES", {})
+    stored = {}
+    downloads = []
+
+    def fake_download(bucket, path, **kwargs):
+        downloads.append(path)
+        yield stored[path]
+
+    monkeypatch.setattr(server_with_auth, "open_file_stream_from_supabase", fake_download)
+
+    def publish(rows, inferred=None, stored_bytes=None):
+        docx_bytes = _docx(rows)
+        compiled = compile_template_stream(docx_bytes)
+        for tag, header in (inferred or {}).items():
+            compiled["placeholder_info"][tag]["inferred_header"] = header
+        path = f"templates/{len(stored)}.docx"
+        stored[path] = stored_bytes if stored_bytes is not None else docx_bytes
+        template = FormTemplate(
+            name="入职登记表", content_hash=hashlib.sha256(docx_bytes).hexdigest(), file_path=path,
+            public_url="https://x/" + path, file_size=len(docx_bytes), created_by="admin",
+            compiled_template=json.dumps(compiled, ensure_ascii=False), slot_count=len(compiled["placeholder_info"]),
+        )
+        db.add(template)
+        db.commit()
+        return template, docx_bytes
+
+    yield db, publish, downloads
+    db.close()
+
+
+def test_compiled_template_is_cached_and_file_downloaded_once(library):
+    db, publish, downloads = library
+    template, docx_bytes = publish(ROWS)
+
+    compiled, file_bytes = server_with_auth.get_cached_template(template, need_bytes=False)
+    assert file_bytes is None and downloads == []
+    assert compiled == json.loads(template.compiled_template)
+
+    for _ in range(2):
+        _, file_bytes = server_with_auth.get_cached_template(template)
+    assert file_bytes == docx_bytes
+    assert len(downloads) == 1
+
+
+def test_changed_file_is_rejected(library):
+    db, publish, _ = library
+    template, _ = publish(ROWS, stored_bytes=b"tampered")
+    with pytest.raises(HTTPException) as excinfo:
+        server_with_auth.get_cached_template(template)
+    assert excinfo.value.status_code == 409
+
+
+def test_inactive_or_unknown_template_id(library):
+    db, publish, _ = library
+    template, _ = publish(ROWS)
+    assert server_with_auth.resolve_form_template(db, None) is None
+    assert server_with_auth.resolve_form_template(db, template.id).id == template.id
+
+    template.is_active = False
+    db.commit()
+    with pytest.raises(HTTPException) as excinfo:
+        server_with_auth.resolve_form_template(db, template.id)
+    assert excinfo.value.status_code == 404
+
+
+def test_similar_upload_reuses_library_inferred_headers(library):
+    db, publish, _ = library
+    base = compile_template_stream(_docx(ROWS))
+    headerless = [tag for tag, info in base["placeholder_info"].items() if not info["header"]]
+    template, _ = publish(ROWS, inferred={tag: f"备注{idx}" for idx, tag in enumerate(headerless)})
+
+    uploaded = compile_template_stream(_docx([ROWS[0], ["学历", "", "学位", ""], ROWS[1], ROWS[2]]))
+    matched = server_with_auth.reuse_library_analysis(db, uploaded)
+
+    assert matched.id == template.id
+    carried = [info.get("inferred_header") for info in uploaded["placeholder_info"].values() if not info["header"]]
+    assert carried == [f"备注{idx}" for idx in range(len(headerless))]
+
+
+def test_unrelated_upload_does_not_match(library):
+    db, publish, _ = library
+    publish(ROWS)
+    uploaded = compile_template_stream(_docx([["单位名称", "", "统一社会信用代码", ""], ["法定代表人", "", "注册资本", ""]]))
+    assert server_with_auth.reuse_library_analysis(db, uploaded) is None
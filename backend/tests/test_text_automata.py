@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import random
+
+from text_automata import AhoCorasick, SuffixAutomaton
+
+
+def test_aho_corasick_classic_patterns():
+    automaton = AhoCorasick(["he", "she", "his", "hers"])
+    assert automaton.contains_any("ushers")
+    assert automaton.contains_any("ahishe")
+    assert not automaton.contains_any("hxsx")
+    assert not automaton.contains_any("")
+
+
+def test_aho_corasick_reports_patterns_that_are_suffixes_of_other_paths():
+    # “姓名”是“曾用姓名”的后缀，其输出需经失败链接传递
+    automaton = AhoCorasick({"曾用姓名": "former", "姓名": "name"})
+    assert automaton.matched_kinds("曾用姓名") == {"former", "name"}
+    assert automaton.matched_kinds("曾用姓X名") == set()
+    assert automaton.matched_kinds("申请人姓名") == {"name"}
+
+
+def test_aho_corasick_ignores_empty_patterns():
+    automaton = AhoCorasick(["", "签字"])
+    assert not automaton.contains_any("日期")
+    assert automaton.contains_any("本人签字")
+
+
+def test_aho_corasick_matches_brute_force():
+    rng = random.Random(0)
+    alphabet = "abc"
+    for _ in range(200):
+        patterns = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))): i for i in range(rng.randint(1, 5))}
+        automaton = AhoCorasick(patterns)
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        expected = {kind for pattern, kind in patterns.items() if pattern in text}
+        assert automaton.matched_kinds(text) == expected
+        assert automaton.contains_any(text) == bool(expected)
+
+
+def test_suffix_automaton_all_substrings():
+    text = "北京市海淀区中关村大街"
+    automaton = SuffixAutomaton(text)
+    for start in range(len(text)):
+        for end in range(start, len(text) + 1):
+            assert automaton.contains(text[start:end])
+    assert not automaton.contains("上海")
+    assert not automaton.contains("海淀中关村")
+
+
+def test_suffix_automaton_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(200):
+        text = "".join(rng.choice("ab") for _ in range(rng.randint(0, 15)))
+        automaton = SuffixAutomaton(text)
+        for _ in range(20):
+            pattern = "".join(rng.choice("ab") for _ in range(rng.randint(0, 6)))
+            assert automaton.contains(pattern) == (pattern in text)
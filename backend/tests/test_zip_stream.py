@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import io
+import json
+import os
+import zipfile
+
+from zip_stream import ZipChunkSink, stream_zip
+
+
+def _chunks(data, size):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def test_sink_is_not_seekable():
+    sink = ZipChunkSink()
+    assert not hasattr(sink, "seek") and not hasattr(sink, "tell")
+
+
+def test_streamed_archive_opens_and_members_match():
+    small = "姓名：张三".encode("utf-8")
+    large = os.urandom(300 * 1024) + b"x" * (200 * 1024)
+    manifest = [{"name": "a.docx", "success": True}, {"name": "b.bin", "success": True}]
+
+    def members():
+        yield "a.docx", small
+        yield "目录/b.bin", _chunks(large, 64 * 1024)
+        yield "empty.txt", iter(())
+        yield "manifest.json", json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+
+    pieces = list(stream_zip(members()))
+    # 大成员按块输出，而不是在结束时一次性输出
+    assert len(pieces) > 3
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(pieces))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ["a.docx", "目录/b.bin", "empty.txt", "manifest.json"]
+        assert archive.read("a.docx") == small
+        assert archive.read("目录/b.bin") == large
+        assert archive.read("empty.txt") == b""
+        assert json.loads(archive.read("manifest.json")) == manifest
+
+
+def test_members_are_read_lazily():
+    consumed = []
+
+    def members():
+        for idx in range(3):
+            consumed.append(idx)
+            yield f"{idx}.txt", str(idx).encode()
+
+    stream = stream_zip(members())
+    next(stream)
+    assert consumed == [0]
+    rest = b"".join(stream)
+    assert consumed == [0, 1, 2]
+    assert rest
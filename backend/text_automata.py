@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+字符串自动机
+- AhoCorasick: 多模式匹配，判断文本中是否出现任一模式串
+- SuffixAutomaton: 后缀自动机，判断任意串是否为被索引文本的子串
+均为一次构建、多次查询，查询耗时只与查询串长度有关
+"""
+
+from collections import deque
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick 自动机（不记录命中位置）
+
+    patterns 可以是模式串的可迭代对象，也可以是 {模式串: 类别} 的字典；
+    contains_any 判断是否命中任一模式串，matched_kinds 返回命中的类别集合
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [frozenset()]
+
+        items = patterns.items() if isinstance(patterns, dict) else ((pattern, True) for pattern in patterns)
+        for pattern, kind in items:
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                next_state = self._goto[state].get(ch)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][ch] = next_state
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append(frozenset())
+                state = next_state
+            self._output[state] = self._output[state] | {kind}
+
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[next_state] = target if target != next_state else 0
+                # 后缀上的模式串也算命中
+                self._output[next_state] = self._output[next_state] | self._output[self._fail[next_state]]
+
+    def contains_any(self, text):
+        """text 中是否包含任一模式串"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                return True
+        return False
+
+    def matched_kinds(self, text):
+        """text 中命中的全部模式串类别"""
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        kinds = set()
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if output[state]:
+                kinds |= output[state]
+        return kinds
+
+
+class SuffixAutomaton:
+    """后缀自动机，contains(s) 判断 s 是否为构建文本的子串"""
+
+    def __init__(self, text=""):
+        self._next = [{}]
+        self._link = [-1]
+        self._length = [0]
+        self._last = 0
+        for ch in text:
+            self._extend(ch)
+
+    def _extend(self, ch):
+        next_ = self._next
+        link = self._link
+        length = self._length
+
+        current = len(next_)
+        next_.append({})
+        link.append(0)
+        length.append(length[self._last] + 1)
+
+        state = self._last
+        while state != -1 and ch not in next_[state]:
+            next_[state][ch] = current
+            state = link[state]
+
+        if state != -1:
+            target = next_[state][ch]
+            if length[state] + 1 == length[target]:
+                link[current] = target
+            else:
+                clone = len(next_)
+                next_.append(dict(next_[target]))
+                link.append(link[target])
+                length.append(length[state] + 1)
+                while state != -1 and next_[state].get(ch) == target:
+                    next_[state][ch] = clone
+                    state = link[state]
+                link[target] = clone
+                link[current] = clone
+
+        self._last = current
+
+    def contains(self, pattern):
+        next_ = self._next
+        state = 0
+        for ch in pattern:
+            state = next_[state].get(ch)
+            if state is None:
+                return False
+        return True
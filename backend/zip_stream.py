@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式 ZIP 编码
+每个成员一产生就写入并立即输出，不在内存中拼接完整压缩包，
+内存占用只取决于单个数据块大小，与压缩包内的文档数量无关
+"""
+
+import zipfile
+from datetime import datetime
+
+ZIP_STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class ZipChunkSink:
+    """只追加写入的缓冲区：zipfile 检测到不可 seek 后改用数据描述符，可逐块输出"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def stream_zip(members, compression=zipfile.ZIP_DEFLATED):
+    """
+    流式生成 ZIP 压缩包
+
+    Args:
+        members: 可迭代对象，产出 (文件名, 内容)；内容为 bytes，
+                 或按块产出 bytes 的可迭代对象（如 HTTP 响应的 iter_content）
+        compression: 压缩方式
+
+    Yields:
+        bytes: 压缩包数据块，可直接交给 StreamingResponse
+    """
+    sink = ZipChunkSink()
+    with zipfile.ZipFile(sink, mode="w", compression=compression) as archive:
+        for name, content in members:
+            zinfo = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+            zinfo.compress_type = compression
+
+            if isinstance(content, (bytes, bytearray)):
+                archive.writestr(zinfo, bytes(content))
+            else:
+                # 大小未知的成员按块写入，每写一块就输出一次
+                with archive.open(zinfo, mode="w", force_zip64=True) as member:
+                    for chunk in content:
+                        member.write(chunk)
+                        data = sink.drain()
+                        if data:
+                            yield data
+
+            data = sink.drain()
+            if data:
+                yield data
+
+    # 关闭时写入中央目录
+    data = sink.drain()
+    if data:
+        yield data